@@ -0,0 +1,164 @@
+"""
+Network enrichment: TCP probe, MTProto handshake and ip-api lookup throughput
+against local fakes, and shared state round trips (local backend and the RESP
+client against an in-process fake server).
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, List
+
+import harness
+from fakes import FakeIpApi, FakeMtprotoProxy, FakeRedis, TcpEndpoints
+from geoclient import IpApiClient
+from mtproto import validate_proxy
+from prober import TcpProber
+from ratelimit import TokenBucket
+from state import LocalStateBackend, RedisStateBackend, RespClient
+
+
+async def _timed(coroutine, latencies: List[float]):
+    start = time.perf_counter()
+    value = await coroutine
+    latencies.append(time.perf_counter() - start)
+    return value
+
+
+async def _bench_probe(quick: bool) -> List[Dict]:
+    results = []
+    endpoints = TcpEndpoints(count=32)
+    addresses = await endpoints.start()
+    refused = await endpoints.closed_port()
+    total = 1000 if quick else 5000
+    try:
+        for concurrency in (10, 100, 1000):
+            prober = TcpProber(concurrency=concurrency, timeout=3.0)
+            targets = [addresses[i % len(addresses)] for i in range(total)]
+            latencies: List[float] = []
+            start = time.perf_counter()
+            pings = await asyncio.gather(*(_timed(prober.probe(host, port), latencies) for host, port in targets))
+            wall = time.perf_counter() - start
+            results.append(harness.latency_result(
+                'network.probe', latencies, wall, {'concurrency': concurrency},
+                failures=sum(1 for ping in pings if ping is None)
+            ))
+
+        prober = TcpProber(concurrency=100, timeout=3.0)
+        latencies = []
+        start = time.perf_counter()
+        pings = await asyncio.gather(*(
+            _timed(prober.probe('127.0.0.1', refused), latencies) for _ in range(total // 5)
+        ))
+        results.append(harness.latency_result(
+            'network.probe_refused', latencies, time.perf_counter() - start, {'concurrency': 100},
+            failures=sum(1 for ping in pings if ping is None)
+        ))
+    finally:
+        await endpoints.stop()
+    return results
+
+
+async def _bench_handshake(quick: bool) -> List[Dict]:
+    results = []
+    total = 200 if quick else 1000
+    key, other = os.urandom(16).hex(), os.urandom(16).hex()
+    domain = b'www.google.com'.hex()
+    secrets = {
+        'plain': (key, other),
+        'dd': ('dd' + key, 'dd' + other),
+        'ee': ('ee' + key + domain, 'ee' + other + domain)
+    }
+    # A good secret must pass, another secret must be refused, and a proxy that never answers times out
+    cases = [(kind, case) for kind in secrets for case in ('valid', 'wrong_secret')] + [('plain', 'timeout')]
+    for kind, case in cases:
+        good, wrong = secrets[kind]
+        server = FakeMtprotoProxy(good, silent=case == 'timeout')
+        port = await server.start()
+        count, timeout = (total, 5.0) if case != 'timeout' else (10, 0.2)
+        try:
+            latencies: List[float] = []
+            start = time.perf_counter()
+            outcomes = await asyncio.gather(*(
+                _timed(validate_proxy('127.0.0.1', port, wrong if case == 'wrong_secret' else good, timeout), latencies)
+                for _ in range(count)
+            ))
+            results.append(harness.latency_result(
+                'network.mtproto_handshake', latencies, time.perf_counter() - start, {'secret': kind, 'case': case},
+                accepted=sum(1 for outcome in outcomes if outcome.ok),
+                errors=sorted({outcome.error for outcome in outcomes if outcome.error}),
+                as_expected=all(outcome.ok == (case == 'valid') for outcome in outcomes)
+                and (case != 'timeout' or all(outcome.error == 'timeout' for outcome in outcomes))
+            ))
+        finally:
+            await server.stop()
+    return results
+
+
+async def _bench_geo(quick: bool) -> List[Dict]:
+    results = []
+    total = 2000 if quick else 10000
+    for latency in (0.0, 0.02):
+        server = FakeIpApi(latency=latency)
+        base_url = await server.start()
+        # Rate limiting is not what is measured here, so give the client ample quota
+        client = IpApiClient(
+            base_url=base_url, batch_window=0.005,
+            rate_limiter=TokenBucket(rate=10000, capacity=10000), max_concurrency=3
+        )
+        try:
+            targets = [f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}' for i in range(total)]
+            latencies: List[float] = []
+            start = time.perf_counter()
+            countries = await asyncio.gather(*(_timed(client.lookup(target), latencies) for target in targets))
+            wall = time.perf_counter() - start
+            results.append(harness.latency_result(
+                'network.geo_lookup', latencies, wall, {'server_latency_ms': latency * 1000},
+                batches=server.requests,
+                failures=sum(1 for country in countries if country == 'Unknown')
+            ))
+        finally:
+            await client.close()
+            await server.stop()
+    return results
+
+
+async def _bench_state(quick: bool) -> List[Dict]:
+    results = []
+    total = 2000 if quick else 10000
+    links = [f'tg://proxy?server=10.0.{i >> 8 & 255}.{i & 255}&port=443' for i in range(total)]
+    record = {'country': 'Germany', 'server': '10.0.0.1', 'port': '443', 'ping': 12.5}
+    server = FakeRedis()
+    await server.start()
+    backends = {'local': LocalStateBackend(), 'resp': RedisStateBackend(RespClient(port=server.port))}
+    try:
+        for name, backend in backends.items():
+            # The ingest path per new link: lookup, store, publish lease
+            for operation, call in (
+                ('get_proxy', lambda link: backend.get_proxy(link)),
+                ('put_proxy', lambda link: backend.put_proxy(link, record, 60)),
+                ('acquire_lease', lambda link: backend.acquire_lease(f'publish:{link}', 'bench', 60))
+            ):
+                latencies: List[float] = []
+                start = time.perf_counter()
+                await asyncio.gather(*(_timed(call(link), latencies) for link in links))
+                results.append(harness.latency_result(
+                    'network.state_' + operation, latencies, time.perf_counter() - start, {'backend': name}
+                ))
+    finally:
+        for backend in backends.values():
+            await backend.close()
+        await server.stop()
+    return results
+
+
+async def _run(quick: bool) -> List[Dict]:
+    return (
+        await _bench_probe(quick) + await _bench_handshake(quick) +
+        await _bench_geo(quick) + await _bench_state(quick)
+    )
+
+
+def run(quick: bool = False) -> List[Dict]:
+    """Run the probe, handshake, geo lookup and shared state benchmarks on a fresh event loop."""
+    return asyncio.run(_run(quick))
@@ -0,0 +1,43 @@
+"""
+Per-message hot path: link extraction, link parsing and message formatting.
+"""
+
+import random
+from typing import Dict, List
+
+import harness  # noqa: F401  (puts src/ on sys.path)
+import corpus
+from messages import (
+    extract_proxy_links, parse_proxy_link, escape_markdown, format_footer, format_proxy_message
+)
+
+
+def run(quick: bool = False) -> List[Dict]:
+    """Run the parsing and formatting benchmarks."""
+    count = 2000 if quick else 20000
+    repeat = 3 if quick else 7
+    texts = corpus.messages(count)
+    links = [link for text in texts for link in extract_proxy_links(text)]
+    parsed = [p for p in (parse_proxy_link(link) for link in links) if p]
+    rng = random.Random(2)
+    names = corpus.countries(len(parsed))
+    pings = [round(rng.uniform(5, 900), 2) if rng.random() < 0.8 else None for _ in parsed]
+    footer = format_footer('https://t.me/Orv_Proxy', 'https://t.me/Orv_Vpn', 'https://t.me/OrBSup_bot', None)
+    format_inputs = [(names[i], server, port, pings[i]) for i, (server, port) in enumerate(parsed)]
+    params = {'messages': count, 'links': len(links)}
+
+    return [
+        harness.bench_calls('parsing.extract_proxy_links', extract_proxy_links, texts, repeat, params),
+        harness.bench_calls('parsing.parse_proxy_link', parse_proxy_link, links, repeat, params),
+        harness.bench_calls('parsing.escape_markdown', escape_markdown, names, repeat, params),
+        harness.bench_calls(
+            'parsing.format_proxy_message',
+            lambda args: format_proxy_message(*args, footer=footer),
+            format_inputs, repeat, params
+        ),
+        harness.bench_calls(
+            'parsing.message_path',
+            lambda text: [parse_proxy_link(link) for link in extract_proxy_links(text)],
+            texts, repeat, params
+        )
+    ]
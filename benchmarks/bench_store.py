@@ -0,0 +1,69 @@
+"""
+Proxy store: insert and lookup cost as the table grows from 100 to 100k rows,
+and the cost of recording a probe in the quality tracker at the same sizes.
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import Dict, List
+
+import harness
+import corpus
+from quality import QualityTracker
+from store import ProxyStore
+
+SIZES = (100, 1000, 10000, 100000)
+QUICK_SIZES = (100, 1000, 10000)
+LOOKUPS = 2000
+
+
+def run(quick: bool = False) -> List[Dict]:
+    """Grow one store through each size and measure inserts and lookups at every step."""
+    rng = random.Random(3)
+    sizes = QUICK_SIZES if quick else SIZES
+    links = list(dict.fromkeys(corpus.proxy_link(rng) for _ in range(int(sizes[-1] * 1.02) + LOOKUPS)))
+    inserted, unseen = links[:sizes[-1]], links[sizes[-1]:sizes[-1] + LOOKUPS]
+    results = []
+
+    directory = tempfile.mkdtemp(prefix='orv-bench-')
+    try:
+        store = ProxyStore(os.path.join(directory, 'proxies.db'))
+        count = 0
+        for size in sizes:
+            start = time.perf_counter()
+            for link in inserted[count:size]:
+                store.add_if_absent(link, 'Germany', '127.0.0.1', '443', 12.5)
+            elapsed = time.perf_counter() - start
+            params = {'size': size}
+            results.append(harness.result(
+                'store.insert', params,
+                calls=size - count,
+                ops_per_sec=round((size - count) / elapsed, 1),
+                mean_ns=round(elapsed / (size - count) * 1e9, 1)
+            ))
+            count = size
+
+            hits = [rng.choice(inserted[:size]) for _ in range(LOOKUPS)]
+            results.append(harness.bench_calls('store.contains_hit', store.contains, hits, 5, params))
+            results.append(harness.bench_calls('store.contains_miss', store.contains, unseen, 5, params))
+            results.append(harness.bench_calls(
+                'store.add_duplicate',
+                lambda link: store.add_if_absent(link, 'Germany', '127.0.0.1', '443'),
+                hits, 5, params
+            ))
+            results.append(harness.bench_calls('store.get_record', store.get_record, hits, 3, params))
+
+            # Should stay flat across sizes: one ring slot per probe
+            tracker = QualityTracker()
+            for proxy_id in range(size):
+                tracker.record(proxy_id, 50.0)
+            probes = [(rng.randrange(size), rng.choice((None, rng.uniform(20, 500)))) for _ in range(LOOKUPS)]
+            results.append(harness.bench_calls(
+                'quality.record', lambda probe: tracker.record(*probe), probes, 5, params
+            ))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
@@ -0,0 +1,121 @@
+"""
+Synthetic corpus of proxy-channel messages.
+
+Messages mimic what the monitored channels post: a few lines of (often
+Persian) text, emoji, markdown, unrelated links and zero to several MTProxy
+links with IPv4, IPv6 or hostname servers and plain, dd- or ee-prefixed
+secrets. Generation is seeded so every run benchmarks the same input.
+"""
+
+import base64
+import random
+import re
+import zlib
+from typing import List, Optional, Sequence, Tuple
+
+Endpoint = Tuple[str, int]
+
+_TEXT = [
+    'پروکسی جدید', 'اتصال پرسرعت', 'Fast MTProto proxy', 'Free proxy for Telegram', '🔥 New proxy 🔥',
+    'همه اپراتورها', '*All ISPs*', '_Tested_', 'Join us for more: @channel', 'ping: low', '✅ Active',
+    'لینک‌ها را به اشتراک بگذارید', '[Support](https://t.me/support)', '#proxy #mtproto', '~ Orv ~'
+]
+_NOISE_LINKS = [
+    'https://t.me/joinchat/AAAAAEz_abcdef', 'https://example.com/page?id=42', 'https://t.me/some_channel/1234',
+    'tg://resolve?domain=some_channel'
+]
+_DOMAINS = ['www.google.com', 'cdn.cloudflare.com', 'speedtest.net', 'digikala.com', 'aparat.com']
+_COUNTRIES = ['Germany', 'Netherlands', 'Iran', 'United States', 'Finland', 'Russia', 'Türkiye', 'Côte d\'Ivoire']
+
+
+def _server(rng: random.Random) -> str:
+    kind = rng.random()
+    if kind < 0.7:
+        return '.'.join(str(rng.randint(1, 254)) for _ in range(4))
+    if kind < 0.8:
+        return '2a01:4f8:' + ':'.join(f'{rng.randint(0, 0xffff):x}' for _ in range(6))
+    return f"{rng.choice(['mtp', 'proxy', 'fast', 'vip'])}{rng.randint(1, 999)}.{rng.choice(['com', 'net', 'ir', 'xyz'])}"
+
+
+def _secret(rng: random.Random) -> str:
+    key = bytes(rng.getrandbits(8) for _ in range(16))
+    kind = rng.random()
+    if kind < 0.3:
+        return key.hex()
+    if kind < 0.5:
+        return 'dd' + key.hex()
+    domain = rng.choice(_DOMAINS).encode('ascii')
+    if kind < 0.8:
+        return 'ee' + key.hex() + domain.hex()
+    # Base64url form as posted by some channels
+    return base64.urlsafe_b64encode(b'\xee' + key + domain).decode('ascii').rstrip('=')
+
+
+def proxy_link(rng: random.Random, endpoint: Optional[Endpoint] = None) -> str:
+    """Return one random, well-formed proxy link (optionally for a given server and port)."""
+    scheme = rng.choice(['https://t.me/proxy', 'http://t.me/proxy'])
+    if endpoint is None:
+        endpoint = (_server(rng), rng.choice([443, 8443, 2053, 80, rng.randint(1, 65535)]))
+    return f"{scheme}?server={endpoint[0]}&port={endpoint[1]}&secret={_secret(rng)}"
+
+
+def messages(
+    count: int,
+    seed: int = 1,
+    endpoints: Optional[Sequence[Endpoint]] = None,
+    repost_ratio: float = 0.0
+) -> List[str]:
+    """
+    Generate channel messages.
+
+    Args:
+        count: Number of messages
+        seed: Random seed
+        endpoints: Servers to draw links from (random public addresses if omitted)
+        repost_ratio: Fraction of messages that repeat an earlier message
+
+    Returns:
+        Message texts; roughly one in five contains no proxy link
+    """
+    rng = random.Random(seed)
+    result = []
+    for _ in range(count):
+        if result and rng.random() < repost_ratio:
+            result.append(rng.choice(result))
+            continue
+        lines = [rng.choice(_TEXT) for _ in range(rng.randint(1, 4))]
+        for _ in range(rng.choice([0, 1, 1, 1, 2, 3, 5])):
+            endpoint = rng.choice(endpoints) if endpoints else None
+            lines.insert(rng.randint(0, len(lines)), proxy_link(rng, endpoint))
+        if rng.random() < 0.3:
+            lines.append(rng.choice(_NOISE_LINKS))
+        result.append('\n'.join(lines))
+    return result
+
+
+def countries(count: int, seed: int = 1) -> List[str]:
+    """Return country names including characters that need markdown escaping."""
+    rng = random.Random(seed)
+    return [rng.choice(_COUNTRIES) for _ in range(count)]
+
+
+_LINK_PATTERN = re.compile(r'https?://t\.me/proxy\?[^\s<>"]+')
+_SERVER_PARAM = re.compile(r'(?<=server=)[^&\s]+')
+_PORT_PARAM = re.compile(r'(?<=port=)[^&\s]+')
+
+
+def rewrite_endpoints(text: str, endpoints: Sequence[Endpoint]) -> str:
+    """
+    Point every proxy link in a recorded message at one of the given endpoints.
+
+    The endpoint is chosen by a hash of the link's original server and port,
+    so reposts still produce identical links and are deduplicated as before.
+    """
+    def replace(match: 're.Match') -> str:
+        link = match.group(0)
+        server, port = _SERVER_PARAM.search(link), _PORT_PARAM.search(link)
+        key = f"{server.group(0) if server else ''}:{port.group(0) if port else ''}"
+        host, new_port = endpoints[zlib.crc32(key.encode('utf-8')) % len(endpoints)]
+        link = _SERVER_PARAM.sub(host, link, count=1)
+        return _PORT_PARAM.sub(str(new_port), link, count=1)
+    return _LINK_PATTERN.sub(replace, text)
@@ -0,0 +1,425 @@
+"""
+Local stand-ins for the network services the bot talks to.
+
+TcpEndpoints opens listening sockets on loopback for the prober to connect
+to; FakeIpApi answers ip-api.com's /batch endpoint (including its X-Rl/X-Ttl
+rate limit headers) with a deterministic country per address; FakeBotClient
+takes the place of the Telegram bot client when sending; FakeRedis serves the
+subset of the Redis protocol used by the shared state backend; FakeMtprotoProxy
+plays the proxy side of the MTProxy handshake for plain, dd and ee secrets.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import os
+import struct
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+from telethon.crypto import AESModeCTR
+
+from state import RespClient
+
+COUNTRIES = ['Germany', 'Netherlands', 'Finland', 'United States', 'France', 'Iran', 'Russia', 'Türkiye']
+
+
+def country_for(address: str) -> str:
+    """Deterministic country for an address, as the fake ip-api reports it."""
+    return COUNTRIES[zlib.crc32(address.encode('utf-8')) % len(COUNTRIES)]
+
+
+class TcpEndpoints:
+    """
+    Listening TCP sockets that accept and immediately close connections.
+
+    Args:
+        count: Number of listeners
+        accept_delay: Seconds to wait before closing each accepted connection
+        spread: Bind listener i to its own loopback address (127.i.0.1 and up)
+            so servers look distinct to geolocation; falls back to 127.0.0.1
+            where the platform only routes that address
+    """
+
+    def __init__(self, count: int = 32, accept_delay: float = 0.0, spread: bool = False) -> None:
+        self.count = count
+        self.accept_delay = accept_delay
+        self.spread = spread
+        self._servers: List[asyncio.AbstractServer] = []
+        self.addresses: List[Tuple[str, int]] = []
+        self.accepted = 0
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.accepted += 1
+        if self.accept_delay:
+            await asyncio.sleep(self.accept_delay)
+        writer.close()
+
+    async def start(self) -> List[Tuple[str, int]]:
+        """Open the listeners and return their (host, port) addresses."""
+        for index in range(self.count):
+            host = f'127.{index % 254 + 1}.{index // 254}.1' if self.spread else '127.0.0.1'
+            try:
+                server = await asyncio.start_server(self._handle, host, 0, backlog=1024)
+            except OSError:
+                server = await asyncio.start_server(self._handle, '127.0.0.1', 0, backlog=1024)
+            self._servers.append(server)
+            self.addresses.append(server.sockets[0].getsockname()[:2])
+        return self.addresses
+
+    async def closed_port(self) -> int:
+        """Return a port on 127.0.0.1 that refuses connections."""
+        server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+        return port
+
+    async def stop(self) -> None:
+        """Close every listener."""
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers.clear()
+
+
+class FakeIpApi:
+    """
+    Minimal ip-api.com /batch server.
+
+    Like the real service it allows a number of requests per window, reports
+    what is left in X-Rl and the seconds until the window resets in X-Ttl, and
+    answers 429 once the quota is spent.
+
+    Args:
+        latency: Seconds to wait before answering each request
+        rate_per_window: Requests allowed per window
+        window: Window length in seconds
+    """
+
+    def __init__(self, latency: float = 0.0, rate_per_window: int = 10000, window: int = 60) -> None:
+        self.latency = latency
+        self.rate_per_window = rate_per_window
+        self.window = window
+        self.requests = 0
+        self.queries = 0
+        self.rejected = 0
+        self._window_start = time.monotonic()
+        self._window_requests = 0
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ''
+
+    async def _batch(self, request: web.Request) -> web.Response:
+        targets = await request.json()
+        now = time.monotonic()
+        if now - self._window_start >= self.window:
+            self._window_start, self._window_requests = now, 0
+        reset_after = str(max(1, int(self._window_start + self.window - now)))
+        if self._window_requests >= self.rate_per_window:
+            self.rejected += 1
+            return web.Response(status=429, headers={'X-Rl': '0', 'X-Ttl': reset_after})
+        self._window_requests += 1
+        self.requests += 1
+        self.queries += len(targets)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        body = [{'status': 'success', 'country': country_for(target), 'query': target} for target in targets]
+        return web.json_response(body, headers={
+            'X-Rl': str(self.rate_per_window - self._window_requests), 'X-Ttl': reset_after
+        })
+
+    async def start(self) -> str:
+        """Start serving on a free local port and return the base URL."""
+        application = web.Application()
+        application.router.add_post('/batch', self._batch)
+        self._runner = web.AppRunner(application, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.base_url = f'http://127.0.0.1:{port}'
+        return self.base_url
+
+    async def stop(self) -> None:
+        """Stop the server."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class FakeBotClient:
+    """
+    Stand-in for the bot's TelegramClient as used by bot.send_proxies.
+
+    Args:
+        latency: Seconds each send_message call takes
+        on_send: Called with every proxy link in a sent message's buttons
+    """
+
+    def __init__(self, latency: float = 0.0, on_send: Optional[Callable[[str], None]] = None) -> None:
+        self.latency = latency
+        self.on_send = on_send
+        self.messages = 0
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def send_message(self, entity, message: str, buttons=None, link_preview: bool = True) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.messages += 1
+        if self.on_send is None:
+            return
+        rows = buttons if isinstance(buttons, list) else [buttons] if buttons else []
+        for row in rows:
+            for button in (row if isinstance(row, list) else [row]):
+                self.on_send(button.url)
+
+
+class FakeRedis:
+    """
+    In-process server for the Redis commands the shared state backend uses.
+
+    Supports PING, AUTH, SELECT, GET, SET (with NX, PX and EX), DEL, INCR,
+    PTTL, PEXPIRE and FLUSHDB on one keyspace, with Redis's reply types and
+    expiry semantics (INCR keeps a key's expiry, SET without PX clears it).
+
+    Args:
+        latency: Seconds to wait before answering each command
+    """
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        # key -> (value, monotonic expiry or None)
+        self._data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.commands = 0
+        self.port = 0
+
+    def _live(self, key: bytes) -> Optional[Tuple[bytes, Optional[float]]]:
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def _execute(self, name: str, args: List[bytes]) -> Any:
+        if name in ('PING', 'AUTH', 'SELECT'):
+            return 'PONG' if name == 'PING' else 'OK'
+        if name == 'FLUSHDB':
+            self._data.clear()
+            return 'OK'
+        if name == 'GET':
+            entry = self._live(args[0])
+            return entry[0] if entry else None
+        if name == 'SET':
+            key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+            expiry = None
+            for unit, scale in ((b'PX', 1000.0), (b'EX', 1.0)):
+                if unit in options:
+                    expiry = time.monotonic() + int(options[options.index(unit) + 1]) / scale
+            if b'NX' in options and self._live(key) is not None:
+                return None
+            self._data[key] = (value, expiry)
+            return 'OK'
+        if name == 'DEL':
+            return sum(1 for key in args if self._live(key) is not None and self._data.pop(key))
+        if name == 'INCR':
+            entry = self._live(args[0])
+            try:
+                value = int(entry[0]) + 1 if entry else 1
+            except ValueError:
+                return ValueError('ERR value is not an integer or out of range')
+            self._data[args[0]] = (str(value).encode(), entry[1] if entry else None)
+            return value
+        if name == 'PTTL':
+            entry = self._live(args[0])
+            if entry is None:
+                return -2
+            return -1 if entry[1] is None else max(0, int((entry[1] - time.monotonic()) * 1000))
+        if name == 'PEXPIRE':
+            entry = self._live(args[0])
+            if entry is None:
+                return 0
+            self._data[args[0]] = (entry[0], time.monotonic() + int(args[1]) / 1000.0)
+            return 1
+        return ValueError(f"ERR unknown command '{name}'")
+
+    @staticmethod
+    def _encode(reply: Any) -> bytes:
+        if reply is None:
+            return b'$-1\r\n'
+        if isinstance(reply, ValueError):
+            return b'-%s\r\n' % str(reply).encode()
+        if isinstance(reply, int):
+            return b':%d\r\n' % reply
+        if isinstance(reply, str):
+            return b'+%s\r\n' % reply.encode()
+        return b'$%d\r\n%s\r\n' % (len(reply), reply)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                command = await RespClient.read_reply(reader)
+                self.commands += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                writer.write(self._encode(self._execute(command[0].decode().upper(), command[1:])))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> str:
+        """Start serving on a free local port and return its redis:// URL."""
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return f'redis://127.0.0.1:{self.port}/0'
+
+    async def stop(self) -> None:
+        """Stop the server."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+class FakeMtprotoProxy:
+    """
+    MTProxy that completes the handshake itself instead of relaying to Telegram.
+
+    It derives the obfuscated2 keys from the client's 64-byte header and its
+    own secret, checks the transport tag, and answers a req_pq_multi with a
+    resPQ carrying the client's nonce. For an ee secret it first checks the
+    ClientHello HMAC and answers with a ServerHello whose random field is the
+    HMAC the client verifies, then unwraps TLS application records. A client
+    using another secret gets the connection closed, as a real proxy does.
+    This is written independently of mtproto.py so each side checks the other.
+
+    Args:
+        secret: Proxy secret in hex (plain, dd- or ee-prefixed)
+        silent: Accept connections but never answer (for timeouts)
+    """
+
+    _TAGS = {'plain': (b'\xee\xee\xee\xee', b'\xdd\xdd\xdd\xdd'), 'dd': (b'\xdd\xdd\xdd\xdd',)}
+    _REQ_PQ_MULTI = 0xbe7e8ef1
+    _RES_PQ = 0x05162463
+
+    def __init__(self, secret: str, silent: bool = False) -> None:
+        raw = bytes.fromhex(secret)
+        if len(raw) == 16:
+            self.kind, self.key = 'plain', raw
+        else:
+            self.kind, self.key = raw[:1].hex(), raw[1:17]
+        self.silent = silent
+        self._server: Optional[asyncio.AbstractServer] = None
+        # Open connections and the tasks serving them
+        self._connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self.port = 0
+        self.accepted = 0
+        self.rejected = 0
+
+    async def _read_record(self, reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+        header = await reader.readexactly(5)
+        return header[0], await reader.readexactly(struct.unpack('>H', header[3:5])[0])
+
+    async def _tls_hello(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        header = await reader.readexactly(5)
+        hello = header + await reader.readexactly(struct.unpack('>H', header[3:5])[0])
+        digest = hello[11:43]
+        mac = hmac.new(self.key, hello[:11] + bytes(32) + hello[43:], hashlib.sha256).digest()
+        # The last 4 bytes carry the client's timestamp XORed into the HMAC
+        if header[0] != 0x16 or not hmac.compare_digest(digest[:28], mac[:28]):
+            return False
+        # Version, zeroed random, the client's session ID, TLS_AES_128_GCM_SHA256, no extensions
+        body = b'\x03\x03' + bytes(32) + b'\x20' + hello[44:76] + b'\x13\x01\x00\x00\x00'
+        handshake = b'\x02' + len(body).to_bytes(3, 'big') + body
+        response = (
+            b'\x16\x03\x03' + struct.pack('>H', len(handshake)) + handshake +
+            b'\x14\x03\x03\x00\x01\x01' + b'\x17\x03\x03\x00\x40' + os.urandom(64)
+        )
+        server_random = hmac.new(self.key, digest + response, hashlib.sha256).digest()
+        writer.write(response[:11] + server_random + response[43:])
+        await writer.drain()
+        return True
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections[writer] = asyncio.current_task()
+        try:
+            if self.silent:
+                await reader.read()
+                return
+            tls = self.kind == 'ee'
+            buffer = b''
+
+            async def read(n: int) -> bytes:
+                nonlocal buffer
+                if not tls:
+                    return await reader.readexactly(n)
+                while len(buffer) < n:
+                    record_type, payload = await self._read_record(reader)
+                    if record_type == 0x17:
+                        buffer += payload
+                data, buffer = buffer[:n], buffer[n:]
+                return data
+
+            if tls and not await self._tls_hello(reader, writer):
+                self.rejected += 1
+                return
+
+            header = await read(64)
+            reversed_header = header[55:7:-1]
+            decryptor = AESModeCTR(hashlib.sha256(header[8:40] + self.key).digest(), header[40:56])
+            encryptor = AESModeCTR(hashlib.sha256(reversed_header[:32] + self.key).digest(), reversed_header[32:48])
+            tag = decryptor.decrypt(header)[56:60]
+            if tag not in self._TAGS.get(self.kind, self._TAGS['dd']):
+                self.rejected += 1
+                return
+
+            length = struct.unpack('<i', decryptor.decrypt(await read(4)))[0]
+            if not 20 <= length <= 4096:
+                self.rejected += 1
+                return
+            message = decryptor.decrypt(await read(length))
+            constructor, nonce = struct.unpack('<I', message[20:24])[0], message[24:40]
+            if message[:8] != bytes(8) or constructor != self._REQ_PQ_MULTI:
+                self.rejected += 1
+                return
+
+            # resPQ: nonce, server_nonce, pq as TL bytes, vector of one key fingerprint
+            body = (
+                struct.pack('<I', self._RES_PQ) + nonce + os.urandom(16) +
+                b'\x08' + os.urandom(8) + bytes(3) + struct.pack('<IIq', 0x1cb5c415, 1, 0x7e0e8f2b5a1c3d4e)
+            )
+            reply = struct.pack('<qqi', 0, int(time.time() * (1 << 32)) | 1, len(body)) + body
+            frame = encryptor.encrypt(struct.pack('<i', len(reply)) + reply)
+            writer.write(b'\x17\x03\x03' + struct.pack('>H', len(frame)) + frame if tls else frame)
+            await writer.drain()
+            self.accepted += 1
+            await reader.read()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def start(self) -> int:
+        """Start serving on a free port on 127.0.0.1 and return the port."""
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self) -> None:
+        """Stop the server."""
+        if self._server is not None:
+            self._server.close()
+            # Connections still held open (silent mode, clients that never hung up)
+            connections = dict(self._connections)
+            for writer in connections:
+                writer.close()
+            await asyncio.gather(*connections.values(), return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
@@ -0,0 +1,126 @@
+"""
+Timing helpers and result records shared by the benchmark modules.
+
+Every benchmark produces a flat dictionary so a run can be written as JSON
+and compared with a run from another commit (see run.py --compare).
+"""
+
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+# Make the application modules importable (they live in src/, like main.py)
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Return the nearest-rank percentile of pre-sorted values."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def result(name: str, params: Optional[Dict[str, Any]] = None, **values: Any) -> Dict[str, Any]:
+    """Build one benchmark result record."""
+    record = {'name': name, 'params': params or {}}
+    record.update(values)
+    return record
+
+
+def bench_calls(
+    name: str,
+    func: Callable[[Any], Any],
+    items: Sequence[Any],
+    repeat: int = 5,
+    params: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Time a function over every item, several times, and report the per-call cost.
+
+    Calls are timed in bulk per repeat (like timeit), so clock overhead does
+    not dominate sub-microsecond functions.
+
+    Args:
+        name: Benchmark name
+        func: Function called once per item
+        items: Inputs
+        repeat: Number of passes over the items
+        params: Parameters recorded with the result
+
+    Returns:
+        Result record with ops_per_sec (best pass), min/median per-call ns
+    """
+    per_call: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for item in items:
+            func(item)
+        per_call.append((time.perf_counter_ns() - start) / len(items))
+    per_call.sort()
+    return result(
+        name, params,
+        calls=len(items),
+        repeat=repeat,
+        ops_per_sec=round(1e9 / per_call[0], 1) if per_call[0] else None,
+        min_ns=round(per_call[0], 1),
+        median_ns=round(percentile(per_call, 0.5), 1)
+    )
+
+
+def latency_result(
+    name: str,
+    latencies_s: Iterable[float],
+    wall_s: float,
+    params: Optional[Dict[str, Any]] = None,
+    **extra: Any
+) -> Dict[str, Any]:
+    """
+    Summarise individually timed operations that ran concurrently.
+
+    Args:
+        name: Benchmark name
+        latencies_s: Per-operation latency in seconds
+        wall_s: Wall-clock time for all operations
+        params: Parameters recorded with the result
+        **extra: Additional values to record
+
+    Returns:
+        Result record with throughput and p50/p95/p99 latency in milliseconds
+    """
+    values = sorted(latencies_s)
+    return result(
+        name, params,
+        operations=len(values),
+        wall_s=round(wall_s, 4),
+        ops_per_sec=round(len(values) / wall_s, 1) if wall_s else None,
+        p50_ms=round(percentile(values, 0.50) * 1000, 3),
+        p95_ms=round(percentile(values, 0.95) * 1000, 3),
+        p99_ms=round(percentile(values, 0.99) * 1000, 3),
+        max_ms=round(values[-1] * 1000, 3) if values else 0.0,
+        **extra
+    )
+
+
+def environment() -> Dict[str, Any]:
+    """Describe the machine and source revision a run was made on."""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(SRC_DIR), capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+    }
@@ -0,0 +1,329 @@
+"""
+End-to-end replay load generator.
+
+Feeds channel messages straight into bot.my_event_handler, with no Telegram
+connection, and follows every new proxy link through the real pipeline (parse,
+enrich, persist, publish) to the send. Network services are replaced with
+local fakes: proxies point at loopback TCP listeners, geolocation goes to a
+fake ip-api server that enforces a request quota, and bot.send_message is a
+FakeBotClient. The proxy store is a temporary database. With --shared-state
+check results, publish leases and ip-api tokens go through the RESP backend to
+an in-process fake Redis server instead of memory.
+
+Usage:
+    python benchmarks/replay.py [--messages N] [--rate MSGS_PER_SEC]
+                                [--input recorded.jsonl [--speed X]]
+                                [--shared-state [--state-latency S]]
+                                [--output report.json]
+
+Recorded input is JSON lines, each either a message string or an object with
+"message" and an optional "offset" (seconds since the start of the stream).
+Links in recorded messages are rewritten to the fake endpoints.
+
+Without --rate messages are replayed as fast as the handler accepts them
+(recorded input with offsets keeps its timing, scaled by --speed). With
+--rate each message is handled in its own task, as Telethon does, so
+backpressure shows up as latency rather than a slower generator; latency is
+measured from each message's scheduled time.
+
+The pipeline, worker counts and queue policy come from the usual environment
+variables (PIPELINE_QUEUE_SIZE, PIPELINE_OVERFLOW, ENRICH_WORKERS,
+ENRICH_PROCESSES, ...).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+import harness
+import corpus
+from fakes import FakeBotClient, FakeIpApi, FakeRedis, TcpEndpoints
+
+# Seconds between progress checks while waiting for the publisher to drain
+_DRAIN_POLL = 0.05
+# Source channel ID carried by replayed events
+REPLAY_CHAT_ID = -1000000000001
+
+
+def load_recorded(path: str) -> List[Tuple[Optional[float], str]]:
+    """Read (offset, message) pairs from a JSON lines file."""
+    messages = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if isinstance(entry, str):
+                messages.append((None, entry))
+            else:
+                offset = entry.get('offset')
+                messages.append((float(offset) if offset is not None else None, entry['message']))
+    return messages
+
+
+def _import_bot(workdir: str, ipapi_url: str, args: argparse.Namespace, state_url: Optional[str] = None):
+    """Import the bot module against a temporary store and the fake services."""
+    # Credentials are never used; real values from .env are fine too
+    for key, value in (('API_ID', '0'), ('API_HASH', 'replay'), ('BOT_TOKEN', 'replay'),
+                       ('CHANNEL_ID', 'replay'), ('CHANNELS', '0')):
+        os.environ.setdefault(key, value)
+    os.environ['IPAPI_URL'] = ipapi_url
+    # The fake endpoints accept TCP connections but don't speak MTProto
+    os.environ['PROBE_MODE'] = 'tcp'
+    os.environ['PUBLISH_RATE_PER_MINUTE'] = str(args.publish_rate)
+    # The replay follows accepted proxies through the live stream
+    os.environ['STREAM_CLIENT_BUFFER'] = str(10 ** 7)
+    # Never touch a shared state server configured in .env
+    os.environ['STATE_BACKEND'] = 'redis' if state_url else 'local'
+    if state_url:
+        os.environ['STATE_URL'] = state_url
+
+    import store as store_module
+    store_module.DB_FILE = os.path.join(workdir, 'proxies.db')
+    store_module.LEGACY_PROXY_FILE = os.path.join(workdir, 'proxies.json')
+
+    # Telethon creates its session files in the working directory
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import bot
+    finally:
+        os.chdir(previous_cwd)
+
+    from config import geo_cache_size, geo_cache_ttl, geo_cache_share_prefix
+    from geocache import GeoCache
+    from ratelimit import TokenBucket
+    from state import SharedTokenBucket
+    # Start cold and never write the real geo_cache.json
+    bot.geo_cache = GeoCache(max_entries=geo_cache_size, ttl=geo_cache_ttl, share_prefix=geo_cache_share_prefix)
+    if bot.shared_state.shared:
+        bot.geo_client.rate_limiter = SharedTokenBucket(
+            bot.shared_state, 'ipapi', rate=args.geo_quota / 60.0, capacity=args.geo_quota
+        )
+    else:
+        bot.geo_client.rate_limiter = TokenBucket(rate=args.geo_quota / 60.0, capacity=args.geo_quota)
+    return bot
+
+
+def _endpoint_pool(live: List[Tuple[str, int]], dead_port: int, dead_ratio: float) -> List[Tuple[str, int]]:
+    """Mix refusing endpoints into the live ones at the requested ratio."""
+    if dead_ratio <= 0:
+        return list(live)
+    dead_count = max(1, round(len(live) * dead_ratio / (1 - dead_ratio)))
+    return list(live) + [('127.0.0.1', dead_port)] * dead_count
+
+
+def _latency_summary(latencies: List[float]) -> Dict[str, float]:
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'p50_ms': round(harness.percentile(values, 0.50) * 1000, 3),
+        'p95_ms': round(harness.percentile(values, 0.95) * 1000, 3),
+        'p99_ms': round(harness.percentile(values, 0.99) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3) if values else 0.0
+    }
+
+
+async def replay(args: argparse.Namespace, workdir: str) -> Dict:
+    """Run one replay and return the report."""
+    endpoints = TcpEndpoints(count=args.endpoints, spread=True)
+    live = await endpoints.start()
+    pool = _endpoint_pool(live, await endpoints.closed_port(), args.dead_ratio)
+    ipapi = FakeIpApi(latency=args.ipapi_latency, rate_per_window=args.geo_quota, window=60)
+    ipapi_url = await ipapi.start()
+    state_server = FakeRedis(latency=args.state_latency) if args.shared_state else None
+    state_url = await state_server.start() if state_server is not None else None
+
+    if args.input:
+        recorded = load_recorded(args.input)
+        schedule = [(offset, corpus.rewrite_endpoints(text, pool)) for offset, text in recorded]
+    else:
+        texts = corpus.messages(args.messages, seed=args.seed, endpoints=pool, repost_ratio=args.repost_ratio)
+        schedule = [(None, text) for text in texts]
+    if args.rate:
+        schedule = [(index / args.rate, text) for index, (_, text) in enumerate(schedule)]
+    elif not args.input or any(offset is None for offset, _ in schedule):
+        schedule = [(None, text) for _, text in schedule]
+    else:
+        schedule = [(offset / args.speed, text) for offset, text in schedule]
+
+    bot = _import_bot(workdir, ipapi_url, args, state_url)
+    from broadcast import ProxyFilter
+    # Links per message are extracted up front so bookkeeping stays off the clock
+    message_links = [bot.extract_proxy_links(text) for _, text in schedule]
+
+    injected: Dict[str, float] = {}
+    accepted: Dict[str, float] = {}
+    sent: Dict[str, float] = {}
+
+    def on_send(link: str) -> None:
+        sent.setdefault(link, time.perf_counter())
+
+    bot.bot = FakeBotClient(latency=args.send_latency, on_send=on_send)
+    subscription = bot.broadcaster.subscribe(ProxyFilter())
+
+    async def follow_accepted() -> None:
+        while not subscription.closed:
+            for record in await subscription.get():
+                accepted.setdefault(record['link'], time.perf_counter())
+
+    if bot.enrichment_pool is not None:
+        await bot.enrichment_pool.start()
+    await bot.pipeline.start()
+    await bot.publisher.start()
+    follower = asyncio.create_task(follow_accepted())
+    handlers = set()
+
+    start = time.perf_counter()
+    for message_id, ((offset, text), links) in enumerate(zip(schedule, message_links), 1):
+        if offset is not None:
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            scheduled = start + offset
+        else:
+            scheduled = time.perf_counter()
+        for link in links:
+            injected.setdefault(link, scheduled)
+        event = SimpleNamespace(chat_id=REPLAY_CHAT_ID, message=SimpleNamespace(id=message_id, message=text))
+        if offset is None:
+            await bot.my_event_handler(event)
+        else:
+            task = asyncio.create_task(bot.my_event_handler(event))
+            handlers.add(task)
+            task.add_done_callback(handlers.discard)
+    if handlers:
+        await asyncio.gather(*handlers)
+    ingest_wall = time.perf_counter() - start
+
+    await bot.pipeline.stop(drain=True)
+    if bot.enrichment_pool is not None:
+        await bot.enrichment_pool.stop()
+    deadline = time.perf_counter() + args.drain_timeout
+    while bot.store.outbound_depth() and time.perf_counter() < deadline:
+        await asyncio.sleep(_DRAIN_POLL)
+    total_wall = time.perf_counter() - start
+
+    await bot.publisher.stop()
+    subscription.close()
+    await follower
+    await bot.geo_client.close()
+    await bot.shared_state.close()
+    if state_server is not None:
+        await state_server.stop()
+    await ipapi.stop()
+    await endpoints.stop()
+
+    stages = bot.pipeline.stats()
+    links_total = sum(len(links) for links in message_links)
+    last_send = max(sent.values(), default=start)
+    return {
+        'environment': harness.environment(),
+        'parameters': {
+            key: value for key, value in vars(args).items() if key not in ('output',)
+        },
+        'throughput': {
+            'messages': len(schedule),
+            'links': links_total,
+            'unique_links': len(injected),
+            'ingest_wall_s': round(ingest_wall, 4),
+            'total_wall_s': round(total_wall, 4),
+            'messages_per_sec': round(len(schedule) / ingest_wall, 1) if ingest_wall else None,
+            'sent_per_sec': round(len(sent) / (last_send - start), 1) if sent and last_send > start else None
+        },
+        'latency': {
+            'accept': _latency_summary([accepted[link] - injected[link] for link in accepted if link in injected]),
+            'end_to_end': _latency_summary([sent[link] - injected[link] for link in sent if link in injected])
+        },
+        'drops': {
+            'duplicates': links_total - len(injected),
+            'not_accepted': len(injected) - len(accepted),
+            'not_sent': len(accepted) - len(sent),
+            'pipeline_overflow': sum(stage['dropped'] for stage in stages.values()),
+            'pipeline_failed': sum(stage['failed'] for stage in stages.values()),
+            'publisher_dropped': bot.publisher.dropped,
+            'publisher_backlog': bot.store.outbound_depth()
+        },
+        'pipeline': stages,
+        'enrichment_pool': bot.enrichment_pool.stats() if bot.enrichment_pool is not None else None,
+        'publisher': bot.publisher.stats(),
+        'geo_client': bot.geo_client.stats(),
+        'services': {
+            'tcp_accepts': endpoints.accepted,
+            'ipapi_requests': ipapi.requests,
+            'ipapi_queries': ipapi.queries,
+            'ipapi_rejected': ipapi.rejected,
+            'send_calls': bot.bot.messages,
+            'state_commands': state_server.commands if state_server is not None else None
+        }
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Replay channel messages through the bot pipeline')
+    parser.add_argument('--messages', type=int, default=5000, help='synthetic messages to generate')
+    parser.add_argument('--input', help='recorded messages (JSON lines) instead of a synthetic stream')
+    parser.add_argument('--rate', type=float, default=0.0, help='messages per second (0: as fast as possible)')
+    parser.add_argument('--speed', type=float, default=1.0, help='speed-up factor for recorded offsets')
+    parser.add_argument('--repost-ratio', type=float, default=0.2, help='fraction of synthetic reposts')
+    parser.add_argument('--seed', type=int, default=1, help='synthetic corpus seed')
+    parser.add_argument('--endpoints', type=int, default=256, help='distinct fake proxy servers')
+    parser.add_argument('--dead-ratio', type=float, default=0.1, help='fraction of links to refusing ports')
+    parser.add_argument('--geo-quota', type=int, default=15, help='ip-api batch requests per minute')
+    parser.add_argument('--ipapi-latency', type=float, default=0.05, help='fake ip-api response time (s)')
+    parser.add_argument('--send-latency', type=float, default=0.05, help='fake send_message time (s)')
+    parser.add_argument('--publish-rate', type=float, default=60000.0,
+                        help='channel posts per minute (the bot defaults to 20)')
+    parser.add_argument('--shared-state', action='store_true',
+                        help='use the Redis-protocol state backend against an in-process fake server')
+    parser.add_argument('--state-latency', type=float, default=0.0, help='fake state server response time (s)')
+    parser.add_argument('--drain-timeout', type=float, default=60.0, help='seconds to wait for the outbox')
+    parser.add_argument('--log-level', default='ERROR', help='application log level during the run')
+    parser.add_argument('--output', help='write the JSON report to this file (default: stdout)')
+    args = parser.parse_args()
+    if args.speed <= 0 or args.rate < 0 or args.geo_quota < 1 or not 0 <= args.dead_ratio < 1:
+        parser.error('--speed and --geo-quota must be positive, --rate >= 0, 0 <= --dead-ratio < 1')
+
+    # Configured before the bot is imported so its setup_logging() keeps this;
+    # stderr keeps stdout clean for the JSON report
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper(), logging.ERROR),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        stream=sys.stderr
+    )
+
+    workdir = tempfile.mkdtemp(prefix='orv-replay-')
+    try:
+        report = asyncio.run(replay(args, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    throughput, latency, drops = report['throughput'], report['latency']['end_to_end'], report['drops']
+    print(
+        f"{throughput['messages']} messages, {throughput['unique_links']} new links: "
+        f"{throughput['messages_per_sec']} msg/s ingested, {throughput['sent_per_sec']} proxies/s sent; "
+        f"end-to-end p50 {latency['p50_ms']}ms p95 {latency['p95_ms']}ms p99 {latency['p99_ms']}ms; "
+        f"not accepted {drops['not_accepted']}, not sent {drops['not_sent']}",
+        file=sys.stderr
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
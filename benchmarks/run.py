@@ -0,0 +1,90 @@
+"""
+Run the micro-benchmark suite and write the results as JSON.
+
+Usage:
+    python benchmarks/run.py [--quick] [--only parsing,store,network]
+                             [--output results.json] [--compare baseline.json]
+
+The JSON document holds the environment (commit, Python, platform) and one
+record per benchmark; --compare prints the throughput ratio against an
+earlier run so results can be tracked across commits.
+"""
+
+import argparse
+import json
+import logging
+import sys
+from typing import Dict, List, Tuple
+
+import harness
+import bench_network
+import bench_parsing
+import bench_store
+
+SUITES = {
+    'parsing': bench_parsing.run,
+    'store': bench_store.run,
+    'network': bench_network.run
+}
+
+
+def _key(record: Dict) -> Tuple[str, str]:
+    return record['name'], json.dumps(record.get('params', {}), sort_keys=True)
+
+
+def compare(current: List[Dict], baseline: List[Dict]) -> List[str]:
+    """Return one line per benchmark present in both runs with its throughput ratio."""
+    previous = {_key(record): record for record in baseline}
+    lines = []
+    for record in current:
+        old = previous.get(_key(record))
+        if not old or not old.get('ops_per_sec') or not record.get('ops_per_sec'):
+            continue
+        ratio = record['ops_per_sec'] / old['ops_per_sec']
+        lines.append(
+            f"{record['name']:<28} {_key(record)[1]:<32} "
+            f"{old['ops_per_sec']:>14,.1f} -> {record['ops_per_sec']:>14,.1f} ops/s  x{ratio:.2f}"
+        )
+    return lines
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Orv Telegram Proxy micro-benchmarks')
+    parser.add_argument('--quick', action='store_true', help='smaller inputs for a fast smoke run')
+    parser.add_argument('--only', default='', help='comma-separated suites to run: ' + ', '.join(SUITES))
+    parser.add_argument('--output', help='write results JSON to this file (default: stdout)')
+    parser.add_argument('--compare', help='results JSON from an earlier run to compare against')
+    args = parser.parse_args()
+
+    # Keep application log output out of the measurements
+    logging.disable(logging.WARNING)
+
+    selected = [name.strip() for name in args.only.split(',') if name.strip()] or list(SUITES)
+    unknown = [name for name in selected if name not in SUITES]
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(unknown)}")
+
+    results: List[Dict] = []
+    for name in selected:
+        print(f"Running {name} benchmarks...", file=sys.stderr)
+        results.extend(SUITES[name](args.quick))
+
+    document = {'environment': dict(harness.environment(), quick=args.quick), 'results': results}
+    text = json.dumps(document, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"Wrote {len(results)} results to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        for line in compare(results, baseline.get('results', [])):
+            print(line, file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,99 +1,341 @@
 """
-Flask web application for displaying proxy information.
+aiohttp web application for displaying proxy information.
+
+The app runs on the same asyncio event loop as the Telegram clients (see
+main.py) and reads from the in-process proxy store through the snapshot and
+page caches, so requests never touch the disk while the data is unchanged.
 """
 
-from flask import Flask, render_template
+from aiohttp import web
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+import hashlib
 import json
-import os
 import logging
-from typing import Dict
+import math
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 from logging_config import setup_logging
+from store import get_store
+from snapshot import SnapshotCache, DEFAULT_PER_PAGE, SORT_QUALITY
+from pagecache import PageCache
+from broadcast import ProxyFilter, get_broadcaster
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY
 
 # Setup logging
 setup_logging()
 
 from config import (
-    proxy_channel_url, config_channel_url, bot_url, support_url
+    proxy_channel_url, config_channel_url, bot_url, support_url, index_page_size,
+    web_host, web_port
 )
 
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-# Use absolute path for proxy file (same location as bot.py uses)
-_script_dir = os.path.dirname(os.path.abspath(__file__))
-PROXY_FILE = os.path.join(os.path.dirname(_script_dir), 'proxies.json')
+routes = web.RouteTableDef()
+templates = Environment(
+    loader=FileSystemLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')),
+    autoescape=select_autoescape(['html'])
+)
+# Shared SQLite store; WAL mode lets the web server read while the bot writes
+store = get_store()
+# In-memory snapshot for the JSON API, rebuilt only when the store changes
+snapshot_cache = SnapshotCache(store)
+# Rendered and pre-compressed index pages, re-rendered only when their content changes
+page_cache = PageCache()
+# Live stream of accepted proxies, fed by the bot's pipeline
+broadcaster = get_broadcaster()
+
+# Seconds between keep-alive comments on idle event streams
+STREAM_KEEPALIVE = 15.0
 
 
 def load_proxies() -> Dict:
     """
-    Load proxies from the JSON file (read-only, no locking needed for Flask).
-    
+    Load proxies from the proxy store.
+
     Returns:
-        Dictionary of proxies or empty dict if file doesn't exist or is invalid
+        Dictionary of proxies or empty dict if the store cannot be read
     """
-    if not os.path.exists(PROXY_FILE):
-        logger.debug(f"Proxy file {PROXY_FILE} not found")
-        return {}
-    
     try:
-        with open(PROXY_FILE, 'r', encoding='utf-8') as file:
-            proxies = json.load(file)
-            logger.debug(f"Loaded {len(proxies)} proxies from file")
-            return proxies
-    except json.JSONDecodeError as e:
-        logger.error(f"Error decoding JSON from {PROXY_FILE}: {e}")
-        return {}
-    except IOError as e:
-        logger.error(f"Error reading {PROXY_FILE}: {e}")
-        return {}
+        proxies = store.load_all()
+        logger.debug(f"Loaded {len(proxies)} proxies from store")
+        return proxies
     except Exception as e:
         logger.error(f"Unexpected error loading proxies: {e}", exc_info=True)
         return {}
 
 
-@app.route('/')
-def index():
+def _template_urls() -> Dict[str, str]:
+    """Return the configurable footer/header URLs with their defaults."""
+    return {
+        'proxy_channel_url': proxy_channel_url or 'https://t.me/Orv_Proxy',
+        'config_channel_url': config_channel_url or 'https://t.me/Orv_Vpn',
+        'bot_url': bot_url or 'https://t.me/OrBSup_bot',
+        'support_url': support_url or 'https://t.me/Orv_Sup'
+    }
+
+
+def _display_ping(ping: Optional[float]) -> Optional[int]:
+    """Round a ping for display: to 10 ms below 200 ms, to 50 ms above."""
+    if ping is None:
+        return None
+    step = 10 if ping < 200 else 50
+    return max(step, int(round(ping / step)) * step)
+
+
+def _card(proxy: Dict) -> Dict:
+    """
+    Values an index page card shows for a proxy.
+
+    Measurements are coarsened (ping buckets, whole uptime percent, quality in
+    steps of 5) so that re-validation probes, which rewrite ping and the
+    quality summary constantly, change a card only when the change is visible.
     """
-    Render the main page with proxy information.
-    
+    return {
+        'id': proxy['id'],
+        'link': proxy['link'],
+        'country': proxy['country'],
+        'server': proxy['server'],
+        'port': proxy['port'],
+        'ping': _display_ping(proxy['ping']),
+        'uptime': round(proxy['success_ratio'] * 100) if proxy['samples'] else None,
+        'score': int(round(proxy['score'] / 5)) * 5
+    }
+
+
+def _page_tag(cards: List[Dict], page: int, pages: int) -> str:
+    """Digest of everything an index page shows; unchanged cards keep the cached render and its ETag."""
+    shown = [tuple(card.values()) for card in cards]
+    return hashlib.sha1(repr((page, pages, shown)).encode('utf-8')).hexdigest()[:16]
+
+
+def _is_not_modified(request: web.Request, etag: str, last_modified: float) -> bool:
+    """
+    Evaluate If-None-Match / If-Modified-Since against the current representation.
+
+    If-None-Match takes precedence when present (RFC 9110, section 13.2.2).
+    """
+    if request.if_none_match is not None:
+        return any(tag.value == '*' or tag.value == etag for tag in request.if_none_match)
+    if request.if_modified_since is not None:
+        return int(last_modified) <= request.if_modified_since.timestamp()
+    return False
+
+
+def _conditional(request: web.Request, response: web.Response, etag: str, last_modified: float) -> web.Response:
+    """Attach validators to a response, or return 304 if the client's copy is current."""
+    if _is_not_modified(request, etag, last_modified):
+        response = web.Response(status=304, headers={
+            key: value for key, value in response.headers.items()
+            if key in ('Cache-Control', 'Vary', 'Content-Location')
+        })
+    response.etag = etag
+    response.last_modified = datetime.fromtimestamp(int(last_modified), tz=timezone.utc)
+    return response
+
+
+@routes.get('/')
+async def index(request: web.Request) -> web.Response:
+    """
+    Render one page of proxy cards, best quality score first.
+
+    Pages are rendered and compressed once per displayed content and served
+    from the page cache, using brotli or gzip when the client accepts it.
+
     Returns:
-        Rendered HTML template with proxy data
+        HTML response (304 if the client's copy is current)
     """
     try:
-        proxies = load_proxies()
-        # Pass configurable URLs to template
-        template_vars = {
-            'proxies': proxies,
-            'proxy_channel_url': proxy_channel_url or 'https://t.me/Orv_Proxy',
-            'config_channel_url': config_channel_url or 'https://t.me/Orv_Vpn',
-            'bot_url': bot_url or 'https://t.me/OrBSup_bot',
-            'support_url': support_url or 'https://t.me/Orv_Sup'
-        }
-        return render_template('index.html', **template_vars)
+        snapshot = snapshot_cache.get()
+        pages = max(1, math.ceil(len(snapshot) / index_page_size))
+        try:
+            page = int(request.query.get('page', 1))
+        except ValueError:
+            page = 1
+        page = min(max(page, 1), pages)
+
+        start = (page - 1) * index_page_size
+        cards = [_card(proxy) for proxy in snapshot.by_quality[start:start + index_page_size]]
+
+        def render() -> str:
+            return templates.get_template('index.html').render(
+                proxies=cards,
+                page=page,
+                pages=pages,
+                **_template_urls()
+            )
+
+        rendered = page_cache.get(str(page), _page_tag(cards, page, pages), render)
+        body, encoding, etag = rendered.negotiate(request.headers.get('Accept-Encoding', ''))
+        response = web.Response(body=body, content_type='text/html', charset='utf-8')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'public, max-age=10'
+        return _conditional(request, response, etag, rendered.rendered_at)
     except Exception as e:
         logger.error(f"Error rendering index page: {e}", exc_info=True)
         # Return empty proxies on error with default URLs
-        template_vars = {
-            'proxies': {},
-            'proxy_channel_url': proxy_channel_url or 'https://t.me/Orv_Proxy',
-            'config_channel_url': config_channel_url or 'https://t.me/Orv_Vpn',
-            'bot_url': bot_url or 'https://t.me/OrBSup_bot',
-            'support_url': support_url or 'https://t.me/Orv_Sup'
+        html = templates.get_template('index.html').render(proxies=[], page=1, pages=1, **_template_urls())
+        return web.Response(text=html, content_type='text/html')
+
+
+def _optional_float(request: web.Request, name: str) -> Optional[float]:
+    value = request.query.get(name)
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def _query_countries(request: web.Request) -> List[str]:
+    return [c.strip() for value in request.query.getall('country', []) for c in value.split(',') if c.strip()]
+
+
+@routes.get('/api/proxies')
+async def api_proxies(request: web.Request) -> web.Response:
+    """
+    List proxies as JSON with pagination, filtering and sorting.
+
+    Query parameters:
+        country: Country name; repeat or comma-separate for several
+        min_ping, max_ping: Latency range in milliseconds
+        sort: 'quality' (default), 'ping' or 'recent'
+        order: 'asc' or 'desc' (defaults depend on sort)
+        page, per_page: Pagination (per_page is capped at 500)
+
+    Returns:
+        JSON page of proxies; 304 if the client's ETag or Last-Modified is current
+    """
+    try:
+        countries = _query_countries(request)
+        order = request.query.get('order')
+        if order not in (None, 'asc', 'desc'):
+            raise ValueError("order must be 'asc' or 'desc'")
+        query = {
+            'countries': countries,
+            'min_ping': _optional_float(request, 'min_ping'),
+            'max_ping': _optional_float(request, 'max_ping'),
+            'sort': request.query.get('sort', SORT_QUALITY),
+            'descending': None if order is None else order == 'desc',
+            'page': int(request.query.get('page', 1)),
+            'per_page': int(request.query.get('per_page', DEFAULT_PER_PAGE))
         }
-        return render_template('index.html', **template_vars)
+    except ValueError as e:
+        return web.json_response({'error': str(e)}, status=400)
+
+    snapshot = snapshot_cache.get()
+    try:
+        result = snapshot.query(**query)
+    except ValueError as e:
+        return web.json_response({'error': str(e)}, status=400)
+
+    response = web.json_response(result)
+    response.headers['Cache-Control'] = 'no-cache'
+    return _conditional(request, response, snapshot.etag, snapshot.last_modified)
+
+
+def _format_event(record: Dict) -> bytes:
+    """Encode a proxy record as a server-sent event."""
+    return f"id: {record['id']}\nevent: proxy\ndata: {json.dumps(record, ensure_ascii=False)}\n\n".encode('utf-8')
+
+
+@routes.get('/api/stream')
+async def stream(request: web.Request) -> web.StreamResponse:
+    """
+    Stream newly accepted proxies as server-sent events.
+
+    Accepts the same country/min_ping/max_ping filters as /api/proxies.
+    Reconnecting clients send Last-Event-ID (or ?last_id=) to receive the
+    proxies they missed first. Slow clients are disconnected once their
+    buffer fills and can resume the same way.
+
+    Returns:
+        text/event-stream response that stays open until the client leaves
+    """
+    try:
+        proxy_filter = ProxyFilter(
+            _query_countries(request),
+            _optional_float(request, 'min_ping'),
+            _optional_float(request, 'max_ping')
+        )
+        last_id = request.headers.get('Last-Event-ID') or request.query.get('last_id')
+        last_id = int(last_id) if last_id else None
+    except ValueError as e:
+        return web.json_response({'error': str(e)}, status=400)
+
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        # Disable response buffering in nginx-style reverse proxies
+        'X-Accel-Buffering': 'no'
+    })
+    await response.prepare(request)
+    # Subscribe before replaying so nothing published meanwhile is lost
+    subscription = broadcaster.subscribe(proxy_filter)
+    try:
+        await response.write(b"retry: 3000\n\n")
+        sent_id = last_id or 0
+        if last_id is not None:
+            for record in broadcaster.replay(last_id, proxy_filter):
+                await response.write(_format_event(record))
+                sent_id = max(sent_id, record['id'])
+        while not subscription.closed:
+            records = await subscription.get(timeout=STREAM_KEEPALIVE)
+            if not records and not subscription.closed:
+                await response.write(b": keepalive\n\n")
+                continue
+            for record in records:
+                # Skip records already delivered by the replay
+                if record['id'] > sent_id:
+                    await response.write(_format_event(record))
+                    sent_id = record['id']
+    except ConnectionResetError:
+        # Client went away; cancellation (shutdown, aborted request) propagates
+        pass
+    finally:
+        broadcaster.unsubscribe(subscription)
+    return response
 
 
-@app.route('/health')
-def health():
+@routes.get('/health')
+async def health(request: web.Request) -> web.Response:
     """
     Health check endpoint.
-    
+
     Returns:
         JSON response indicating service status
     """
-    return {'status': 'ok', 'service': 'Orv Telegram Proxy'}
+    return web.json_response({'status': 'ok', 'service': 'Orv Telegram Proxy'})
+
+
+@routes.get('/metrics')
+async def metrics(request: web.Request) -> web.Response:
+    """
+    Prometheus metrics endpoint.
+
+    Returns:
+        Counters, gauges and histograms in the Prometheus text format
+    """
+    return web.Response(body=REGISTRY.render().encode('utf-8'), headers={'Content-Type': METRICS_CONTENT_TYPE})
+
+
+async def _close_streams() -> None:
+    broadcaster.close_all()
+
+
+def create_app() -> web.Application:
+    """Create the web application with all routes registered."""
+    application = web.Application()
+    application.add_routes(routes)
+    # Close open event streams so shutdown doesn't wait for them
+    application.on_shutdown.append(lambda _: _close_streams())
+    return application
+
+
+app = create_app()
 
 
 if __name__ == '__main__':
     # Only run directly if not being imported
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    web.run_app(app, host=web_host, port=web_port)
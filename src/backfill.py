@@ -0,0 +1,200 @@
+"""
+Catch-up of channel history missed while the bot was offline.
+
+Every monitored channel has a checkpoint in the store: the ID of the last
+message known to be processed. On start the backfiller reads every newer
+message with client.iter_messages, oldest first, and feeds it through the
+same extraction path as live messages. After each batch it waits until the
+batch's own links have left the pipeline (not for the whole pipeline to
+drain, which live traffic could keep from ever happening), then advances the
+checkpoint, so a restart resumes exactly where the last run stopped.
+
+Live messages only advance a checkpoint once the channel has been caught up,
+and only one flush after they were queued (see flush()). A channel that cannot
+be resolved or whose backfill fails keeps its old checkpoint for the rest of
+the run, so the next run retries the gap. A crash can therefore make the next
+run re-read some messages, which the dedup index absorbs cheaply, but it can
+never skip one.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from telethon import TelegramClient, utils
+
+from metrics import Counter
+from store import ProxyStore
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_MESSAGES = Counter('orv_backfill_messages_total', 'Channel history messages read by the backfill')
+
+# Processes one message text and returns futures resolved when its links have left the pipeline
+MessageHandler = Callable[[str], Awaitable[List[asyncio.Future]]]
+
+
+class Backfiller:
+    """
+    Per-channel history catch-up with persisted checkpoints.
+
+    Args:
+        store: Proxy store holding the checkpoints
+        client: Connected user client that can read the channels
+        handle_message: Coroutine processing one message text (extract and queue
+            links), returning futures resolved when those links have left the pipeline
+        batch_size: Messages processed between checkpoints
+        concurrency: Channels backfilled at the same time
+        initial_messages: History read for a channel that has no checkpoint yet
+            (0 starts from the newest message)
+    """
+
+    def __init__(
+        self,
+        store: ProxyStore,
+        client: TelegramClient,
+        handle_message: MessageHandler,
+        batch_size: int = 500,
+        concurrency: int = 2,
+        initial_messages: int = 0
+    ) -> None:
+        if batch_size < 1 or concurrency < 1:
+            raise ValueError("Backfill batch size and concurrency must be at least 1")
+        self.store = store
+        self.client = client
+        self.handle_message = handle_message
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.initial_messages = initial_messages
+        # Set when a backfill is expected; live checkpoints then only advance for caught-up channels
+        self.enabled = False
+        # Channels (peer IDs) whose backfill finished successfully
+        self._caught_up: Set[int] = set()
+        # Newest live message per channel: noted since the last flush, and settled
+        # (noted before the last flush, so long since drained by the pipeline)
+        self._noted: Dict[int, int] = {}
+        self._settled: Dict[int, int] = {}
+        self.messages = 0
+
+    def note_live(self, channel: int, message_id: int) -> None:
+        """Remember the newest live message handed to the pipeline for a channel (O(1), no I/O)."""
+        if message_id > self._noted.get(channel, 0):
+            self._noted[channel] = message_id
+
+    def flush(self, final: bool = False) -> int:
+        """
+        Persist live message checkpoints.
+
+        Checkpoints noted before the previous flush are written, and the ones
+        noted since are held back until the next flush, so a message's proxies
+        have had a full interval to leave the pipeline before it is checkpointed.
+        With a backfill enabled, only channels it has caught up are written;
+        the others keep their checkpoint so no history is skipped.
+
+        Args:
+            final: Write everything (the pipeline has been drained, e.g. at shutdown)
+
+        Returns:
+            Number of checkpoints written
+        """
+        if final:
+            for channel, message_id in self._noted.items():
+                self._settled[channel] = max(message_id, self._settled.get(channel, 0))
+            self._noted = {}
+        written = 0
+        for channel in [c for c in self._settled if not self.enabled or c in self._caught_up]:
+            self.store.set_checkpoint(channel, self._settled.pop(channel))
+            written += 1
+        for channel, message_id in self._noted.items():
+            self._settled[channel] = max(message_id, self._settled.get(channel, 0))
+        self._noted = {}
+        return written
+
+    async def run(self, channels: Iterable) -> Dict[int, int]:
+        """
+        Backfill every channel, a few at a time.
+
+        Args:
+            channels: Channel IDs or usernames as configured
+
+        Returns:
+            Messages read per channel (by peer ID)
+        """
+        self.enabled = True
+        entities = {}
+        for channel in channels:
+            try:
+                entity = await self.client.get_input_entity(channel)
+            except (ValueError, TypeError) as e:
+                logger.error(f"Cannot resolve channel {channel} for backfill, its checkpoint is kept: {e}")
+                continue
+            entities[utils.get_peer_id(entity)] = entity
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(peer_id: int) -> int:
+            async with semaphore:
+                try:
+                    count = await self.backfill_channel(peer_id, entities[peer_id])
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Not caught up: live messages must not move the checkpoint past the gap
+                    logger.error(f"Backfill of channel {peer_id} failed, its checkpoint is kept: {e}", exc_info=True)
+                    return 0
+                self._caught_up.add(peer_id)
+                return count
+
+        peer_ids = list(entities)
+        counts = await asyncio.gather(*(bounded(peer_id) for peer_id in peer_ids))
+        return dict(zip(peer_ids, counts))
+
+    async def backfill_channel(self, peer_id: int, entity) -> int:
+        """
+        Read one channel's messages newer than its checkpoint, oldest first.
+
+        Args:
+            peer_id: Channel peer ID (checkpoint key)
+            entity: Resolved input entity for the channel
+
+        Returns:
+            Number of messages read
+        """
+        latest = await self.client.get_messages(entity, limit=1)
+        if not latest:
+            return 0
+        # Messages arriving from now on are handled live; stop at the current newest
+        top_id = latest[0].id
+        checkpoint = self.store.get_checkpoint(peer_id)
+        if checkpoint is None:
+            checkpoint = max(0, top_id - self.initial_messages)
+            logger.info(f"No checkpoint for channel {peer_id}, starting at message {checkpoint}")
+        if checkpoint >= top_id:
+            self.store.set_checkpoint(peer_id, top_id)
+            return 0
+
+        logger.info(f"Backfilling channel {peer_id}: messages {checkpoint + 1}..{top_id}")
+        count = 0
+        last_id: Optional[int] = None
+        # Links of the current batch still in the pipeline
+        pending: List[asyncio.Future] = []
+        async for message in self.client.iter_messages(entity, min_id=checkpoint, max_id=top_id + 1, reverse=True):
+            if message.message:
+                pending.extend(await self.handle_message(message.message))
+            last_id = message.id
+            count += 1
+            self.messages += 1
+            BACKFILL_MESSAGES.inc()
+            if count % self.batch_size == 0:
+                await self._checkpoint(peer_id, last_id, pending)
+        await self._checkpoint(peer_id, top_id, pending)
+        logger.info(f"Backfill of channel {peer_id} done: {count} messages")
+        return count
+
+    async def _checkpoint(self, peer_id: int, message_id: int, pending: List[asyncio.Future]) -> None:
+        # Only messages whose proxies have left the pipeline count as processed.
+        # asyncio.wait rather than gather: cancelling us must not cancel futures others wait on
+        if pending:
+            await asyncio.wait(pending)
+            pending.clear()
+        self.store.set_checkpoint(peer_id, message_id)
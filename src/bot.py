@@ -5,41 +5,107 @@ Telegram bot for collecting and forwarding proxy links with country detection an
 from telethon import TelegramClient, events, Button
 from config import (
     api_id, api_hash, bot_token, channels, proxy_channel_url,
-    config_channel_url, bot_url, support_url, channel_id
+    config_channel_url, bot_url, support_url, channel_id, dedup_bloom_capacity,
+    pipeline_queue_size, pipeline_overflow, enrich_workers, geo_workers, enrich_processes, publish_workers,
+    probe_concurrency, probe_mode, geo_cache_size, geo_cache_ttl, geo_cache_share_prefix,
+    geoip_backend, geoip_database, ipapi_url, geo_batch_window,
+    dns_cache_ttl, dns_negative_ttl, proxy_ttl, expiry_interval,
+    revalidate_min_interval, revalidate_max_interval, revalidate_rate,
+    revalidate_concurrency, dead_after_failures, publish_rate_per_minute, publish_burst,
+    publish_digest_size, publish_digest_window, publish_max_attempts, publish_min_quality,
+    quality_window, quality_ewma_alpha,
+    stream_history, stream_client_buffer,
+    backfill_batch_size, backfill_concurrency, backfill_initial_messages,
+    state_backend, state_url, state_prefix, node_id
 )
-import aiohttp
-import re
 import logging
 import os
 import asyncio
-import json
-import socket
 import time
-from typing import Dict, Optional, Tuple
-from threading import Lock
-from urllib.parse import quote
-import ipaddress
-from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+from store import get_store
+from dedup import LinkGate
+from pipeline import Pipeline, Stage
+from prober import TcpProber
+from resolver import DnsCache, ResolvedAddress, first_ipv4, to_sockaddrs
+from mtproto import HandshakeResult, extract_secret, validate_proxy
+from geocache import GeoCache
+from geoip import open_database as open_geoip_database
+from geoclient import IpApiClient
+from revalidator import Revalidator
+from quality import QualityTracker, score as quality_score
+from publisher import Publisher
+from backfill import Backfiller
+from workers import EnrichmentPool
+from state import SharedTokenBucket, open_backend as open_state_backend
+from broadcast import get_broadcaster
+from metrics import Counter, Gauge, Histogram
+from messages import (
+    extract_proxy_links, validate_ip_address, parse_proxy_link,
+    format_footer, format_proxy_message as _format_proxy_message,
+    format_digest_message as _format_digest_message
+)
 
 # Setup logging (centralized configuration)
 from logging_config import setup_logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
-# File to store proxies - use absolute path based on script location
-_script_dir = os.path.dirname(os.path.abspath(__file__))
-PROXY_FILE = os.path.join(os.path.dirname(_script_dir), 'proxies.json')
-# File lock for thread-safe operations
-file_lock = Lock()
-# Thread pool executor for blocking I/O operations
-executor = ThreadPoolExecutor(max_workers=4)
-
-# Rate limiting for IP geolocation API (ip-api.com free tier: 45 requests/minute)
-# Use semaphore to limit concurrent requests
-api_semaphore = asyncio.Semaphore(3)  # Limit to 3 concurrent API requests
-# Simple rate limiter: track last request time
-_last_api_request_time = 0.0
-_api_min_interval = 1.4  # ~43 requests per minute (slightly under 45 to be safe)
+# Proxy store (SQLite, migrates the legacy proxies.json on first open)
+store = get_store(bloom_capacity=dedup_bloom_capacity)
+# Live stream of accepted proxies (shared with the web app)
+broadcaster = get_broadcaster(history_size=stream_history, client_buffer=stream_client_buffer)
+# Seen/in-flight gate in front of enrichment
+link_gate = LinkGate(store.index)
+# Shared DNS cache for geolocation and probing
+dns_cache = DnsCache(ttl=dns_cache_ttl, negative_ttl=dns_negative_ttl)
+# Asyncio TCP prober (replaces the thread pool ping)
+prober = TcpProber(concurrency=probe_concurrency, resolver=dns_cache)
+
+# Batched ip-api.com client with one pooled session
+# (free tier batch endpoint: 15 requests/minute, up to 100 IPs each)
+geo_client = IpApiClient(base_url=ipapi_url, batch_window=geo_batch_window)
+
+# State shared with other instances (STATE_BACKEND); in memory for a single instance
+shared_state = open_state_backend(state_backend, state_url, prefix=state_prefix)
+if shared_state.shared:
+    # ip-api's quota is per client IP: instances share one request window
+    geo_client.rate_limiter = SharedTokenBucket(
+        shared_state, 'ipapi', rate=geo_client.rate_limiter.rate, capacity=geo_client.rate_limiter.capacity
+    )
+
+# Geolocation cache (persisted across restarts)
+_project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+geo_cache = GeoCache(
+    max_entries=geo_cache_size,
+    ttl=geo_cache_ttl,
+    share_prefix=geo_cache_share_prefix,
+    snapshot_path=os.path.join(_project_dir, 'geo_cache.json')
+)
+geo_cache.load()
+# Optional offline GeoIP database (GEOIP_BACKEND=csv or mmdb)
+geoip_db = open_geoip_database(geoip_backend, geoip_database) if geoip_backend != 'ipapi' else None
+# Optional enrichment worker processes (ENRICH_PROCESSES); ip-api stays in this process
+enrichment_pool = EnrichmentPool(enrich_processes, {
+    'probe_mode': probe_mode,
+    'probe_concurrency': max(1, probe_concurrency // enrich_processes),
+    'dns_cache_ttl': dns_cache_ttl,
+    'dns_negative_ttl': dns_negative_ttl,
+    'geoip_backend': geoip_backend,
+    'geoip_database': geoip_database
+}) if enrich_processes > 0 else None
+
+# Footer links appended to every channel message
+_footer = format_footer(proxy_channel_url, config_channel_url, bot_url, support_url)
+
+# Hot-path instrumentation (exposed at /metrics by the web app)
+GEO_LOOKUPS = Counter('orv_geo_lookups_total', 'Country lookups by answering source', ('source',))
+GEO_LOOKUP_SECONDS = Histogram('orv_geo_lookup_seconds', 'End-to-end country lookup latency', ('source',))
+STORE_WRITE_SECONDS = Histogram('orv_store_write_seconds', 'Proxy store insert latency')
+SHARED_RECORDS = Counter('orv_shared_records_reused_total', 'Links whose check result was taken from shared state')
+PUBLISH_SKIPPED = Counter('orv_publish_skipped_total', 'Proxies not posted for scoring below PUBLISH_MIN_QUALITY')
+PUBLISH_LEASES = Counter('orv_publish_leases_total', 'Publish lease attempts by outcome', ('result',))
 
 # Initialize client and bot
 # Note: bot will be started in main() function to ensure proper async initialization
@@ -47,174 +113,188 @@ client = TelegramClient('session_name', api_id, api_hash)
 bot = TelegramClient('bot', api_id, api_hash)
 
 
-def _ping_proxy_sync(host: str, port: str, timeout: float = 3.0) -> Optional[float]:
+async def ping_proxy(
+    host: str,
+    port: str,
+    timeout: float = 3.0,
+    addresses: Optional[List[ResolvedAddress]] = None
+) -> Optional[float]:
     """
-    Synchronous ping implementation (runs in thread pool).
+    Ping a proxy server by attempting a non-blocking TCP connect to it.
     
     Args:
         host: The proxy server hostname or IP address
         port: The proxy server port
         timeout: Connection timeout in seconds
+        addresses: Addresses already resolved for host (resolved via the DNS cache if omitted)
         
     Returns:
         Ping time in milliseconds if successful, None otherwise
     """
-    try:
-        port_int = int(port)
-        start_time = time.time()
-        # Use context manager to ensure socket is always closed
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-            sock.settimeout(timeout)
-            result = sock.connect_ex((host, port_int))
-        
-        if result == 0:
-            ping_ms = (time.time() - start_time) * 1000
-            return round(ping_ms, 2)
-        return None
-    except (socket.gaierror, socket.timeout, ValueError, OSError) as e:
-        logger.debug(f"Ping failed for {host}:{port} - {e}")
-        return None
+    sockaddrs = to_sockaddrs(addresses, int(port)) if addresses else None
+    return await prober.probe(host, port, timeout, sockaddrs)
 
 
-async def ping_proxy(host: str, port: str, timeout: float = 3.0) -> Optional[float]:
+async def handshake_proxy(
+    host: str,
+    port: str,
+    secret: str,
+    addresses: Optional[List[ResolvedAddress]] = None
+) -> HandshakeResult:
     """
-    Ping a proxy server by attempting to connect to it (non-blocking).
+    Validate a proxy with a real MTProto handshake under the prober's concurrency limit.
     
     Args:
         host: The proxy server hostname or IP address
         port: The proxy server port
-        timeout: Connection timeout in seconds
+        secret: Secret from the proxy link
+        addresses: Addresses already resolved for host, tried in order
         
     Returns:
-        Ping time in milliseconds if successful, None otherwise
+        HandshakeResult with connect and handshake latency
     """
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, _ping_proxy_sync, host, port, timeout)
+    async with prober.slot():
+        return await validate_proxy(host, port, secret, addresses=[ip for _, ip in addresses] if addresses else None)
 
 
-async def get_country_from_ip(ip_or_hostname: str, timeout: float = 5.0) -> str:
+async def probe_stored_proxy(host: str, port: str, link: str) -> Optional[float]:
     """
-    Get country information for an IP address or hostname using ip-api.com (non-blocking).
-    Includes rate limiting to respect API limits (45 requests/minute for free tier).
+    Re-probe a stored proxy according to PROBE_MODE.
     
     Args:
-        ip_or_hostname: IP address or hostname to look up (validated before calling)
-        timeout: Request timeout in seconds
+        host: The proxy server hostname or IP address
+        port: The proxy server port
+        link: The stored proxy link (for its secret in 'mtproto' mode)
         
     Returns:
-        Country name or 'Unknown' if lookup fails
+        Connect time in milliseconds if the proxy passed the check, None otherwise
+    """
+    if probe_mode != 'mtproto':
+        return await ping_proxy(host, port)
+    secret = extract_secret(link)
+    if not secret:
+        return None
+    result = await handshake_proxy(host, port, secret, await dns_cache.resolve(host))
+    return result.connect_ms if result.ok else None
+
+
+# Rolling per-proxy probe statistics behind the quality score
+quality = QualityTracker(window=quality_window, alpha=quality_ewma_alpha)
+
+# Background re-validation of stored proxies (shares the prober, own budget)
+revalidator = Revalidator(
+    store,
+    probe_stored_proxy,
+    min_interval=revalidate_min_interval,
+    max_interval=revalidate_max_interval,
+    rate=revalidate_rate,
+    concurrency=revalidate_concurrency,
+    dead_after=dead_after_failures,
+    quality=quality
+)
+
+
+async def _resolve_lookup_target(ip_or_hostname: str) -> str:
     """
-    global _last_api_request_time
+    Resolve a hostname to its first IPv4 address for geolocation.
     
-    # Rate limiting: ensure minimum interval between requests
-    current_time = time.time()
-    time_since_last = current_time - _last_api_request_time
-    if time_since_last < _api_min_interval:
-        await asyncio.sleep(_api_min_interval - time_since_last)
+    Args:
+        ip_or_hostname: IP address or hostname
+        
+    Returns:
+        Resolved IP, or the input unchanged if it is an IP or cannot be resolved
+    """
+    if validate_ip_address(ip_or_hostname):
+        return ip_or_hostname
     
-    # Use semaphore to limit concurrent requests
-    async with api_semaphore:
-        _last_api_request_time = time.time()
-        try:
-            # Additional validation before making request
-            if not ip_or_hostname or len(ip_or_hostname) > 253:  # Max hostname length
-                return 'Unknown'
-            
-            # Sanitize input for URL (basic check)
-            if any(char in ip_or_hostname for char in ['\n', '\r', '\t', ' ', '<', '>', '&']):
-                logger.warning(f"Invalid characters in IP/hostname: {ip_or_hostname}")
-                return 'Unknown'
-            
-            # Resolve hostname to IP if needed (ip-api.com accepts both IPs and hostnames)
-            # But we'll try to resolve hostnames first for better accuracy
-            lookup_target = ip_or_hostname
-            if not validate_ip_address(ip_or_hostname):
-                # It's a hostname, try to resolve it
-                try:
-                    loop = asyncio.get_event_loop()
-                    resolved_ip = await loop.getaddrinfo(ip_or_hostname, None, family=socket.AF_INET)
-                    if resolved_ip:
-                        lookup_target = resolved_ip[0][4][0]  # Get first IPv4 address
-                    else:
-                        # If resolution fails, use hostname directly (API may handle it)
-                        lookup_target = ip_or_hostname
-                except (socket.gaierror, OSError) as e:
-                    logger.debug(f"Could not resolve hostname {ip_or_hostname}, using as-is: {e}")
-                    lookup_target = ip_or_hostname
-            
-            # Use proper URL encoding
-            encoded_target = quote(lookup_target, safe='')
-            url = f'http://ip-api.com/json/{encoded_target}'
-            
-            # Use aiohttp for async HTTP requests
-            timeout_obj = aiohttp.ClientTimeout(total=timeout)
-            async with aiohttp.ClientSession(timeout=timeout_obj) as session:
-                async with session.get(url) as response:
-                    response.raise_for_status()
-                    data = await response.json()
-            
-            # Validate response
-            if data.get('status') == 'fail':
-                logger.warning(f"IP API returned error: {data.get('message', 'Unknown error')}")
-                return 'Unknown'
-            
-            country = data.get('country', 'Unknown')
-            # Sanitize country name (basic check)
-            if country and len(country) <= 100:  # Reasonable country name length
-                return country
-            return 'Unknown'
-        except aiohttp.ClientError as e:
-            logger.error(f"Error fetching country for {ip_or_hostname}: {e}")
-            return 'Unknown'
-        except Exception as e:
-            logger.error(f"Unexpected error getting country for {ip_or_hostname}: {e}")
-            return 'Unknown'
+    # ip-api.com accepts hostnames too, but resolving first gives better accuracy
+    resolved_ip = first_ipv4(await dns_cache.resolve(ip_or_hostname))
+    # If resolution fails, use hostname directly (API may handle it)
+    return resolved_ip or ip_or_hostname
 
 
-def load_proxies() -> Dict:
+async def get_country_from_ip(
+    ip_or_hostname: str,
+    timeout: float = 5.0,
+    resolved_ip: Optional[str] = None,
+    local_checked: bool = False
+) -> str:
     """
-    Load proxies from the JSON file in a thread-safe manner.
+    Get country information for an IP address or hostname (non-blocking).
+    Answers from the local GeoIP database or the geo cache when possible;
+    misses are batched into ip-api.com requests by the shared geo client.
     
+    Args:
+        ip_or_hostname: IP address or hostname to look up (validated before calling)
+        timeout: Unused, kept for compatibility (the geo client has its own timeout)
+        resolved_ip: Address already resolved for this host, to avoid resolving twice
+        local_checked: The GeoIP database was already consulted (by an enrichment worker)
+        
     Returns:
-        Dictionary of proxies or empty dict if file doesn't exist or is invalid
+        Country name or 'Unknown' if lookup fails
     """
-    with file_lock:
-        if not os.path.exists(PROXY_FILE):
-            return {}
-        
+    # Additional validation before making request
+    if not ip_or_hostname or len(ip_or_hostname) > 253:  # Max hostname length
+        return 'Unknown'
+    
+    # Sanitize input for URL (basic check)
+    if any(char in ip_or_hostname for char in ['\n', '\r', '\t', ' ', '<', '>', '&']):
+        logger.warning(f"Invalid characters in IP/hostname: {ip_or_hostname}")
+        return 'Unknown'
+    
+    start_time = time.perf_counter()
+    lookup_target = resolved_ip or await _resolve_lookup_target(ip_or_hostname)
+    
+    # Local range database answers in microseconds; ip-api is only the fallback
+    if geoip_db is not None and not local_checked:
+        country = geoip_db.lookup(lookup_target)
+        if country:
+            _record_geo_lookup('geoip', start_time)
+            return country
+    
+    cached = geo_cache.get(lookup_target)
+    if cached is not None:
+        _record_geo_lookup('cache', start_time)
+        return cached
+    
+    country = await geo_client.lookup(lookup_target)
+    if country != 'Unknown':
+        geo_cache.put(lookup_target, country)
+    _record_geo_lookup('ipapi', start_time)
+    return country
+
+
+def _record_geo_lookup(source: str, start_time: float) -> None:
+    GEO_LOOKUPS.inc(source=source)
+    GEO_LOOKUP_SECONDS.observe(time.perf_counter() - start_time, source=source)
+
+
+async def snapshot_geo_cache(interval: float = 300.0) -> None:
+    """Periodically persist the geo cache and log its hit/miss counters."""
+    while True:
         try:
-            with open(PROXY_FILE, 'r', encoding='utf-8') as file:
-                return json.load(file)
-        except (json.JSONDecodeError, IOError) as e:
-            logger.error(f"Error loading proxies file: {e}")
-            return {}
+            await asyncio.sleep(interval)
+            geo_cache.save()
+            logger.info(f"Geo cache stats: {geo_cache.stats()}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error snapshotting geo cache: {e}")
 
 
-def save_proxies(proxies: Dict) -> None:
+def load_proxies() -> Dict:
     """
-    Save proxies to the JSON file in a thread-safe manner.
+    Load all stored proxies in the legacy proxies.json shape.
     
-    Args:
-        proxies: Dictionary of proxies to save
+    Returns:
+        Dictionary of proxies keyed by string ID
     """
-    with file_lock:
-        try:
-            # Create backup before writing
-            if os.path.exists(PROXY_FILE):
-                backup_file = f"{PROXY_FILE}.bak"
-                with open(PROXY_FILE, 'r', encoding='utf-8') as src:
-                    with open(backup_file, 'w', encoding='utf-8') as dst:
-                        dst.write(src.read())
-            
-            with open(PROXY_FILE, 'w', encoding='utf-8') as file:
-                json.dump(proxies, file, indent=4, ensure_ascii=False)
-        except IOError as e:
-            logger.error(f"Error saving proxies file: {e}")
+    return store.load_all()
 
 
 def is_proxy_logged(proxy_link: str) -> bool:
     """
-    Check if the proxy has been logged in the proxy file.
+    Check if the proxy has been logged in the proxy store.
     
     Args:
         proxy_link: The proxy link to check
@@ -222,14 +302,13 @@ def is_proxy_logged(proxy_link: str) -> bool:
     Returns:
         True if proxy is already logged, False otherwise
     """
-    proxies = load_proxies()
-    return any(entry.get('link') == proxy_link for entry in proxies.values())
+    return store.contains(proxy_link)
 
 
 def log_proxy_if_not_exists(proxy_link: str, country: str, ip: str, port: str, ping: Optional[float] = None) -> bool:
     """
     Atomically check if proxy exists and log it if it doesn't.
-    This prevents race conditions when multiple proxies are processed concurrently.
+    Known links are rejected by the store's in-memory dedup index (O(1)).
     
     Args:
         proxy_link: The full proxy link
@@ -241,348 +320,380 @@ def log_proxy_if_not_exists(proxy_link: str, country: str, ip: str, port: str, p
     Returns:
         True if proxy was logged (new), False if it already existed
     """
-    with file_lock:
-        proxies = load_proxies()
-        
-        # Check if already exists
-        if any(entry.get('link') == proxy_link for entry in proxies.values()):
-            return False
-        
-        # Generate unique ID
-        max_id = 0
-        for existing_id in proxies.keys():
-            try:
-                id_num = int(existing_id)
-                if id_num > max_id:
-                    max_id = id_num
-            except ValueError:
-                continue
-        
-        proxy_id = str(max_id + 1)
-        proxy_data = {
-            'link': proxy_link,
-            'Country': country,
-            'IP': ip,
-            'Port': port
-        }
-        if ping is not None:
-            proxy_data['Ping'] = f"{ping}ms"
-        
-        proxies[proxy_id] = proxy_data
-        
-        # Save within the lock to ensure atomicity
-        try:
-            # Create backup before writing
-            if os.path.exists(PROXY_FILE):
-                backup_file = f"{PROXY_FILE}.bak"
-                with open(PROXY_FILE, 'r', encoding='utf-8') as src:
-                    with open(backup_file, 'w', encoding='utf-8') as dst:
-                        dst.write(src.read())
-            
-            with open(PROXY_FILE, 'w', encoding='utf-8') as file:
-                json.dump(proxies, file, indent=4, ensure_ascii=False)
-        except IOError as e:
-            logger.error(f"Error saving proxies file: {e}")
-            return False
-        
-        return True
+    with STORE_WRITE_SECONDS.time():
+        return store.add_if_absent(proxy_link, country, ip, port, ping)
 
 
-def log_proxy(proxy_link: str, country: str, ip: str, port: str, ping: Optional[float] = None) -> None:
-    """
-    Log the proxy to the JSON file.
-    
-    Args:
-        proxy_link: The full proxy link
-        country: Country name
-        ip: IP address
-        port: Port number
-        ping: Optional ping time in milliseconds
-    """
-    proxies = load_proxies()
-    
-    # Generate unique ID by finding the maximum existing ID and adding 1
-    # This handles cases where proxies are deleted
-    max_id = 0
-    for existing_id in proxies.keys():
-        try:
-            id_num = int(existing_id)
-            if id_num > max_id:
-                max_id = id_num
-        except ValueError:
-            # Skip non-numeric IDs
-            continue
-    
-    proxy_id = str(max_id + 1)
-    proxy_data = {
-        'link': proxy_link,
-        'Country': country,
-        'IP': ip,
-        'Port': port
-    }
-    if ping is not None:
-        proxy_data['Ping'] = f"{ping}ms"
-    
-    proxies[proxy_id] = proxy_data
-    save_proxies(proxies)
+def format_proxy_message(
+    country: str,
+    ip: str,
+    port: str,
+    ping: Optional[float] = None
+) -> str:
+    """Format the proxy message for Telegram with the configured footer links."""
+    return _format_proxy_message(country, ip, port, ping, footer=_footer)
+
+
+def format_digest_message(proxies: List[Dict]) -> str:
+    """Format several proxies as one digest message with the configured footer links."""
+    return _format_digest_message(proxies, footer=_footer)
+
+
+@dataclass
+class ProxyJob:
+    """A proxy link travelling through the ingestion pipeline."""
+    link: str
+    server: str = ''
+    port: str = ''
+    country: str = 'Unknown'
+    ping: Optional[float] = None
+    handshake_ms: Optional[float] = None
+    addresses: List[ResolvedAddress] = field(default_factory=list)
+    located: bool = False
+    score: float = 0.0
+
+
+async def parse_stage(job: ProxyJob) -> Optional[ProxyJob]:
+    """Parse server and port out of the link; drop unparsable links."""
+    parsed = parse_proxy_link(job.link)
+    if not parsed:
+        logger.warning(f"Failed to parse proxy link: {job.link}")
+        return None
+    job.server, job.port = parsed
+    return job
 
 
-def validate_ip_address(ip: str) -> bool:
+async def check_proxy(job: ProxyJob) -> bool:
     """
-    Validate if a string is a valid IP address (IPv4 or IPv6).
+    Measure the proxy according to PROBE_MODE.
+    
+    In 'tcp' mode only connect latency is measured. In 'mtproto' mode a real
+    handshake is performed with the link's secret; ping is the TCP connect
+    time and handshake latency is recorded separately.
     
     Args:
-        ip: String to validate
+        job: Pipeline job (ping and handshake_ms are filled in)
         
     Returns:
-        True if valid IP address, False otherwise
+        False if the proxy failed MTProto validation, True otherwise
     """
-    try:
-        ipaddress.ip_address(ip)
+    if probe_mode != 'mtproto':
+        job.ping = await ping_proxy(job.server, job.port, addresses=job.addresses)
         return True
-    except ValueError:
+    
+    secret = extract_secret(job.link)
+    if not secret:
+        logger.warning(f"Proxy {job.server}:{job.port} has no secret, cannot validate handshake")
         return False
+    result = await handshake_proxy(job.server, job.port, secret, job.addresses)
+    job.ping, job.handshake_ms = result.connect_ms, result.handshake_ms
+    if not result.ok:
+        logger.warning(f"MTProto handshake failed for {job.server}:{job.port}: {result.error}")
+        return False
+    logger.info(
+        f"MTProto handshake OK for {job.server}:{job.port} "
+        f"(connect {result.connect_ms}ms, handshake {result.handshake_ms}ms)"
+    )
+    return True
 
 
-def validate_port(port: str) -> bool:
+async def _enrich_in_worker(job: ProxyJob) -> bool:
     """
-    Validate if a string is a valid port number (1-65535).
+    Resolve, check and geolocate the proxy in an enrichment worker process.
+    
+    Countries the worker cannot answer from the local GeoIP database are
+    left to the locate stage (geo cache and the shared ip-api client).
     
     Args:
-        port: String to validate
+        job: Pipeline job (addresses, ping, handshake_ms and, if found offline, country are filled in)
         
     Returns:
-        True if valid port, False otherwise
+        False if the proxy failed MTProto validation, True otherwise
     """
-    try:
-        port_int = int(port)
-        return 1 <= port_int <= 65535
-    except ValueError:
+    result = await enrichment_pool.enrich(job.link, job.server, job.port)
+    job.addresses, job.ping, job.handshake_ms = result.addresses, result.ping, result.handshake_ms
+    if not result.valid:
         return False
+    if result.country:
+        GEO_LOOKUPS.inc(source='geoip')
+        job.country, job.located = result.country, True
+    return True
+
+
+async def enrich_stage(job: ProxyJob) -> Optional[ProxyJob]:
+    """Resolve and check the proxy; drop proxies failing validation."""
+    # Another instance checked this link within PROXY_TTL: reuse its result
+    known = await shared_state.get_proxy(job.link)
+    if known is not None:
+        SHARED_RECORDS.inc()
+        job.country, job.ping = known.get('country') or 'Unknown', known.get('ping')
+        job.located = True
+        return job
+    
+    if enrichment_pool is not None:
+        valid = await _enrich_in_worker(job)
+    else:
+        # Resolve once; geolocation and probing share the result
+        job.addresses = await dns_cache.resolve(job.server)
+        valid = await check_proxy(job)
+    if not valid:
+        return None
+    if job.ping is None:
+        logger.warning(f"Could not ping proxy {job.server}:{job.port}")
+        # Continue anyway, but don't include ping in message
+    return job
 
 
-def parse_proxy_link(link: str) -> Optional[Tuple[str, str]]:
+async def locate_stage(job: ProxyJob) -> Optional[ProxyJob]:
     """
-    Parse a Telegram proxy link to extract server and port with validation.
+    Look up the proxy's country.
     
-    Args:
-        link: The proxy link to parse
-        
-    Returns:
-        Tuple of (server, port) if successful, None otherwise
+    A stage of its own so that waiting for an ip-api batch doesn't hold an
+    enrich worker: GEO_WORKERS lookups can be pending at once, which is what
+    lets one rate-limited batch request carry up to 100 addresses.
     """
-    try:
-        # Validate link format
-        if not link or len(link) > 500:  # Reasonable length limit
-            return None
-        
-        server_match = re.search(r'server=([^&]+)', link)
-        port_match = re.search(r'port=([^&]+)', link)
-        
-        if not server_match or not port_match:
-            return None
-        
-        server = server_match.group(1).strip()
-        port = port_match.group(1).strip()
-        
-        # Basic validation
-        if not server or not port:
-            return None
-        
-        # Validate port
-        if not validate_port(port):
-            logger.warning(f"Invalid port number: {port}")
-            return None
-        
-        # Validate IP address (server can be IP or hostname)
-        # For hostnames, we'll do basic validation (no spaces, reasonable length)
-        if not server or len(server) > 253:  # Max hostname length
-            return None
-        
-        # Check for potentially malicious characters
-        if any(char in server for char in ['\n', '\r', '\t', ' ', '<', '>']):
-            return None
-        
-        return (server, port)
-    except Exception as e:
-        logger.error(f"Error parsing proxy link {link}: {e}")
+    if not job.located:
+        job.country = await get_country_from_ip(
+            job.server, resolved_ip=first_ipv4(job.addresses), local_checked=enrichment_pool is not None
+        )
+    return job
+
+
+async def persist_stage(job: ProxyJob) -> Optional[ProxyJob]:
+    """Atomically check and log the proxy; drop it if it already existed."""
+    was_logged = log_proxy_if_not_exists(job.link, job.country, job.server, job.port, job.ping)
+    if not was_logged:
+        logger.info(f"Proxy {job.link} has already been processed.")
         return None
-
-
-def escape_markdown(text: str) -> str:
+    # Share the result so other instances don't check the proxy again
+    await shared_state.put_proxy(
+        job.link, {'country': job.country, 'server': job.server, 'port': job.port, 'ping': job.ping}, proxy_ttl
+    )
+    record = store.get_record(job.link)
+    if record is None:
+        return job
+    # The ingestion check is the proxy's first quality sample
+    summary = quality.record(record['id'], job.ping).to_record()
+    store.record_quality(record['id'], summary)
+    record.update(summary)
+    job.score = record['score'] = quality_score(record)
+    # Push the accepted proxy to live stream subscribers right away
+    broadcaster.publish(record)
+    return job
+
+
+async def send_proxies(chat: str, proxies: List[Dict]) -> None:
     """
-    Escape special characters for Telegram markdown v2.
+    Send one message for the given proxies (a digest if there are several).
     
-    Args:
-        text: Text to escape
-        
-    Returns:
-        Escaped text safe for Telegram markdown
+    Errors propagate to the publisher, which retries or honours flood waits.
     """
-    # Telegram markdown v2 special characters that need escaping
-    special_chars = ['*', '_', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    escaped = text
-    for char in special_chars:
-        escaped = escaped.replace(char, f'\\{char}')
-    return escaped
+    # Ensure bot is connected before sending
+    if not bot.is_connected():
+        raise ConnectionError("Bot client is not connected")
+    
+    if len(proxies) == 1:
+        proxy = proxies[0]
+        text = format_proxy_message(proxy['country'], proxy['server'], str(proxy['port']), proxy.get('ping'))
+        buttons = [Button.url('Connect', proxy['link'])]
+    else:
+        text = format_digest_message(proxies)
+        connect_buttons = [Button.url(f'Connect {number}', proxy['link']) for number, proxy in enumerate(proxies, 1)]
+        # Three buttons per row
+        buttons = [connect_buttons[i:i + 3] for i in range(0, len(connect_buttons), 3)]
+    
+    await bot.send_message(
+        chat,
+        text,
+        buttons=buttons,
+        link_preview=False
+    )
+    logger.info(f"Successfully sent {len(proxies)} proxies to channel")
+
+
+# Persistent, FloodWait-aware outbound queue in front of bot.send_message
+publisher = Publisher(
+    store,
+    send_proxies,
+    rate=publish_rate_per_minute / 60.0,
+    burst=publish_burst,
+    digest_size=publish_digest_size,
+    digest_window=publish_digest_window,
+    max_attempts=publish_max_attempts
+)
 
 
-def format_proxy_message(
-    country: str,
-    ip: str,
-    port: str,
-    ping: Optional[float] = None
-) -> str:
+async def publish_stage(job: ProxyJob) -> Optional[ProxyJob]:
+    """Queue the proxy for publishing to the channel."""
+    # Validate channel_id before queueing
+    if not channel_id or not str(channel_id).strip():
+        logger.error("Invalid channel_id: cannot be empty")
+        return None
+    
+    if job.score < publish_min_quality:
+        PUBLISH_SKIPPED.inc()
+        logger.info(f"Proxy {job.link} not published: quality {job.score} is below {publish_min_quality}")
+        return None
+    
+    # Whichever instance takes the lease first publishes; it is held for
+    # PROXY_TTL so reposts seen by other instances meanwhile aren't published again
+    if not await shared_state.acquire_lease(f'publish:{job.link}', node_id, proxy_ttl):
+        PUBLISH_LEASES.inc(result='lost')
+        logger.info(f"Proxy {job.link} is published by another instance")
+        return None
+    PUBLISH_LEASES.inc(result='won')
+    
+    publisher.enqueue(channel_id, {
+        'link': job.link,
+        'country': job.country,
+        'server': job.server,
+        'port': job.port,
+        'ping': job.ping
+    })
+    return job
+
+
+# Ingestion pipeline: parse -> enrich -> locate -> persist -> publish.
+# Every job leaving the pipeline releases its claim on the link gate.
+pipeline = Pipeline(
+    [
+        Stage('parse', parse_stage, workers=1, queue_size=pipeline_queue_size, overflow=pipeline_overflow),
+        Stage('enrich', enrich_stage, workers=enrich_workers, queue_size=pipeline_queue_size),
+        Stage('locate', locate_stage, workers=geo_workers, queue_size=pipeline_queue_size),
+        Stage('persist', persist_stage, workers=1, queue_size=pipeline_queue_size),
+        Stage('publish', publish_stage, workers=publish_workers, queue_size=pipeline_queue_size)
+    ],
+    on_finish=lambda job: _job_finished(job.link)
+)
+
+
+# Link -> future resolved when its job leaves the pipeline (only for links someone waits on)
+_finish_waiters: Dict[str, asyncio.Future] = {}
+
+
+def _finish_future(link: str) -> asyncio.Future:
+    future = _finish_waiters.get(link)
+    if future is None:
+        future = _finish_waiters[link] = asyncio.get_running_loop().create_future()
+    return future
+
+
+def _job_finished(link: str) -> None:
+    """Release a link's claim and wake whoever waits for its job (pipeline on_finish)."""
+    link_gate.release(link)
+    future = _finish_waiters.pop(link, None)
+    if future is not None and not future.done():
+        future.set_result(None)
+
+
+# Gauges evaluated when /metrics is scraped
+Gauge(
+    'orv_pipeline_queue_depth', 'Items waiting in each pipeline stage queue', ('stage',),
+    callback=lambda: {(name,): stats['queued'] for name, stats in pipeline.stats().items()}
+)
+Gauge('orv_publish_queue_depth', 'Proxies waiting in the outbound queue', callback=store.outbound_depth)
+Gauge('orv_store_proxies', 'Proxies in the store', callback=lambda: len(store.index))
+Gauge('orv_links_in_flight', 'Links currently being enriched', callback=lambda: link_gate.in_flight)
+Gauge('orv_prober_in_flight', 'TCP probes in flight', callback=lambda: prober.in_flight)
+Gauge('orv_prober_saturation', 'Fraction of the probe concurrency limit in use',
+      callback=lambda: prober.in_flight / prober.concurrency)
+Gauge('orv_revalidation_in_flight', 'Re-validation probes in flight', callback=lambda: revalidator.in_flight)
+Gauge('orv_geo_cache_entries', 'Entries in the geolocation cache', callback=lambda: geo_cache.stats()['size'])
+Gauge('orv_geo_rate_tokens', 'ip-api rate limit tokens available', callback=lambda: geo_client.rate_limiter.tokens)
+Gauge('orv_quality_tracked', 'Proxies with rolling quality statistics', callback=lambda: len(quality))
+Gauge('orv_stream_subscribers', 'Connected live stream clients', callback=lambda: broadcaster.subscribers)
+if enrichment_pool is not None:
+    Gauge('orv_enrich_worker_in_flight', 'Jobs in flight in enrichment worker processes',
+          callback=lambda: enrichment_pool.in_flight)
+
+
+async def process_message(message: str, wait: bool = False) -> List[asyncio.Future]:
     """
-    Format the proxy message for Telegram.
+    Extract proxy links from a message and feed new ones to the pipeline.
     
     Args:
-        country: Country name
-        ip: IP address (may be truncated)
-        port: Port number
-        ping: Optional ping time in milliseconds
+        message: Message text
+        wait: Wait for queue space even if PIPELINE_OVERFLOW would drop links,
+            and return completion futures (used by the backfill, which must
+            not lose history)
         
     Returns:
-        Formatted message string
+        With wait, futures resolved when each of the message's links still in
+        the pipeline has left it; otherwise an empty list
     """
-    # Escape country name to prevent markdown injection
-    safe_country = escape_markdown(country)
+    proxy_links = extract_proxy_links(message)
+    finished: List[asyncio.Future] = []
     
-    # Truncate IP if too long
-    display_ip = ip
-    if len(ip) > 16:
-        display_ip = ip[:16] + '.etc'
-    
-    # Escape IP and port for safety
-    safe_ip = escape_markdown(display_ip)
-    safe_port = escape_markdown(port)
-    
-    message_parts = [
-        "**\u2774Orv\u2774**\n",
-        f"\u2022 Country: {safe_country}\n",
-        f"\u2022 IP: {safe_ip}\n",
-        f"\u2022 Port: {safe_port}\n"
-    ]
-    
-    if ping is not None:
-        # Ping is a number, but escape it for consistency
-        safe_ping = escape_markdown(f"{ping}ms")
-        message_parts.append(f"\u2022 Ping: {safe_ping}\n")
-    
-    message_parts.append("\n")
-    
-    # Add optional links
-    link_parts = []
-    if proxy_channel_url:
-        link_parts.append(f"[proxy]({proxy_channel_url})")
-    if config_channel_url:
-        link_parts.append(f"[config]({config_channel_url})")
-    if bot_url:
-        link_parts.append(f"[bot]({bot_url})")
-    if support_url:
-        link_parts.append(f"[support]({support_url})")
-    
-    if link_parts:
-        message_parts.append("~".join(link_parts))
-    
-    return "".join(message_parts)
+    for link in proxy_links:
+        # Drop known links and duplicates already being enriched before any
+        # geo/ping work is spent on them
+        if not link_gate.try_claim(link):
+            if wait and link_gate.processing(link):
+                # Queued by another message: this one is done when that job is
+                finished.append(_finish_future(link))
+            # Reposts keep a stored proxy from expiring
+            store.touch(link)
+            logger.info(f"Proxy {link} has already been processed.")
+            continue
+        
+        if wait:
+            finished.append(_finish_future(link))
+        try:
+            await pipeline.submit(ProxyJob(link), wait=wait)
+        except Exception as e:
+            _job_finished(link)
+            logger.error(f"Unexpected error queueing proxy {link}: {e}", exc_info=True)
+    return finished
+
+
+# Catch-up of messages posted while the bot was offline (per-channel checkpoints)
+backfiller = Backfiller(
+    store,
+    client,
+    lambda message: process_message(message, wait=True),
+    batch_size=backfill_batch_size,
+    concurrency=backfill_concurrency,
+    initial_messages=backfill_initial_messages
+)
 
 
 @client.on(events.NewMessage(chats=channels))
 async def my_event_handler(event):
-    """Handle new messages from monitored channels."""
-    if not event.message or not event.message.message:
+    """Extract proxy links from new channel messages and feed them to the pipeline."""
+    if not event.message:
         return
     
-    message = event.message.message
-    # Use a more restrictive regex to prevent ReDoS attacks
-    # Limit the character class and use non-greedy matching
-    proxy_links = re.findall(r'https?://t\.me/proxy\?[^\s<>"]{1,500}', message)
-    
-    if not proxy_links:
-        return
-    
-    for link in proxy_links:
-        try:
-            # Parse proxy link
-            parsed = parse_proxy_link(link)
-            if not parsed:
-                logger.warning(f"Failed to parse proxy link: {link}")
-                continue
-            
-            server, port = parsed
-            
-            # Get country information
-            country = await get_country_from_ip(server)
-            
-            # Ping the proxy server
-            ping = await ping_proxy(server, port)
-            if ping is None:
-                logger.warning(f"Could not ping proxy {server}:{port}")
-                # Continue anyway, but don't include ping in message
-            
-            # Atomically check and log proxy (prevents race conditions)
-            was_logged = log_proxy_if_not_exists(link, country, server, port, ping)
-            if not was_logged:
-                logger.info(f"Proxy {link} has already been processed.")
-                continue
-            
-            # Format and send message
-            text = format_proxy_message(country, server, port, ping)
-            buttons = [Button.url('Connect', link)]
-            
-            try:
-                # Ensure bot is connected before sending
-                if not bot.is_connected():
-                    logger.warning("Bot client is not connected, skipping message send")
-                    continue
-                
-                # Validate channel_id before sending
-                if not channel_id or not str(channel_id).strip():
-                    logger.error("Invalid channel_id: cannot be empty")
-                    continue
-                
-                await bot.send_message(
-                    channel_id,
-                    text,
-                    buttons=buttons,
-                    link_preview=False
-                )
-                logger.info(f"Successfully sent proxy {server}:{port} to channel")
-            except ValueError as e:
-                logger.error(f"Invalid channel_id format: {e}")
-                continue
-            except Exception as e:
-                logger.error(f"Error sending message to channel {channel_id}: {e}", exc_info=True)
-                continue
-            
-        except AttributeError as e:
-            logger.error(f"Error parsing link: {link}. Required parameters missing: {e}")
-        except Exception as e:
-            logger.error(f"Unexpected error processing proxy {link}: {e}", exc_info=True)
+    if event.message.message:
+        await process_message(event.message.message)
+    # Advances the channel's checkpoint so a later backfill doesn't re-read it
+    backfiller.note_live(event.chat_id, event.message.id)
 
 
 async def clean_old_proxies() -> None:
-    """Clear the proxy file (called periodically)."""
+    """Remove proxies not seen within PROXY_TTL and flush deferred writes (called periodically)."""
     try:
-        if os.path.exists(PROXY_FILE):
-            with file_lock:
-                with open(PROXY_FILE, 'w', encoding='utf-8') as file:
-                    json.dump({}, file, indent=4)
-            logger.info("Cleaned old proxies file")
+        touched = store.flush_touches()
+        backfiller.flush()
+        removed = store.expire_older_than(time.time() - proxy_ttl)
+        for proxy_id in removed:
+            quality.discard(proxy_id)
+        if removed or touched:
+            logger.info(f"Expired {len(removed)} old proxies, refreshed {touched} reposted proxies")
     except Exception as e:
-        logger.error(f"Error cleaning proxies file: {e}")
+        logger.error(f"Error cleaning proxy store: {e}")
 
 
 async def schedule_cleaning() -> None:
-    """Schedule the cleaning task every 24 hours."""
+    """Run incremental expiry every EXPIRY_INTERVAL seconds."""
     while True:
         try:
-            await asyncio.sleep(86400)  # Sleep for 24 hours
+            await asyncio.sleep(expiry_interval)
             await clean_old_proxies()
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"Error in cleaning schedule: {e}")
-            await asyncio.sleep(3600)  # Retry after 1 hour on error
+            await asyncio.sleep(expiry_interval)
 
 
 # Note: main() function has been moved to main.py to avoid duplication
@@ -0,0 +1,228 @@
+"""
+Live fan-out of newly accepted proxies to stream subscribers.
+
+The pipeline publishes each proxy once it has been stored. The broadcaster
+keeps a short in-memory history and pushes the record to every subscriber
+whose filter matches. Each subscriber has a bounded buffer; a client that
+falls behind is disconnected instead of stalling the publisher, and it can
+resume from the last proxy ID it received. Event IDs are store proxy IDs,
+which are monotonic, so resuming is a simple "ID greater than" query.
+"""
+
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Set
+
+from store import get_store
+
+logger = logging.getLogger(__name__)
+
+# Function (after_id, limit) returning stored proxy records with larger IDs
+BackfillFunc = Callable[[int, int], List[Dict]]
+
+
+class ProxyFilter:
+    """
+    Server-side subscription filter.
+
+    Args:
+        countries: Country names to keep (case-insensitive); all if empty
+        min_ping: Lowest ping to keep in milliseconds
+        max_ping: Highest ping to keep in milliseconds
+    """
+
+    __slots__ = ('countries', 'min_ping', 'max_ping')
+
+    def __init__(
+        self,
+        countries: Optional[Sequence[str]] = None,
+        min_ping: Optional[float] = None,
+        max_ping: Optional[float] = None
+    ) -> None:
+        self.countries = {c.lower() for c in countries} if countries else None
+        self.min_ping = min_ping
+        self.max_ping = max_ping
+
+    def matches(self, record: Dict) -> bool:
+        """Return whether a proxy record passes the filter."""
+        if self.countries is not None and record['country'].lower() not in self.countries:
+            return False
+        ping = record['ping']
+        if self.min_ping is not None and (ping is None or ping < self.min_ping):
+            return False
+        if self.max_ping is not None and (ping is None or ping > self.max_ping):
+            return False
+        return True
+
+
+class Subscription:
+    """
+    One subscriber's bounded event buffer.
+
+    Args:
+        proxy_filter: Filter applied before records are buffered
+        max_buffer: Records buffered before the subscriber is cut off
+    """
+
+    def __init__(self, proxy_filter: ProxyFilter, max_buffer: int) -> None:
+        self.filter = proxy_filter
+        self.max_buffer = max_buffer
+        self._buffer: Deque[Dict] = deque()
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.overflowed = False
+
+    def push(self, record: Dict) -> None:
+        """Buffer a record, closing the subscription if the buffer is full."""
+        if self.closed:
+            return
+        if len(self._buffer) >= self.max_buffer:
+            self.overflowed = True
+            self.close()
+            return
+        self._buffer.append(record)
+        self._ready.set()
+
+    def close(self) -> None:
+        """End the subscription; pending get() calls return immediately."""
+        self.closed = True
+        self._ready.set()
+
+    async def get(self, timeout: Optional[float] = None) -> List[Dict]:
+        """
+        Wait for buffered records and take all of them.
+
+        Args:
+            timeout: Seconds to wait before returning an empty list
+
+        Returns:
+            Buffered records in publish order (empty on timeout or close)
+        """
+        if not self._buffer and not self.closed:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        records = list(self._buffer)
+        self._buffer.clear()
+        self._ready.clear()
+        return records
+
+
+class ProxyBroadcaster:
+    """
+    Publish/subscribe hub for accepted proxies.
+
+    Args:
+        history_size: Recent records kept in memory for resuming subscribers
+        client_buffer: Per-subscriber buffer size
+        backfill: Optional store query used when a resume point is older
+            than the in-memory history
+    """
+
+    def __init__(
+        self,
+        history_size: int = 1000,
+        client_buffer: int = 256,
+        backfill: Optional[BackfillFunc] = None
+    ) -> None:
+        self.history: Deque[Dict] = deque(maxlen=history_size)
+        self.client_buffer = client_buffer
+        self.backfill = backfill
+        self._subscribers: Set[Subscription] = set()
+        self.published = 0
+        self.disconnected_slow = 0
+
+    @property
+    def subscribers(self) -> int:
+        """Number of connected subscribers."""
+        return len(self._subscribers)
+
+    def publish(self, record: Dict) -> None:
+        """
+        Fan a newly accepted proxy out to matching subscribers.
+
+        Args:
+            record: Proxy record (as returned by ProxyStore.get_record)
+        """
+        self.history.append(record)
+        self.published += 1
+        for subscription in list(self._subscribers):
+            if subscription.filter.matches(record):
+                subscription.push(record)
+                if subscription.overflowed:
+                    self.disconnected_slow += 1
+                    self._subscribers.discard(subscription)
+                    logger.info("Disconnected slow stream subscriber (buffer full)")
+
+    def subscribe(self, proxy_filter: ProxyFilter) -> Subscription:
+        """Register a subscriber; records published from now on are buffered for it."""
+        subscription = Subscription(proxy_filter, self.client_buffer)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove a subscriber."""
+        subscription.close()
+        self._subscribers.discard(subscription)
+
+    def replay(self, after_id: int, proxy_filter: ProxyFilter, limit: int = 1000) -> List[Dict]:
+        """
+        Return matching records published after a given proxy ID.
+
+        Served from the in-memory history when it reaches back far enough,
+        otherwise from the backfill query.
+
+        Args:
+            after_id: Last proxy ID the client received
+            proxy_filter: Subscriber filter
+            limit: Maximum records to return
+
+        Returns:
+            Matching records in ID order
+        """
+        if self.history and (self.history[0]['id'] <= after_id + 1 or self.backfill is None):
+            records = [record for record in self.history if record['id'] > after_id]
+        elif self.backfill is not None:
+            records = self.backfill(after_id, limit)
+        else:
+            records = []
+        return [record for record in records if proxy_filter.matches(record)][:limit]
+
+    def close_all(self) -> None:
+        """Disconnect every subscriber (used on shutdown)."""
+        for subscription in list(self._subscribers):
+            self.unsubscribe(subscription)
+
+
+_default_broadcaster: Optional[ProxyBroadcaster] = None
+_default_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster(history_size: int = 1000, client_buffer: int = 256) -> ProxyBroadcaster:
+    """
+    Return the process-wide broadcaster, creating it on first use.
+
+    Resume points older than the in-memory history are served from the
+    shared proxy store.
+
+    Args:
+        history_size: Recent records kept in memory; only honoured by the
+            call that creates the broadcaster
+        client_buffer: Per-subscriber buffer size; only honoured by the call
+            that creates the broadcaster
+
+    Returns:
+        Shared ProxyBroadcaster instance
+    """
+    global _default_broadcaster
+    with _default_broadcaster_lock:
+        if _default_broadcaster is None:
+            _default_broadcaster = ProxyBroadcaster(
+                history_size,
+                client_buffer,
+                backfill=lambda after_id, limit: get_store().load_records(after_id=after_id, limit=limit)
+            )
+        return _default_broadcaster
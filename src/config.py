@@ -2,6 +2,7 @@
 
 import os
 import logging
+import socket
 from typing import List, Optional
 from dotenv import load_dotenv
 
@@ -24,6 +25,41 @@ def get_optional_env(key: str, default: Optional[str] = None) -> Optional[str]:
     return os.getenv(key, default)
 
 
+def get_int_env(key: str, default: int) -> int:
+    """Get optional integer environment variable or raise error if malformed."""
+    value = os.getenv(key)
+    if value is None or not value.strip():
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Environment variable {key} must be an integer, got '{value}'.")
+
+
+def get_float_env(key: str, default: float) -> float:
+    """Get optional float environment variable or raise error if malformed."""
+    value = os.getenv(key)
+    if value is None or not value.strip():
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Environment variable {key} must be a number, got '{value}'.")
+
+
+def get_bool_env(key: str, default: bool) -> bool:
+    """Get optional boolean environment variable (1/true/yes/on or 0/false/no/off)."""
+    value = os.getenv(key)
+    if value is None or not value.strip():
+        return default
+    normalized = value.strip().lower()
+    if normalized in ('1', 'true', 'yes', 'on'):
+        return True
+    if normalized in ('0', 'false', 'no', 'off'):
+        return False
+    raise ValueError(f"Environment variable {key} must be a boolean, got '{value}'.")
+
+
 # Required configuration
 api_id: str = get_required_env('API_ID')
 api_hash: str = get_required_env('API_HASH')
@@ -36,6 +72,141 @@ config_channel_url: Optional[str] = get_optional_env('CONFIG_CHANNEL_URL')
 bot_url: Optional[str] = get_optional_env('BOT_URL')
 support_url: Optional[str] = get_optional_env('SUPPORT_URL')
 
+# Geolocation cache
+geo_cache_size: int = get_int_env('GEO_CACHE_SIZE', 10000)
+geo_cache_ttl: int = get_int_env('GEO_CACHE_TTL', 604800)  # 7 days
+geo_cache_share_prefix: bool = get_bool_env('GEO_CACHE_SHARE_PREFIX', True)
+
+# Geolocation backend: 'ipapi' (online only), 'csv' (IP range CSV or prebuilt .bin) or 'mmdb' (MaxMind DB).
+# With a local backend ip-api.com is only queried for addresses the database doesn't cover.
+geoip_backend: str = get_optional_env('GEOIP_BACKEND', 'ipapi')
+geoip_database: Optional[str] = get_optional_env('GEOIP_DATABASE')
+
+if geoip_backend not in ('ipapi', 'csv', 'mmdb'):
+    raise ValueError(f"GEOIP_BACKEND must be one of ipapi, csv, mmdb, got '{geoip_backend}'.")
+if geoip_backend != 'ipapi' and not geoip_database:
+    raise ValueError(f"GEOIP_DATABASE must be set when GEOIP_BACKEND={geoip_backend}.")
+
+# ip-api.com client: base URL and how long to collect lookups into one batch request
+ipapi_url: str = get_optional_env('IPAPI_URL', 'http://ip-api.com')
+geo_batch_window: float = get_float_env('GEO_BATCH_WINDOW', 0.05)
+
+# DNS cache lifetimes (seconds) for resolved and unresolvable proxy hostnames
+dns_cache_ttl: int = get_int_env('DNS_CACHE_TTL', 300)
+dns_negative_ttl: int = get_int_env('DNS_NEGATIVE_TTL', 60)
+
+# Proxy expiry: proxies not posted in a monitored channel for PROXY_TTL seconds are
+# removed by a sweep that runs every EXPIRY_INTERVAL seconds (re-validation doesn't
+# extend this; it tracks reachability in last_alive)
+proxy_ttl: int = get_int_env('PROXY_TTL', 86400)
+expiry_interval: int = get_int_env('EXPIRY_INTERVAL', 300)
+
+# Background re-validation of stored proxies
+revalidate_enabled: bool = get_bool_env('REVALIDATE_ENABLED', True)
+revalidate_min_interval: float = get_float_env('REVALIDATE_MIN_INTERVAL', 300.0)
+revalidate_max_interval: float = get_float_env('REVALIDATE_MAX_INTERVAL', 21600.0)
+revalidate_rate: float = get_float_env('REVALIDATE_RATE', 5.0)
+revalidate_concurrency: int = get_int_env('REVALIDATE_CONCURRENCY', 20)
+dead_after_failures: int = get_int_env('DEAD_AFTER_FAILURES', 3)
+
+# Rolling quality statistics: probe outcomes kept per proxy and EWMA latency smoothing
+quality_window: int = get_int_env('QUALITY_WINDOW', 32)
+quality_ewma_alpha: float = get_float_env('QUALITY_EWMA_ALPHA', 0.3)
+
+# Dedup tuning: Bloom filter capacity for links evicted from the store (0 = disabled)
+dedup_bloom_capacity: int = get_int_env('DEDUP_BLOOM_CAPACITY', 0)
+
+# Ingestion pipeline tuning
+pipeline_queue_size: int = get_int_env('PIPELINE_QUEUE_SIZE', 1000)
+# What to do when the ingest queue is full: block, drop_new or drop_oldest
+pipeline_overflow: str = get_optional_env('PIPELINE_OVERFLOW', 'block')
+enrich_workers: int = get_int_env('ENRICH_WORKERS', 8)
+# Country lookups waiting at once; ip-api batches can only fill up to this many IPs
+geo_workers: int = get_int_env('GEO_WORKERS', 100)
+publish_workers: int = get_int_env('PUBLISH_WORKERS', 1)
+# Worker processes for DNS, probing and offline GeoIP (0 = enrich in the bot process).
+# ENRICH_WORKERS still bounds the jobs in flight across all of them.
+enrich_processes: int = get_int_env('ENRICH_PROCESSES', 0)
+
+# Outbound publishing (per-chat pacing, flood-wait handling and digests)
+publish_rate_per_minute: float = get_float_env('PUBLISH_RATE_PER_MINUTE', 20.0)
+publish_burst: int = get_int_env('PUBLISH_BURST', 3)
+publish_digest_size: int = get_int_env('PUBLISH_DIGEST_SIZE', 1)
+publish_digest_window: float = get_float_env('PUBLISH_DIGEST_WINDOW', 5.0)
+publish_max_attempts: int = get_int_env('PUBLISH_MAX_ATTEMPTS', 5)
+# Proxies scoring below this (0-100) at ingestion are stored but not posted (0 = post all)
+publish_min_quality: float = get_float_env('PUBLISH_MIN_QUALITY', 0.0)
+
+# Web server (runs on the bot's event loop)
+web_host: str = get_optional_env('WEB_HOST', '0.0.0.0')
+web_port: int = get_int_env('WEB_PORT', 5000)
+# Proxy cards per page on the web interface
+index_page_size: int = get_int_env('INDEX_PAGE_SIZE', 60)
+
+# Live proxy stream: records kept for resuming clients, per-client buffer size
+stream_history: int = get_int_env('STREAM_HISTORY', 1000)
+stream_client_buffer: int = get_int_env('STREAM_CLIENT_BUFFER', 256)
+
+# History catch-up: messages posted while the bot was down are read back on start.
+# Channels without a checkpoint read at most BACKFILL_INITIAL_MESSAGES (0 = start from now).
+backfill_on_start: bool = get_bool_env('BACKFILL_ON_START', True)
+backfill_batch_size: int = get_int_env('BACKFILL_BATCH_SIZE', 500)
+backfill_concurrency: int = get_int_env('BACKFILL_CONCURRENCY', 2)
+backfill_initial_messages: int = get_int_env('BACKFILL_INITIAL_MESSAGES', 0)
+
+# Shared state for running several instances: 'local' (in memory, single instance) or
+# 'redis' (any Redis-protocol server at STATE_URL). NODE_ID names this instance in leases.
+state_backend: str = get_optional_env('STATE_BACKEND', 'local')
+state_url: Optional[str] = get_optional_env('STATE_URL')
+state_prefix: str = get_optional_env('STATE_PREFIX', 'orv:')
+node_id: str = get_optional_env('NODE_ID') or f"{socket.gethostname()}-{os.getpid()}"
+
+# Maximum number of concurrent TCP probes
+probe_concurrency: int = get_int_env('PROBE_CONCURRENCY', 1000)
+# Proxy check mode: 'tcp' (connect only) or 'mtproto' (full handshake using the link secret)
+probe_mode: str = get_optional_env('PROBE_MODE', 'tcp')
+
+if pipeline_overflow not in ('block', 'drop_new', 'drop_oldest'):
+    raise ValueError(
+        f"PIPELINE_OVERFLOW must be one of block, drop_new, drop_oldest, got '{pipeline_overflow}'."
+    )
+
+# Each digest entry gets its own Connect button; keep messages well within Telegram's limits
+if not 1 <= publish_digest_size <= 20:
+    raise ValueError(f"PUBLISH_DIGEST_SIZE must be between 1 and 20, got {publish_digest_size}.")
+
+if not 1 <= quality_window <= 1024 or not 0 < quality_ewma_alpha <= 1:
+    raise ValueError(
+        f"QUALITY_WINDOW must be between 1 and 1024 and QUALITY_EWMA_ALPHA in (0, 1], "
+        f"got {quality_window} and {quality_ewma_alpha}."
+    )
+
+if not 0 <= publish_min_quality <= 100:
+    raise ValueError(f"PUBLISH_MIN_QUALITY must be between 0 and 100, got {publish_min_quality}.")
+
+if geo_workers < 1:
+    raise ValueError(f"GEO_WORKERS must be at least 1, got {geo_workers}.")
+
+if enrich_processes < 0:
+    raise ValueError(f"ENRICH_PROCESSES cannot be negative, got {enrich_processes}.")
+
+if index_page_size < 1:
+    raise ValueError(f"INDEX_PAGE_SIZE must be at least 1, got {index_page_size}.")
+
+if backfill_batch_size < 1 or backfill_concurrency < 1 or backfill_initial_messages < 0:
+    raise ValueError(
+        "BACKFILL_BATCH_SIZE and BACKFILL_CONCURRENCY must be at least 1 "
+        "and BACKFILL_INITIAL_MESSAGES cannot be negative."
+    )
+
+if state_backend not in ('local', 'redis'):
+    raise ValueError(f"STATE_BACKEND must be 'local' or 'redis', got '{state_backend}'.")
+if state_backend == 'redis' and not state_url:
+    raise ValueError("STATE_URL must be set when STATE_BACKEND=redis (e.g. redis://localhost:6379/0).")
+
+if probe_mode not in ('tcp', 'mtproto'):
+    raise ValueError(f"PROBE_MODE must be 'tcp' or 'mtproto', got '{probe_mode}'.")
+
 # Load channels as a list of integers
 channels_str = get_required_env('CHANNELS')
 channels: List[int] = [int(chat_id.strip()) for chat_id in channels_str.split(',') if chat_id.strip()]
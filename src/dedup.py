@@ -0,0 +1,210 @@
+"""
+In-memory deduplication index for proxy links.
+
+Answers "have I seen this link?" with a hash lookup instead of a store scan and
+hands out proxy IDs from a monotonic counter. An optional Bloom filter keeps a
+compact memory of links that have already been evicted from the store.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import threading
+from typing import Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter using double hashing over a BLAKE2b digest.
+
+    False positives are possible (bounded by the configured error rate),
+    false negatives are not.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        if capacity <= 0:
+            raise ValueError("Bloom filter capacity must be positive")
+        if not 0 < error_rate < 1:
+            raise ValueError("Bloom filter error rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str) -> None:
+        """Add an item to the filter."""
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def save(self, path: str) -> None:
+        """
+        Write the filter bits to disk atomically.
+
+        Args:
+            path: Destination file
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(self.bits)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> bool:
+        """
+        Restore filter bits from disk if the file matches this filter's size.
+
+        Args:
+            path: Source file
+
+        Returns:
+            True if the snapshot was loaded, False otherwise
+        """
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            return False
+        except IOError as e:
+            logger.error(f"Error reading Bloom filter snapshot {path}: {e}")
+            return False
+        if len(data) != len(self.bits):
+            logger.warning(f"Ignoring Bloom filter snapshot {path}: size mismatch")
+            return False
+        self.bits = bytearray(data)
+        return True
+
+
+class DedupIndex:
+    """
+    Set-backed membership index for stored links plus a monotonic ID counter.
+
+    Links currently in the store live in an exact hash set. When a Bloom filter
+    is configured, links evicted from the store are remembered there so they
+    keep counting as duplicates.
+    """
+
+    def __init__(self, bloom_capacity: int = 0, bloom_path: Optional[str] = None) -> None:
+        self._links = set()
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._bloom_path = bloom_path
+        self._bloom: Optional[BloomFilter] = None
+        if bloom_capacity > 0:
+            self._bloom = BloomFilter(bloom_capacity)
+            if bloom_path:
+                self._bloom.load(bloom_path)
+
+    def rebuild(self, entries: Iterable[Tuple[int, str]], last_id: int = 0) -> None:
+        """
+        Rebuild the index from (id, link) pairs read from the store.
+
+        Args:
+            entries: Iterable of (proxy ID, link) pairs
+            last_id: Highest ID ever issued, so IDs stay monotonic after deletes
+        """
+        with self._lock:
+            self._links.clear()
+            max_id = last_id
+            for proxy_id, link in entries:
+                self._links.add(link)
+                if proxy_id > max_id:
+                    max_id = proxy_id
+            self._next_id = max(self._next_id, max_id + 1)
+
+    def __contains__(self, link: str) -> bool:
+        if link in self._links:
+            return True
+        return self._bloom is not None and link in self._bloom
+
+    def __len__(self) -> int:
+        return len(self._links)
+
+    @property
+    def last_id(self) -> int:
+        """Highest ID issued so far."""
+        return self._next_id - 1
+
+    def next_id(self) -> int:
+        """Reserve and return the next proxy ID."""
+        with self._lock:
+            proxy_id = self._next_id
+            self._next_id += 1
+            return proxy_id
+
+    def add(self, link: str) -> None:
+        """Record a link that was inserted into the store."""
+        self._links.add(link)
+
+    def evict(self, links: Iterable[str]) -> None:
+        """
+        Forget links removed from the store, remembering them in the Bloom filter.
+
+        Args:
+            links: Links that were deleted from the store
+        """
+        with self._lock:
+            for link in links:
+                self._links.discard(link)
+                if self._bloom is not None:
+                    self._bloom.add(link)
+            if self._bloom is not None and self._bloom_path:
+                try:
+                    self._bloom.save(self._bloom_path)
+                except IOError as e:
+                    logger.error(f"Error saving Bloom filter snapshot: {e}")
+
+
+class LinkGate:
+    """
+    Seen/in-flight gate placed in front of link enrichment.
+
+    A link is admitted only if it is neither in the dedup index nor currently
+    being processed, so reposted proxies and duplicates arriving in the same
+    burst never cost a geolocation lookup or a probe. Intended for use from a
+    single event loop.
+    """
+
+    def __init__(self, index: DedupIndex) -> None:
+        self._index = index
+        self._in_flight = set()
+
+    def try_claim(self, link: str) -> bool:
+        """
+        Claim a link for processing.
+
+        Args:
+            link: The proxy link
+
+        Returns:
+            True if the caller should process the link, False if it is a duplicate
+        """
+        if link in self._in_flight or link in self._index:
+            return False
+        self._in_flight.add(link)
+        return True
+
+    def release(self, link: str) -> None:
+        """Mark a claimed link as finished (stored or discarded)."""
+        self._in_flight.discard(link)
+
+    def processing(self, link: str) -> bool:
+        """Return True if the link is claimed and not yet released."""
+        return link in self._in_flight
+
+    @property
+    def in_flight(self) -> int:
+        """Number of links currently being processed."""
+        return len(self._in_flight)
@@ -0,0 +1,192 @@
+"""
+TTL/LRU cache for IP geolocation results.
+
+Entries are keyed by resolved IP address. Optionally a result is also stored
+under the address's /24 (IPv4) or /48 (IPv6) network so neighbouring servers
+share one lookup. The cache can be snapshotted to disk so restarts don't spend
+the geolocation API quota again.
+"""
+
+import ipaddress
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IPV4_PREFIX = 24
+IPV6_PREFIX = 48
+
+
+def prefix_key(ip: str) -> Optional[str]:
+    """
+    Return the cache key of the network an IP address belongs to.
+
+    Args:
+        ip: IP address
+
+    Returns:
+        Key such as 'net:203.0.113.0/24', or None if ip is not an IP address
+    """
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    prefix = IPV4_PREFIX if address.version == 4 else IPV6_PREFIX
+    network = ipaddress.ip_network(f"{address}/{prefix}", strict=False)
+    return f"net:{network}"
+
+
+class GeoCache:
+    """
+    Thread-safe TTL + LRU cache mapping IPs (and optionally networks) to countries.
+
+    Args:
+        max_entries: Maximum number of cached keys before LRU eviction
+        ttl: Entry lifetime in seconds
+        share_prefix: Also answer lookups from the /24 or /48 network entry
+        snapshot_path: File used by save() and load(); None disables persistence
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl: float = 604800.0,
+        share_prefix: bool = True,
+        snapshot_path: Optional[str] = None
+    ) -> None:
+        if max_entries < 1:
+            raise ValueError("Geo cache needs room for at least one entry")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.share_prefix = share_prefix
+        self.snapshot_path = snapshot_path
+        # key -> (country, expires_at); wall-clock expiry so snapshots survive restarts
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key: str, now: float) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        country, expires_at = entry
+        if expires_at <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return country
+
+    def _store(self, key: str, country: str, expires_at: float) -> None:
+        self._entries[key] = (country, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, ip: str) -> Optional[str]:
+        """
+        Look up the cached country for an IP address.
+
+        Args:
+            ip: Resolved IP address (hostnames are cached verbatim, without prefix sharing)
+
+        Returns:
+            Country name or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            country = self._lookup(ip, now)
+            if country is not None:
+                self.hits += 1
+                return country
+            if self.share_prefix:
+                net_key = prefix_key(ip)
+                if net_key:
+                    country = self._lookup(net_key, now)
+                    if country is not None:
+                        self.prefix_hits += 1
+                        return country
+            self.misses += 1
+            return None
+
+    def put(self, ip: str, country: str) -> None:
+        """
+        Cache the country for an IP address (and its network if prefix sharing is on).
+
+        Args:
+            ip: Resolved IP address
+            country: Country name
+        """
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(ip, country, expires_at)
+            if self.share_prefix:
+                net_key = prefix_key(ip)
+                if net_key:
+                    self._store(net_key, country, expires_at)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and current size."""
+        lookups = self.hits + self.prefix_hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'prefix_hits': self.prefix_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round((self.hits + self.prefix_hits) / lookups, 4) if lookups else 0.0
+        }
+
+    def save(self) -> None:
+        """Write unexpired entries to the snapshot file atomically."""
+        if not self.snapshot_path:
+            return
+        now = time.time()
+        with self._lock:
+            data = {key: entry for key, entry in self._entries.items() if entry[1] > now}
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(data, file, ensure_ascii=False)
+            os.replace(tmp_path, self.snapshot_path)
+            logger.debug(f"Saved {len(data)} geo cache entries to {self.snapshot_path}")
+        except IOError as e:
+            logger.error(f"Error saving geo cache snapshot: {e}")
+
+    def load(self) -> int:
+        """
+        Restore unexpired entries from the snapshot file.
+
+        Returns:
+            Number of entries loaded
+        """
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return 0
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"Error loading geo cache snapshot: {e}")
+            return 0
+
+        now = time.time()
+        loaded = 0
+        with self._lock:
+            # Oldest expiry first so LRU order roughly follows insertion order
+            for key, (country, expires_at) in sorted(data.items(), key=lambda item: item[1][1]):
+                if expires_at > now:
+                    self._store(key, country, expires_at)
+                    loaded += 1
+        logger.info(f"Loaded {loaded} geo cache entries from {self.snapshot_path}")
+        return loaded
@@ -0,0 +1,200 @@
+"""
+Batched ip-api.com client.
+
+Lookups arriving within a short window (or while waiting for the next rate
+limit slot) are coalesced into a single POST to ip-api's batch endpoint,
+which accepts up to 100 queries, and the results are fanned back out to the
+waiting coroutines. Concurrent lookups of the same address share one query,
+and a single pooled aiohttp session is reused for every request.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from metrics import Counter, Histogram
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = 100  # ip-api batch endpoint limit
+BATCH_REQUESTS_PER_MINUTE = 15  # ip-api free tier batch endpoint quota
+_FIELDS = 'status,message,country,query'
+
+GEO_REQUEST_SECONDS = Histogram('orv_geo_request_seconds', 'ip-api batch request latency')
+GEO_REQUESTS = Counter('orv_geo_requests_total', 'ip-api batch requests by outcome', ('status',))
+GEO_BATCH_SIZE = Histogram(
+    'orv_geo_batch_size', 'Addresses per successful ip-api batch request', buckets=(1, 5, 10, 25, 50, 75, 100)
+)
+
+
+class IpApiClient:
+    """
+    Coalescing, batching client for ip-api.com.
+
+    Args:
+        base_url: API base URL (point at a local fake server for testing)
+        batch_window: Seconds to wait for more lookups before sending a batch
+        max_batch: Maximum queries per batch request
+        rate_limiter: Token bucket gating batch requests; defaults to the free
+            tier quota and adapts to ip-api's X-Rl/X-Ttl headers
+        max_concurrency: Maximum batch requests in flight
+        timeout: Request timeout in seconds
+    """
+
+    def __init__(
+        self,
+        base_url: str = 'http://ip-api.com',
+        batch_window: float = 0.05,
+        max_batch: int = MAX_BATCH_SIZE,
+        rate_limiter: Optional[TokenBucket] = None,
+        max_concurrency: int = 3,
+        timeout: float = 5.0
+    ) -> None:
+        self.base_url = base_url.rstrip('/')
+        self.batch_window = batch_window
+        self.max_batch = min(max_batch, MAX_BATCH_SIZE)
+        self.rate_limiter = rate_limiter or TokenBucket(
+            rate=BATCH_REQUESTS_PER_MINUTE / 60.0, capacity=BATCH_REQUESTS_PER_MINUTE
+        )
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._queue: List[str] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._sender: Optional[asyncio.Task] = None
+        self.requests = 0
+        self.queries = 0
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit=10, keepalive_timeout=60)
+            )
+        return self._session
+
+    async def lookup(self, target: str) -> str:
+        """
+        Look up the country of an IP address.
+
+        Args:
+            target: IP address (or hostname) to look up
+
+        Returns:
+            Country name or 'Unknown' if the lookup failed
+        """
+        future = self._pending.get(target)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[target] = future
+            self._queue.append(target)
+            if self._wakeup is None:
+                self._wakeup = asyncio.Event()
+            self._wakeup.set()
+            if self._sender is None or self._sender.done():
+                self._sender = asyncio.create_task(self._send_loop())
+        try:
+            # Shield so one cancelled waiter doesn't cancel the shared result
+            return await asyncio.shield(future)
+        finally:
+            # The first waiter to see the result retires the query. Until then a
+            # lookup of the same target still shares it: every future in a batch
+            # completes at once, but waiters resume (and cache) one at a time.
+            if future.done() and self._pending.get(target) is future:
+                del self._pending[target]
+
+    async def _send_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            # Let the batch fill up unless it is already full
+            if len(self._queue) < self.max_batch:
+                await asyncio.sleep(self.batch_window)
+            await self.rate_limiter.acquire()
+            batch = self._queue[:self.max_batch]
+            del self._queue[:self.max_batch]
+            if not self._queue:
+                self._wakeup.clear()
+            if batch:
+                asyncio.create_task(self._send_batch(batch))
+
+    async def _send_batch(self, batch: List[str]) -> None:
+        results: Dict[str, str] = {}
+        async with self._semaphore:
+            try:
+                session = await self._get_session()
+                url = f'{self.base_url}/batch?fields={_FIELDS}'
+                start_time = time.perf_counter()
+                async with session.post(url, json=batch) as response:
+                    GEO_REQUEST_SECONDS.observe(time.perf_counter() - start_time)
+                    self.rate_limiter.observe_headers(response.headers)
+                    if response.status == 429:
+                        GEO_REQUESTS.inc(status='rate_limited')
+                        self.rate_limiter.penalize(float(response.headers.get('X-Ttl', 60)))
+                        # Put the queries back at the front; waiters keep waiting
+                        self._queue[:0] = batch
+                        self._wakeup.set()
+                        return
+                    response.raise_for_status()
+                    data = await response.json()
+                self.requests += 1
+                self.queries += len(batch)
+                GEO_REQUESTS.inc(status='ok')
+                GEO_BATCH_SIZE.observe(len(batch))
+                for target, entry in zip(batch, data):
+                    results[target] = self._parse_entry(target, entry)
+            except aiohttp.ClientError as e:
+                GEO_REQUESTS.inc(status='error')
+                logger.error(f"Error fetching countries for batch of {len(batch)}: {e}")
+            except Exception as e:
+                GEO_REQUESTS.inc(status='error')
+                logger.error(f"Unexpected error in ip-api batch request: {e}", exc_info=True)
+
+        for target in batch:
+            future = self._pending.get(target)
+            if future is not None and not future.done():
+                future.set_result(results.get(target, 'Unknown'))
+
+    def stats(self) -> Dict[str, float]:
+        """Return request counters and the average number of addresses per batch."""
+        return {
+            'requests': self.requests,
+            'queries': self.queries,
+            'batch_fill': round(self.queries / self.requests, 1) if self.requests else 0.0,
+            'queued': len(self._queue)
+        }
+
+    @staticmethod
+    def _parse_entry(target: str, entry: Dict) -> str:
+        """Validate one batch result entry and return the country."""
+        if not isinstance(entry, dict):
+            return 'Unknown'
+        if entry.get('status') == 'fail':
+            logger.warning(f"IP API returned error for {target}: {entry.get('message', 'Unknown error')}")
+            return 'Unknown'
+        country = entry.get('country', 'Unknown')
+        # Sanitize country name (basic check)
+        if country and isinstance(country, str) and len(country) <= 100:
+            return country
+        return 'Unknown'
+
+    async def close(self) -> None:
+        """Stop the sender and close the pooled session."""
+        if self._sender is not None:
+            self._sender.cancel()
+            try:
+                await self._sender
+            except asyncio.CancelledError:
+                pass
+            self._sender = None
+        for future in self._pending.values():
+            if not future.done():
+                future.set_result('Unknown')
+        self._pending.clear()
+        self._queue.clear()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
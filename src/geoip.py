@@ -0,0 +1,335 @@
+"""
+Offline GeoIP lookup from a local range database.
+
+Two backends are supported:
+
+- 'csv': a CSV of IP ranges (start, end, ..., country) such as the DB-IP or
+  IP2Location LITE country files. ISO country codes are mapped to the English
+  names ip-api.com and MaxMind report. Ranges are compiled into compact sorted
+  arrays and resolved by binary search. The compiled index is written to a
+  binary sidecar file that later startups memory-map instead of re-parsing.
+- 'mmdb': a MaxMind DB file, read through the optional `maxminddb` package.
+
+Build a binary index ahead of time with:
+
+    python src/geoip.py build ranges.csv ranges.bin
+"""
+
+import csv
+import ipaddress
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import List, Optional, Sequence, Tuple
+
+from countries import country_name
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b'ORVGEO2\0'
+# magic, v4 range count, v6 range count, countries JSON length
+_HEADER = struct.Struct('<8sIII')
+
+
+def _parse_ip(value: str) -> Tuple[int, int]:
+    """
+    Parse an IP given as dotted/colon notation or as a decimal integer.
+
+    Returns:
+        Tuple of (IP version, integer value)
+    """
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        return (4 if number <= 0xffffffff else 6), number
+    address = ipaddress.ip_address(value)
+    return address.version, int(address)
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+class RangeIndex:
+    """
+    Sorted, non-overlapping IP ranges mapped to country indices.
+
+    IPv4 ranges live in 32-bit arrays; IPv6 ranges are split into high and low
+    64-bit halves. Lookups are a binary search over the range starts.
+    """
+
+    def __init__(
+        self,
+        countries: List[str],
+        v4_start: Sequence[int],
+        v4_end: Sequence[int],
+        v4_country: Sequence[int],
+        v6_start_hi: Sequence[int],
+        v6_start_lo: Sequence[int],
+        v6_end_hi: Sequence[int],
+        v6_end_lo: Sequence[int],
+        v6_country: Sequence[int]
+    ) -> None:
+        self.countries = countries
+        self.v4_start, self.v4_end, self.v4_country = v4_start, v4_end, v4_country
+        self.v6_start_hi, self.v6_start_lo = v6_start_hi, v6_start_lo
+        self.v6_end_hi, self.v6_end_lo = v6_end_hi, v6_end_lo
+        self.v6_country = v6_country
+        self._mmap: Optional[mmap.mmap] = None
+
+    def __len__(self) -> int:
+        return len(self.v4_start) + len(self.v6_start_hi)
+
+    @classmethod
+    def from_csv(cls, path: str) -> 'RangeIndex':
+        """
+        Compile a CSV range file.
+
+        The first two columns are the range start and end (dotted IPs or
+        integers). The country is the first later column holding a two-letter
+        ISO code, translated to its English name; files without a code column
+        must have the country name in the last column.
+
+        Args:
+            path: CSV file path
+
+        Returns:
+            Compiled RangeIndex
+        """
+        countries: List[str] = []
+        country_ids = {}
+        v4: List[Tuple[int, int, int]] = []
+        v6: List[Tuple[int, int, int]] = []
+
+        with open(path, 'r', encoding='utf-8', newline='') as file:
+            for row in csv.reader(file):
+                if len(row) < 3:
+                    continue
+                try:
+                    start_version, start = _parse_ip(row[0])
+                    end_version, end = _parse_ip(row[1])
+                except ValueError:
+                    # Header line or malformed row
+                    continue
+                country = _row_country(row[2:])
+                if not country or start_version != end_version or end < start:
+                    continue
+                if country not in country_ids:
+                    country_ids[country] = len(countries)
+                    countries.append(country)
+                (v4 if start_version == 4 else v6).append((start, end, country_ids[country]))
+
+        v4.sort()
+        v6.sort()
+        mask = (1 << 64) - 1
+        return cls(
+            countries,
+            array('I', (r[0] for r in v4)), array('I', (r[1] for r in v4)), array('H', (r[2] for r in v4)),
+            array('Q', (r[0] >> 64 for r in v6)), array('Q', (r[0] & mask for r in v6)),
+            array('Q', (r[1] >> 64 for r in v6)), array('Q', (r[1] & mask for r in v6)),
+            array('H', (r[2] for r in v6))
+        )
+
+    def save(self, path: str) -> None:
+        """
+        Write the index as a binary file that load() can memory-map.
+
+        Args:
+            path: Destination file
+        """
+        countries_json = json.dumps(self.countries, ensure_ascii=False).encode('utf-8')
+        sections = [
+            array('I', self.v4_start), array('I', self.v4_end), array('H', self.v4_country),
+            array('Q', self.v6_start_hi), array('Q', self.v6_start_lo),
+            array('Q', self.v6_end_hi), array('Q', self.v6_end_lo), array('H', self.v6_country)
+        ]
+        if sys.byteorder != 'little':
+            for section in sections:
+                section.byteswap()
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(_HEADER.pack(_MAGIC, len(self.v4_start), len(self.v6_start_hi), len(countries_json)))
+            file.write(countries_json)
+            for section in sections:
+                file.write(b'\0' * (_align(file.tell()) - file.tell()))
+                section.tofile(file)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'RangeIndex':
+        """
+        Memory-map a binary index written by save().
+
+        Args:
+            path: Binary index file
+
+        Returns:
+            RangeIndex whose arrays are views into the mapped file
+        """
+        with open(path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, v4_count, v6_count, countries_len = _HEADER.unpack_from(mapped, 0)
+        if magic != _MAGIC:
+            mapped.close()
+            raise ValueError(f"{path} is not a GeoIP range index or was built by an older version")
+
+        offset = _HEADER.size
+        countries = json.loads(bytes(mapped[offset:offset + countries_len]).decode('utf-8'))
+        offset += countries_len
+        view = memoryview(mapped)
+
+        def section(typecode: str, count: int):
+            nonlocal offset
+            offset = _align(offset)
+            size = array(typecode).itemsize * count
+            data = view[offset:offset + size]
+            offset += size
+            if sys.byteorder != 'little':
+                copy = array(typecode, data.tobytes())
+                copy.byteswap()
+                return copy
+            return data.cast(typecode)
+
+        index = cls(
+            countries,
+            section('I', v4_count), section('I', v4_count), section('H', v4_count),
+            section('Q', v6_count), section('Q', v6_count),
+            section('Q', v6_count), section('Q', v6_count), section('H', v6_count)
+        )
+        index._mmap = mapped
+        return index
+
+    def lookup(self, ip: str) -> Optional[str]:
+        """
+        Find the country for an IP address.
+
+        Args:
+            ip: IPv4 or IPv6 address
+
+        Returns:
+            Country name or None if the address is not covered
+        """
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        value = int(address)
+
+        if address.version == 4:
+            starts = self.v4_start
+            lo, hi = 0, len(starts)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if starts[mid] <= value:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            pos = lo - 1
+            if pos >= 0 and value <= self.v4_end[pos]:
+                return self.countries[self.v4_country[pos]]
+            return None
+
+        value_hi, value_lo = value >> 64, value & ((1 << 64) - 1)
+        starts_hi, starts_lo = self.v6_start_hi, self.v6_start_lo
+        lo, hi = 0, len(starts_hi)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if (starts_hi[mid], starts_lo[mid]) <= (value_hi, value_lo):
+                lo = mid + 1
+            else:
+                hi = mid
+        pos = lo - 1
+        if pos >= 0 and (value_hi, value_lo) <= (self.v6_end_hi[pos], self.v6_end_lo[pos]):
+            return self.countries[self.v6_country[pos]]
+        return None
+
+
+def _row_country(fields: Sequence[str]) -> Optional[str]:
+    """Return the country name of a CSV range row, or None if it is unknown ('ZZ', '-')."""
+    for value in fields:
+        value = value.strip()
+        if len(value) == 2 and value.isalpha():
+            return country_name(value)
+    name = fields[-1].strip()
+    return name if name and name != '-' else None
+
+
+class MmdbDatabase:
+    """Country lookups from a MaxMind DB file (requires the `maxminddb` package)."""
+
+    def __init__(self, path: str) -> None:
+        try:
+            import maxminddb
+        except ImportError:
+            raise ImportError(
+                "GEOIP_BACKEND=mmdb requires the 'maxminddb' package. Install it with: pip install maxminddb"
+            )
+        self._reader = maxminddb.open_database(path, maxminddb.MODE_MMAP)
+
+    def __len__(self) -> int:
+        return self._reader.metadata().node_count
+
+    def lookup(self, ip: str) -> Optional[str]:
+        """Return the English country name for an IP address, or None."""
+        try:
+            record = self._reader.get(ip)
+        except ValueError:
+            return None
+        if not record:
+            return None
+        country = record.get('country') or record.get('registered_country') or {}
+        return country.get('names', {}).get('en')
+
+
+def open_database(backend: str, path: str):
+    """
+    Open the local GeoIP database for the configured backend.
+
+    For the 'csv' backend a path ending in '.bin' is memory-mapped directly.
+    Otherwise the CSV is compiled once into a '<path>.bin' sidecar, which is
+    reused as long as it is newer than the CSV and in the current format.
+
+    Args:
+        backend: 'csv' or 'mmdb'
+        path: Database file path
+
+    Returns:
+        Object with a lookup(ip) -> Optional[str] method
+    """
+    if backend == 'mmdb':
+        return MmdbDatabase(path)
+    if backend != 'csv':
+        raise ValueError(f"Unknown GeoIP backend '{backend}'")
+
+    if path.endswith('.bin'):
+        return RangeIndex.load(path)
+
+    index_path = f"{path}.bin"
+    if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(path):
+        try:
+            return RangeIndex.load(index_path)
+        except ValueError as e:
+            logger.info(f"Rebuilding GeoIP range index: {e}")
+
+    index = RangeIndex.from_csv(path)
+    try:
+        index.save(index_path)
+        logger.info(f"Compiled GeoIP range index {index_path} ({len(index)} ranges)")
+        return RangeIndex.load(index_path)
+    except IOError as e:
+        logger.warning(f"Could not write GeoIP range index {index_path}: {e}")
+        return index
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] != 'build':
+        print("Usage: python src/geoip.py build <ranges.csv> <ranges.bin>")
+        sys.exit(1)
+    compiled = RangeIndex.from_csv(sys.argv[2])
+    compiled.save(sys.argv[3])
+    print(f"Wrote {len(compiled)} ranges ({len(compiled.countries)} countries) to {sys.argv[3]}")
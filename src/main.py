@@ -1,41 +1,73 @@
 """
-Main entry point for running both the Telegram bot and Flask web server.
+Main entry point for running both the Telegram bot and the web server.
+
+    python src/main.py              # listen for new messages and serve the web app
+    python src/main.py --backfill   # catch up on missed channel history, then exit
 """
 
+import argparse
 import asyncio
-import threading
 import logging
+from typing import Optional
+from aiohttp import web
 from logging_config import setup_logging
 
 # Setup logging first, before importing other modules
 setup_logging()
 
-from bot import bot, client, schedule_cleaning, executor
-from config import bot_token
+from bot import (
+    bot, client, schedule_cleaning, snapshot_geo_cache, geo_cache, geo_client, pipeline, revalidator,
+    publisher, backfiller, enrichment_pool, shared_state, store
+)
+from config import bot_token, channels, revalidate_enabled, backfill_on_start, web_host, web_port
 
 logger = logging.getLogger(__name__)
 
-# Import Flask app from app.py
+# Import the aiohttp web app from app.py
 from app import app
 
 
-def run_flask_app() -> None:
-    """Run Flask app in a separate thread."""
+async def start_web_server() -> Optional[web.AppRunner]:
+    """
+    Serve the web app on the running event loop.
+    
+    Returns:
+        The app runner (for cleanup), or None if the server could not start
+    """
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
     try:
-        logger.info("Starting Flask web server on http://0.0.0.0:5000")
-        app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False)
+        await web.TCPSite(runner, web_host, web_port).start()
     except OSError as e:
         # Handle port already in use or permission errors
-        if "Address already in use" in str(e) or "Permission denied" in str(e):
-            logger.error(f"Cannot start Flask server: {e}. Port 5000 may be in use.")
-        else:
-            logger.error(f"OS error running Flask app: {e}")
+        logger.error(f"Cannot start web server: {e}. Port {web_port} may be in use.")
+        await runner.cleanup()
+        return None
+    logger.info(f"Web server listening on http://{web_host}:{web_port}")
+    return runner
+
+
+async def run_backfill() -> None:
+    """Read channel history missed since the last checkpoints through the pipeline."""
+    try:
+        counts = await backfiller.run(channels)
+        logger.info(f"Backfill finished: {sum(counts.values())} messages from {len(counts)} channels")
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
-        logger.error(f"Error running Flask app: {e}", exc_info=True)
+        logger.error(f"Backfill failed: {e}", exc_info=True)
 
 
-async def main() -> None:
-    """Main async function to start bot and Flask server."""
+async def main(backfill_only: bool = False) -> None:
+    """
+    Main async function to start bot and web server.
+    
+    Args:
+        backfill_only: Catch up on channel history and exit instead of listening
+    """
+    web_runner = None
+    # Hold live checkpoints back until the backfill has caught each channel up
+    backfiller.enabled = backfill_only or backfill_on_start
     try:
         # Ensure full connection for Telethon client
         await client.start()
@@ -45,14 +77,36 @@ async def main() -> None:
         await bot.start(bot_token=bot_token)
         logger.info("Telegram bot client started successfully")
         
-        # Schedule the cleaning task
+        # Start the enrichment worker processes, if configured
+        if enrichment_pool is not None:
+            await enrichment_pool.start()
+        # Start the ingestion pipeline workers
+        await pipeline.start()
+        # Resume any posts left in the outbound queue
+        await publisher.start()
+        
+        if backfill_only:
+            await run_backfill()
+            logger.info(f"Backfill mode done; {publisher.stats()['queued']} posts remain queued for the next run")
+            return
+        
+        # Catch up on messages posted while the bot was down, alongside live ones
+        if backfill_on_start:
+            asyncio.create_task(run_backfill())
+        
+        # Schedule the incremental expiry task
         asyncio.create_task(schedule_cleaning())
-        logger.info("Scheduled proxy cleaning task")
+        logger.info("Scheduled proxy expiry task")
+        
+        # Persist the geo cache periodically
+        asyncio.create_task(snapshot_geo_cache())
         
-        # Start Flask app in a separate thread
-        flask_thread = threading.Thread(target=run_flask_app, daemon=True)
-        flask_thread.start()
-        logger.info("Flask web server thread started")
+        # Re-probe stored proxies in the background
+        if revalidate_enabled:
+            asyncio.create_task(revalidator.run())
+        
+        # Serve the web interface on the same event loop
+        web_runner = await start_web_server()
         
         # Run the bot (this will block until disconnected)
         logger.info("Bot is running and listening for messages...")
@@ -66,18 +120,37 @@ async def main() -> None:
     finally:
         # Cleanup connections
         try:
-            await bot.disconnect()
+            if web_runner is not None:
+                await web_runner.cleanup()
             await client.disconnect()
-            # Shutdown executor
-            executor.shutdown(wait=True)
+            # Let queued proxies finish before the bot goes away
+            await pipeline.stop()
+            if enrichment_pool is not None:
+                await enrichment_pool.stop()
+            # Everything handed to the pipeline is processed now
+            backfiller.flush(final=True)
+            # Reposts noted since the last expiry pass would otherwise be lost
+            store.flush_touches()
+            # Unsent posts stay queued for the next run
+            await publisher.stop()
+            await bot.disconnect()
+            await geo_client.close()
+            await shared_state.close()
+            geo_cache.save()
             logger.info("Resources cleaned up successfully")
         except Exception as e:
             logger.error(f"Error during cleanup: {e}")
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Orv Telegram Proxy bot and web server')
+    parser.add_argument(
+        '--backfill', action='store_true',
+        help='process channel messages missed since the last run, then exit'
+    )
+    args = parser.parse_args()
     try:
-        asyncio.run(main())
+        asyncio.run(main(backfill_only=args.backfill))
     except KeyboardInterrupt:
         logger.info("Application shutdown complete")
     except Exception as e:
@@ -0,0 +1,232 @@
+"""
+Pure parsing and formatting helpers for proxy links and channel messages.
+
+Nothing here touches Telegram, the network or the environment configuration,
+so the functions can be imported and benchmarked on their own.
+"""
+
+import ipaddress
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Restrictive pattern to prevent ReDoS: bounded length, no whitespace or markup
+PROXY_LINK_PATTERN = re.compile(r'https?://t\.me/proxy\?[^\s<>"]{1,500}')
+_SERVER_PATTERN = re.compile(r'server=([^&]+)')
+_PORT_PATTERN = re.compile(r'port=([^&]+)')
+
+# Telegram markdown v2 special characters that need escaping
+_MARKDOWN_SPECIAL_CHARS = '*_[]()~`>#+-=|{}.!'
+_MARKDOWN_ESCAPES = str.maketrans({char: f'\\{char}' for char in _MARKDOWN_SPECIAL_CHARS})
+
+
+def extract_proxy_links(message: str) -> List[str]:
+    """
+    Find every Telegram proxy link in a message.
+    
+    Args:
+        message: Message text
+        
+    Returns:
+        Proxy links in order of appearance
+    """
+    return PROXY_LINK_PATTERN.findall(message)
+
+
+def validate_ip_address(ip: str) -> bool:
+    """
+    Validate if a string is a valid IP address (IPv4 or IPv6).
+    
+    Args:
+        ip: String to validate
+        
+    Returns:
+        True if valid IP address, False otherwise
+    """
+    try:
+        ipaddress.ip_address(ip)
+        return True
+    except ValueError:
+        return False
+
+
+def validate_port(port: str) -> bool:
+    """
+    Validate if a string is a valid port number (1-65535).
+    
+    Args:
+        port: String to validate
+        
+    Returns:
+        True if valid port, False otherwise
+    """
+    try:
+        port_int = int(port)
+        return 1 <= port_int <= 65535
+    except ValueError:
+        return False
+
+
+def parse_proxy_link(link: str) -> Optional[Tuple[str, str]]:
+    """
+    Parse a Telegram proxy link to extract server and port with validation.
+    
+    Args:
+        link: The proxy link to parse
+        
+    Returns:
+        Tuple of (server, port) if successful, None otherwise
+    """
+    try:
+        # Validate link format
+        if not link or len(link) > 500:  # Reasonable length limit
+            return None
+        
+        server_match = _SERVER_PATTERN.search(link)
+        port_match = _PORT_PATTERN.search(link)
+        
+        if not server_match or not port_match:
+            return None
+        
+        server = server_match.group(1).strip()
+        port = port_match.group(1).strip()
+        
+        # Basic validation
+        if not server or not port:
+            return None
+        
+        # Validate port
+        if not validate_port(port):
+            logger.warning(f"Invalid port number: {port}")
+            return None
+        
+        # Validate IP address (server can be IP or hostname)
+        # For hostnames, we'll do basic validation (no spaces, reasonable length)
+        if not server or len(server) > 253:  # Max hostname length
+            return None
+        
+        # Check for potentially malicious characters
+        if any(char in server for char in ['\n', '\r', '\t', ' ', '<', '>']):
+            return None
+        
+        return (server, port)
+    except Exception as e:
+        logger.error(f"Error parsing proxy link {link}: {e}")
+        return None
+
+
+def escape_markdown(text: str) -> str:
+    """
+    Escape special characters for Telegram markdown v2.
+    
+    Args:
+        text: Text to escape
+        
+    Returns:
+        Escaped text safe for Telegram markdown
+    """
+    # One pass over the string instead of one str.replace per special character
+    return text.translate(_MARKDOWN_ESCAPES)
+
+
+def format_proxy_details(
+    country: str,
+    ip: str,
+    port: str,
+    ping: Optional[float] = None
+) -> List[str]:
+    """Format the escaped country/IP/port/ping lines for one proxy."""
+    # Escape country name to prevent markdown injection
+    safe_country = escape_markdown(country)
+    
+    # Truncate IP if too long
+    display_ip = ip
+    if len(ip) > 16:
+        display_ip = ip[:16] + '.etc'
+    
+    # Escape IP and port for safety
+    safe_ip = escape_markdown(display_ip)
+    safe_port = escape_markdown(port)
+    
+    lines = [
+        f"\u2022 Country: {safe_country}\n",
+        f"\u2022 IP: {safe_ip}\n",
+        f"\u2022 Port: {safe_port}\n"
+    ]
+    
+    if ping is not None:
+        # Ping is a number, but escape it for consistency
+        safe_ping = escape_markdown(f"{ping}ms")
+        lines.append(f"\u2022 Ping: {safe_ping}\n")
+    
+    return lines
+
+
+def format_footer(
+    proxy_channel_url: Optional[str] = None,
+    config_channel_url: Optional[str] = None,
+    bot_url: Optional[str] = None,
+    support_url: Optional[str] = None
+) -> str:
+    """Format the optional channel/bot/support links."""
+    link_parts = []
+    if proxy_channel_url:
+        link_parts.append(f"[proxy]({proxy_channel_url})")
+    if config_channel_url:
+        link_parts.append(f"[config]({config_channel_url})")
+    if bot_url:
+        link_parts.append(f"[bot]({bot_url})")
+    if support_url:
+        link_parts.append(f"[support]({support_url})")
+    return "~".join(link_parts)
+
+
+def format_proxy_message(
+    country: str,
+    ip: str,
+    port: str,
+    ping: Optional[float] = None,
+    footer: str = ''
+) -> str:
+    """
+    Format the proxy message for Telegram.
+    
+    Args:
+        country: Country name
+        ip: IP address (may be truncated)
+        port: Port number
+        ping: Optional ping time in milliseconds
+        footer: Pre-formatted footer links (see format_footer)
+        
+    Returns:
+        Formatted message string
+    """
+    message_parts = ["**\u2774Orv\u2774**\n"]
+    message_parts.extend(format_proxy_details(country, ip, port, ping))
+    message_parts.append("\n")
+    message_parts.append(footer)
+    return "".join(message_parts)
+
+
+def format_digest_message(proxies: List[Dict], footer: str = '') -> str:
+    """
+    Format several proxies as one numbered digest message.
+    
+    Args:
+        proxies: Proxy dictionaries with 'country', 'server', 'port' and 'ping' keys
+        footer: Pre-formatted footer links (see format_footer)
+        
+    Returns:
+        Formatted message string
+    """
+    message_parts = ["**\u2774Orv\u2774**\n"]
+    for number, proxy in enumerate(proxies, 1):
+        message_parts.append(f"\n**{number}.**\n")
+        message_parts.extend(
+            format_proxy_details(proxy['country'], proxy['server'], str(proxy['port']), proxy.get('ping'))
+        )
+    message_parts.append("\n")
+    message_parts.append(footer)
+    return "".join(message_parts)
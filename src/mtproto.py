@@ -0,0 +1,377 @@
+"""
+MTProto proxy handshake validation.
+
+A TCP connect only proves that some port is open. This module performs the
+actual MTProxy handshake using the link's secret (plain, "dd" padded or "ee"
+fake-TLS), sends an unencrypted req_pq_multi through the proxy and waits for
+Telegram's resPQ, reporting TCP connect and handshake latency separately.
+"""
+
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import logging
+import os
+import re
+import struct
+import time
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+from urllib.parse import unquote
+
+from telethon.crypto import AESModeCTR
+
+logger = logging.getLogger(__name__)
+
+# Secret kinds
+SECRET_PLAIN = 'plain'
+SECRET_PADDED = 'dd'
+SECRET_FAKE_TLS = 'ee'
+
+# Obfuscated2 transport tags
+_TAG_INTERMEDIATE = b'\xee\xee\xee\xee'
+_TAG_PADDED_INTERMEDIATE = b'\xdd\xdd\xdd\xdd'
+# First bytes an obfuscated header must not start with
+_RESERVED_PREFIXES = (
+    b'HEAD', b'POST', b'GET ', b'OPTI', b'\xee\xee\xee\xee', b'\xdd\xdd\xdd\xdd', b'\x16\x03\x01\x02'
+)
+
+_REQ_PQ_MULTI = 0xbe7e8ef1
+_RES_PQ = 0x05162463
+
+# Fake-TLS framing
+_TLS_DIGEST_POS = 11
+_TLS_DIGEST_LEN = 32
+_TLS_CHANGE_CIPHER = b'\x14\x03\x03\x00\x01\x01'
+_TLS_APP_DATA = b'\x17\x03\x03'
+_TLS_MAX_RECORD = 16384
+_TLS_CLIENT_HELLO_LEN = 517
+_TLS_CIPHERS = bytes.fromhex('130113021303c02bc02fc02cc030cca9cca8c013c014009c009d002f0035')
+
+
+@dataclass
+class ProxySecret:
+    """Decoded MTProxy secret."""
+    kind: str
+    key: bytes
+    domain: Optional[str] = None
+
+
+@dataclass
+class HandshakeResult:
+    """Outcome of a handshake validation."""
+    ok: bool
+    connect_ms: Optional[float] = None
+    handshake_ms: Optional[float] = None
+    error: Optional[str] = None
+
+
+def extract_secret(link: str) -> Optional[str]:
+    """
+    Extract the secret parameter from a Telegram proxy link.
+
+    Args:
+        link: The proxy link
+
+    Returns:
+        URL-decoded secret or None if the link has no secret
+    """
+    match = re.search(r'secret=([^&]+)', link)
+    if not match:
+        return None
+    return unquote(match.group(1)).strip() or None
+
+
+def parse_secret(secret: str) -> Optional[ProxySecret]:
+    """
+    Decode a hex or base64(url) MTProxy secret.
+
+    Args:
+        secret: Secret as found in the proxy link
+
+    Returns:
+        ProxySecret or None if the secret is malformed
+    """
+    if not secret or len(secret) > 512:
+        return None
+
+    try:
+        raw = bytes.fromhex(secret)
+    except ValueError:
+        try:
+            padded = secret + '=' * (-len(secret) % 4)
+            raw = base64.urlsafe_b64decode(padded.replace('+', '-').replace('/', '_'))
+        except (binascii.Error, ValueError):
+            return None
+
+    if len(raw) == 16:
+        return ProxySecret(SECRET_PLAIN, raw)
+    if len(raw) == 17 and raw[0] == 0xdd:
+        return ProxySecret(SECRET_PADDED, raw[1:])
+    if len(raw) > 17 and raw[0] == 0xee:
+        try:
+            domain = raw[17:].decode('ascii')
+        except UnicodeDecodeError:
+            return None
+        return ProxySecret(SECRET_FAKE_TLS, raw[1:17], domain)
+    return None
+
+
+def build_obfuscated_header(key: bytes, tag: bytes, dc_id: int) -> Tuple[bytes, AESModeCTR, AESModeCTR]:
+    """
+    Build the 64-byte obfuscated2 init header for an MTProxy connection.
+
+    Args:
+        key: 16-byte proxy secret
+        tag: 4-byte transport tag
+        dc_id: Telegram data center the proxy should forward to
+
+    Returns:
+        Tuple of (header, encryptor, decryptor); the encryptor has already
+        consumed the header's 64 bytes of keystream
+    """
+    while True:
+        random = bytearray(os.urandom(64))
+        if random[0] != 0xef and bytes(random[:4]) not in _RESERVED_PREFIXES and random[4:8] != b'\0\0\0\0':
+            break
+
+    random[56:60] = tag
+    random[60:62] = struct.pack('<h', dc_id)
+    reversed_random = bytes(random[55:7:-1])
+
+    encryptor = AESModeCTR(hashlib.sha256(bytes(random[8:40]) + key).digest(), bytes(random[40:56]))
+    decryptor = AESModeCTR(hashlib.sha256(reversed_random[:32] + key).digest(), reversed_random[32:48])
+
+    encrypted = encryptor.encrypt(bytes(random))
+    return bytes(random[:56]) + encrypted[56:64], encryptor, decryptor
+
+
+def _tls_extension(ext_type: int, data: bytes) -> bytes:
+    return struct.pack('>HH', ext_type, len(data)) + data
+
+
+def build_client_hello(key: bytes, domain: str) -> Tuple[bytes, bytes]:
+    """
+    Build a fake-TLS ClientHello whose random field carries the secret's HMAC.
+
+    Args:
+        key: 16-byte proxy secret
+        domain: SNI domain from the secret
+
+    Returns:
+        Tuple of (ClientHello record, client digest)
+    """
+    sni = domain.encode('ascii')
+    extensions = b''.join([
+        _tls_extension(0x0000, struct.pack('>HBH', len(sni) + 3, 0, len(sni)) + sni),
+        _tls_extension(0x0017, b''),
+        _tls_extension(0xff01, b'\x00'),
+        _tls_extension(0x000a, b'\x00\x04\x00\x1d\x00\x17'),
+        _tls_extension(0x000b, b'\x01\x00'),
+        _tls_extension(0x0010, b'\x00\x0c\x02h2\x08http/1.1'),
+        _tls_extension(0x000d, b'\x00\x08\x04\x03\x08\x04\x04\x01\x05\x03'),
+        _tls_extension(0x0033, b'\x00\x24\x00\x1d\x00\x20' + os.urandom(32)),
+        _tls_extension(0x002d, b'\x01\x01'),
+        _tls_extension(0x002b, b'\x04\x03\x04\x03\x03'),
+    ])
+    body = (
+        b'\x03\x03' + b'\x00' * 32 + b'\x20' + os.urandom(32) +
+        struct.pack('>H', len(_TLS_CIPHERS)) + _TLS_CIPHERS + b'\x01\x00'
+    )
+
+    # Pad like a browser so the hello has the usual fixed size
+    unpadded_len = 5 + 4 + len(body) + 2 + len(extensions)
+    if unpadded_len + 4 <= _TLS_CLIENT_HELLO_LEN:
+        extensions += _tls_extension(0x0015, b'\x00' * (_TLS_CLIENT_HELLO_LEN - unpadded_len - 4))
+
+    handshake_body = body + struct.pack('>H', len(extensions)) + extensions
+    handshake = b'\x01' + len(handshake_body).to_bytes(3, 'big') + handshake_body
+    record = b'\x16\x03\x01' + struct.pack('>H', len(handshake)) + handshake
+
+    mac = hmac.new(key, record, hashlib.sha256).digest()
+    timestamp = struct.pack('<I', int(time.time()) & 0xffffffff)
+    digest = mac[:28] + bytes(a ^ b for a, b in zip(mac[28:], timestamp))
+    record = record[:_TLS_DIGEST_POS] + digest + record[_TLS_DIGEST_POS + _TLS_DIGEST_LEN:]
+    return record, digest
+
+
+def verify_server_hello(key: bytes, client_digest: bytes, response: bytes) -> bool:
+    """
+    Check that the server's fake-TLS response was produced with the same secret.
+
+    Args:
+        key: 16-byte proxy secret
+        client_digest: Digest sent in the ClientHello random field
+        response: Raw ServerHello, ChangeCipherSpec and first application record
+
+    Returns:
+        True if the server random matches the expected HMAC
+    """
+    if len(response) < _TLS_DIGEST_POS + _TLS_DIGEST_LEN:
+        return False
+    server_digest = response[_TLS_DIGEST_POS:_TLS_DIGEST_POS + _TLS_DIGEST_LEN]
+    zeroed = (
+        response[:_TLS_DIGEST_POS] + b'\x00' * _TLS_DIGEST_LEN +
+        response[_TLS_DIGEST_POS + _TLS_DIGEST_LEN:]
+    )
+    expected = hmac.new(key, client_digest + zeroed, hashlib.sha256).digest()
+    return hmac.compare_digest(server_digest, expected)
+
+
+class _TlsStream:
+    """Wraps reader/writer so payloads travel inside TLS application records."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._reader = reader
+        self._writer = writer
+        self._buffer = b''
+
+    def write(self, data: bytes) -> None:
+        for offset in range(0, len(data), _TLS_MAX_RECORD):
+            chunk = data[offset:offset + _TLS_MAX_RECORD]
+            self._writer.write(_TLS_APP_DATA + struct.pack('>H', len(chunk)) + chunk)
+
+    async def drain(self) -> None:
+        await self._writer.drain()
+
+    async def readexactly(self, n: int) -> bytes:
+        while len(self._buffer) < n:
+            header = await self._reader.readexactly(5)
+            payload = await self._reader.readexactly(struct.unpack('>H', header[3:5])[0])
+            if header[:1] == b'\x14':
+                continue
+            if header[:3] != _TLS_APP_DATA:
+                raise ConnectionError(f"Unexpected TLS record type {header[0]:#x}")
+            self._buffer += payload
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        return data
+
+
+async def _read_tls_record(reader: asyncio.StreamReader) -> bytes:
+    header = await reader.readexactly(5)
+    return header + await reader.readexactly(struct.unpack('>H', header[3:5])[0])
+
+
+async def _fake_tls_handshake(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    secret: ProxySecret
+) -> _TlsStream:
+    """Perform the fake-TLS handshake and return a record-wrapping stream."""
+    hello, client_digest = build_client_hello(secret.key, secret.domain or '')
+    writer.write(hello)
+    await writer.drain()
+
+    server_hello = await _read_tls_record(reader)
+    change_cipher = await _read_tls_record(reader)
+    first_data = await _read_tls_record(reader)
+    if server_hello[:3] != b'\x16\x03\x03' or change_cipher[:1] != b'\x14' or first_data[:3] != _TLS_APP_DATA:
+        raise ConnectionError("Unexpected fake-TLS server response")
+    if not verify_server_hello(secret.key, client_digest, server_hello + change_cipher + first_data):
+        raise ConnectionError("Fake-TLS server digest mismatch")
+
+    writer.write(_TLS_CHANGE_CIPHER)
+    return _TlsStream(reader, writer)
+
+
+def _req_pq_multi(nonce: bytes) -> bytes:
+    """Build an unencrypted req_pq_multi MTProto message."""
+    body = struct.pack('<I', _REQ_PQ_MULTI) + nonce
+    message_id = int(time.time() * (1 << 32)) & ~3
+    return struct.pack('<qqi', 0, message_id, len(body)) + body
+
+
+async def _mtproto_exchange(reader, writer, secret: ProxySecret, dc_id: int) -> None:
+    """Send the obfuscated header plus req_pq_multi and validate the resPQ answer."""
+    padded = secret.kind != SECRET_PLAIN
+    tag = _TAG_PADDED_INTERMEDIATE if padded else _TAG_INTERMEDIATE
+    header, encryptor, decryptor = build_obfuscated_header(secret.key, tag, dc_id)
+
+    nonce = os.urandom(16)
+    message = _req_pq_multi(nonce)
+    if padded:
+        message += os.urandom(int.from_bytes(os.urandom(1), 'big') % 16)
+    frame = struct.pack('<i', len(message)) + message
+
+    writer.write(header + encryptor.encrypt(frame))
+    await writer.drain()
+
+    length = struct.unpack('<i', decryptor.decrypt(await reader.readexactly(4)))[0]
+    if not 40 <= length <= 4096:
+        raise ConnectionError(f"Unexpected MTProto frame length {length}")
+    payload = decryptor.decrypt(await reader.readexactly(length))
+    constructor = struct.unpack('<I', payload[20:24])[0]
+    if constructor != _RES_PQ or payload[24:40] != nonce:
+        raise ConnectionError("Proxy did not answer with a matching resPQ")
+
+
+async def validate_proxy(
+    host: str,
+    port,
+    secret: str,
+    timeout: float = 5.0,
+    dc_id: int = 2,
+    addresses: Optional[Sequence[str]] = None
+) -> HandshakeResult:
+    """
+    Validate an MTProto proxy by completing a real handshake through it.
+
+    Args:
+        host: Proxy hostname or IP address
+        port: Proxy port
+        secret: Secret from the proxy link (hex or base64)
+        timeout: Overall timeout in seconds
+        dc_id: Telegram data center to request through the proxy
+        addresses: Already resolved IPs to connect to instead of resolving host,
+            tried in order until one accepts the connection
+
+    Returns:
+        HandshakeResult with TCP connect and handshake latency in milliseconds
+    """
+    parsed = parse_secret(secret)
+    if parsed is None:
+        return HandshakeResult(False, error='invalid secret')
+
+    result = HandshakeResult(False)
+    writer = None
+    try:
+        start_time = time.perf_counter()
+        targets = list(addresses or [host])
+        for index, target in enumerate(targets):
+            # Split what is left of the timeout between the addresses still to try
+            remaining = timeout - (time.perf_counter() - start_time)
+            attempt_start = time.perf_counter()
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(target, int(port)), remaining / (len(targets) - index)
+                )
+                break
+            except OSError:
+                if index == len(targets) - 1:
+                    raise
+                logger.debug(f"Could not connect to {target}:{port}, trying the next address")
+        result.connect_ms = round((time.perf_counter() - attempt_start) * 1000, 2)
+
+        async def handshake() -> None:
+            stream_reader, stream_writer = reader, writer
+            if parsed.kind == SECRET_FAKE_TLS:
+                stream_reader = stream_writer = await _fake_tls_handshake(reader, writer, parsed)
+            await _mtproto_exchange(stream_reader, stream_writer, parsed, dc_id)
+
+        handshake_start = time.perf_counter()
+        await asyncio.wait_for(handshake(), max(0.0, timeout - (handshake_start - start_time)))
+        result.handshake_ms = round((time.perf_counter() - handshake_start) * 1000, 2)
+        result.ok = True
+    except asyncio.TimeoutError:
+        result.error = 'timeout'
+    except (asyncio.IncompleteReadError, ConnectionError, OSError, ValueError) as e:
+        result.error = str(e) or e.__class__.__name__
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if not result.ok:
+        logger.debug(f"MTProto handshake failed for {host}:{port} - {result.error}")
+    return result
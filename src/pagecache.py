@@ -0,0 +1,146 @@
+"""
+Cache of rendered, pre-compressed HTML pages.
+
+Pages are rendered once per content tag (a digest of what the page shows) and
+stored together with gzip and (if the optional `brotli` package is installed)
+brotli encodings, so a burst of visitors costs a dictionary lookup instead of a
+template render and compression per request. A page is only rendered again
+when its own content changes, not on every store write; the web app shows
+coarsened measurements so that most re-validation probes leave a page's
+content, and therefore its tag, as it was. Compression runs on
+the event loop, so brotli uses a moderate quality rather than its slow maximum.
+"""
+
+import gzip
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Set, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+def parse_accept_encoding(header: str) -> Set[str]:
+    """
+    Return the content codings a client accepts.
+
+    Args:
+        header: Accept-Encoding header value
+
+    Returns:
+        Lower-case coding names with a non-zero quality value
+    """
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding)
+    return accepted
+
+
+class RenderedPage:
+    """
+    One rendered page with its compressed variants.
+
+    Args:
+        html: Rendered page
+        etag: Unquoted entity tag of the uncompressed page
+        compress_level: gzip level
+        brotli_quality: brotli quality (0-11)
+    """
+
+    __slots__ = ('body', 'gzip', 'brotli', 'etag', 'rendered_at')
+
+    def __init__(self, html: str, etag: str, compress_level: int = 6, brotli_quality: int = 5) -> None:
+        self.body = html.encode('utf-8')
+        self.etag = etag
+        self.rendered_at = time.time()
+        self.gzip = gzip.compress(self.body, compresslevel=compress_level, mtime=0)
+        self.brotli = brotli.compress(self.body, quality=brotli_quality) if brotli is not None else None
+
+    def negotiate(self, accept_encoding: str) -> Tuple[bytes, Optional[str], str]:
+        """
+        Pick the best variant for a client.
+
+        Args:
+            accept_encoding: Accept-Encoding header value
+
+        Returns:
+            Tuple of (body, Content-Encoding or None, unquoted ETag of the variant)
+        """
+        accepted = parse_accept_encoding(accept_encoding)
+        if self.brotli is not None and 'br' in accepted:
+            return self.brotli, 'br', f"{self.etag}-br"
+        if 'gzip' in accepted or '*' in accepted:
+            return self.gzip, 'gzip', f"{self.etag}-gz"
+        return self.body, None, self.etag
+
+
+class PageCache:
+    """
+    Rendered pages keyed on page key, each valid for one content tag.
+
+    Args:
+        max_entries: Maximum cached pages
+        compress_level: gzip compression level
+        brotli_quality: brotli quality (0-11)
+    """
+
+    def __init__(self, max_entries: int = 64, compress_level: int = 6, brotli_quality: int = 5) -> None:
+        self.max_entries = max_entries
+        self.compress_level = compress_level
+        self.brotli_quality = brotli_quality
+        self._pages: "OrderedDict[str, RenderedPage]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.renders = 0
+
+    def get(self, key: str, tag: str, render: Callable[[], str]) -> RenderedPage:
+        """
+        Return the cached page, rendering it if its content tag changed.
+
+        Concurrent misses for the same page render it only once.
+
+        Args:
+            key: Page identifier (e.g. page number)
+            tag: Digest of everything the page shows; also its ETag
+            render: Function producing the page HTML
+
+        Returns:
+            Rendered page with compressed variants
+        """
+        page = self._pages.get(key)
+        if page is not None and page.etag == tag:
+            self.hits += 1
+            return page
+
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None and page.etag == tag:
+                self.hits += 1
+                return page
+            page = RenderedPage(render(), tag, self.compress_level, self.brotli_quality)
+            self._pages.pop(key, None)
+            self._pages[key] = page
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+            self.renders += 1
+            logger.debug(f"Rendered page {key} for content {tag} ({len(page.body)} bytes)")
+            return page
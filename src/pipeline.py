@@ -0,0 +1,205 @@
+"""
+Staged asyncio pipeline with bounded queues between stages.
+
+Each stage owns a bounded asyncio.Queue and a pool of worker tasks. A stage
+handler receives an item and returns the item to pass downstream, or None to
+drop it. Full queues either block the producer (backpressure) or drop items
+according to the stage's overflow policy.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Overflow policies for a full stage queue
+OVERFLOW_BLOCK = 'block'              # wait for space (backpressure to the producer)
+OVERFLOW_DROP_NEW = 'drop_new'        # reject the incoming item
+OVERFLOW_DROP_OLDEST = 'drop_oldest'  # evict the oldest queued item
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_NEW, OVERFLOW_DROP_OLDEST)
+
+StageHandler = Callable[[Any], Awaitable[Optional[Any]]]
+
+
+class Stage:
+    """
+    A single pipeline stage: bounded input queue plus N workers.
+
+    Args:
+        name: Stage name used in logs and stats
+        handler: Coroutine function processing one item
+        workers: Number of concurrent worker tasks
+        queue_size: Maximum number of queued items
+        overflow: One of OVERFLOW_POLICIES
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: StageHandler,
+        workers: int = 1,
+        queue_size: int = 100,
+        overflow: str = OVERFLOW_BLOCK
+    ) -> None:
+        if workers < 1:
+            raise ValueError(f"Stage {name} needs at least one worker")
+        if queue_size < 1:
+            raise ValueError(f"Stage {name} needs a queue size of at least 1")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow}' for stage {name}")
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.queue: Optional[asyncio.Queue] = None
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters and current queue depth for this stage."""
+        return {
+            'queued': self.queue.qsize() if self.queue else 0,
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'failed': self.failed
+        }
+
+
+class Pipeline:
+    """
+    Chain of stages connected by bounded queues.
+
+    Args:
+        stages: Stages in processing order
+        on_finish: Optional callback invoked once for every item that leaves
+            the pipeline, whether it completed, was filtered, failed or was
+            dropped on overflow
+    """
+
+    def __init__(self, stages: List[Stage], on_finish: Optional[Callable[[Any], None]] = None) -> None:
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = stages
+        self.on_finish = on_finish
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Create the stage queues and start all worker tasks."""
+        if self.running:
+            return
+        for stage in self.stages:
+            stage.queue = asyncio.Queue(maxsize=stage.queue_size)
+        for index, stage in enumerate(self.stages):
+            for worker_num in range(stage.workers):
+                task = asyncio.create_task(self._worker(index), name=f"{stage.name}-{worker_num}")
+                self._tasks.append(task)
+        logger.info(
+            "Pipeline started: " + ", ".join(f"{s.name}x{s.workers}" for s in self.stages)
+        )
+
+    async def stop(self, drain: bool = True) -> None:
+        """
+        Stop all workers.
+
+        Args:
+            drain: Wait for queued items to be processed before cancelling
+        """
+        if not self.running:
+            return
+        if drain:
+            await self.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Pipeline stopped")
+
+    async def join(self) -> None:
+        """Wait until every item queued so far has left the pipeline."""
+        for stage in self.stages:
+            await stage.queue.join()
+
+    async def submit(self, item: Any, wait: bool = False) -> bool:
+        """
+        Feed an item into the first stage.
+
+        Args:
+            item: Item to process
+            wait: Wait for queue space even if the stage's policy drops items
+
+        Returns:
+            True if the item was queued, False if it was dropped
+        """
+        return await self._put(self.stages[0], item, wait)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return per-stage stats keyed by stage name."""
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def _finish(self, item: Any) -> None:
+        if self.on_finish is None:
+            return
+        try:
+            self.on_finish(item)
+        except Exception as e:
+            logger.error(f"Error in pipeline finish callback: {e}", exc_info=True)
+
+    async def _put(self, stage: Stage, item: Any, wait: bool = False) -> bool:
+        queue = stage.queue
+        if queue is None:
+            raise RuntimeError("Pipeline has not been started")
+
+        if wait or stage.overflow == OVERFLOW_BLOCK:
+            await queue.put(item)
+            return True
+
+        if stage.overflow == OVERFLOW_DROP_OLDEST:
+            while queue.full():
+                try:
+                    evicted = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                queue.task_done()
+                stage.dropped += 1
+                logger.warning(f"Stage {stage.name} queue full, dropped oldest item")
+                self._finish(evicted)
+
+        try:
+            queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            stage.dropped += 1
+            logger.warning(f"Stage {stage.name} queue full, dropped new item")
+            self._finish(item)
+            return False
+
+    async def _worker(self, index: int) -> None:
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            item = await stage.queue.get()
+            try:
+                try:
+                    result = await stage.handler(item)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    stage.failed += 1
+                    logger.error(f"Error in pipeline stage {stage.name}: {e}", exc_info=True)
+                    self._finish(item)
+                    continue
+
+                stage.processed += 1
+                if result is None or next_stage is None:
+                    self._finish(item if result is None else result)
+                else:
+                    await self._put(next_stage, result)
+            finally:
+                stage.queue.task_done()
@@ -0,0 +1,220 @@
+"""
+Asyncio-native TCP prober for proxy endpoints.
+
+Probes use non-blocking connects on the event loop instead of executor threads,
+so thousands can run at once under a single concurrency limit. Hosts resolving
+to both IPv6 and IPv4 are raced with staggered attempts (happy eyeballs,
+RFC 8305) and latency is measured with a monotonic clock.
+"""
+
+import asyncio
+import logging
+import socket
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterable, List, Optional, Sequence, Tuple
+
+from metrics import Counter, Histogram
+from resolver import DnsCache, to_sockaddrs
+
+logger = logging.getLogger(__name__)
+
+# (family, sockaddr) pair as returned in getaddrinfo results
+Address = Tuple[int, tuple]
+
+PROBE_SECONDS = Histogram('orv_probe_connect_seconds', 'TCP connect latency of successful probes')
+PROBES = Counter('orv_probes_total', 'TCP probes by result', ('result',))
+
+
+def interleave_families(addresses: Sequence[Address]) -> List[Address]:
+    """
+    Reorder addresses so families alternate, keeping the resolver's preference first.
+
+    Args:
+        addresses: (family, sockaddr) pairs in resolver order
+
+    Returns:
+        Addresses with families interleaved
+    """
+    if not addresses:
+        return []
+    first_family = addresses[0][0]
+    preferred = [addr for addr in addresses if addr[0] == first_family]
+    others = [addr for addr in addresses if addr[0] != first_family]
+    result = []
+    for i in range(max(len(preferred), len(others))):
+        if i < len(preferred):
+            result.append(preferred[i])
+        if i < len(others):
+            result.append(others[i])
+    return result
+
+
+class TcpProber:
+    """
+    Concurrent TCP connect prober.
+
+    Args:
+        concurrency: Maximum number of probes in flight
+        timeout: Default per-probe timeout in seconds
+        happy_eyeballs_delay: Delay before starting the next address attempt
+        resolver: Optional shared DNS cache used instead of a fresh getaddrinfo
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 1000,
+        timeout: float = 3.0,
+        happy_eyeballs_delay: float = 0.25,
+        resolver: Optional[DnsCache] = None
+    ) -> None:
+        if concurrency < 1:
+            raise ValueError("Probe concurrency must be at least 1")
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.happy_eyeballs_delay = happy_eyeballs_delay
+        self.resolver = resolver
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.in_flight = 0
+
+    async def resolve(self, host: str, port: int) -> List[Address]:
+        """
+        Resolve a host to TCP addresses (IPv4 and IPv6).
+
+        Args:
+            host: Hostname or IP address
+            port: TCP port
+
+        Returns:
+            List of (family, sockaddr) pairs, empty if resolution failed
+        """
+        if self.resolver is not None:
+            return to_sockaddrs(await self.resolver.resolve(host), port)
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except (socket.gaierror, OSError) as e:
+            logger.debug(f"Could not resolve {host}: {e}")
+            return []
+        return [(family, sockaddr) for family, _, _, _, sockaddr in infos]
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Hold one of the prober's concurrency slots.
+
+        Other checks (such as MTProto handshakes) run under it so they share
+        the same limit as TCP probes.
+        """
+        async with self._semaphore:
+            self.in_flight += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+
+    async def _connect_one(self, family: int, sockaddr: tuple) -> float:
+        """Connect to a single address and return the connect time in milliseconds."""
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.setblocking(False)
+            start_time = time.perf_counter()
+            await loop.sock_connect(sock, sockaddr)
+            return (time.perf_counter() - start_time) * 1000
+        finally:
+            sock.close()
+
+    async def _race(self, addresses: List[Address]) -> Optional[float]:
+        """Race staggered connection attempts and return the first success."""
+        pending = set()
+        try:
+            for family, sockaddr in addresses:
+                pending.add(asyncio.create_task(self._connect_one(family, sockaddr)))
+                done, pending = await asyncio.wait(
+                    pending, timeout=self.happy_eyeballs_delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if not task.exception():
+                        return task.result()
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.exception():
+                        return task.result()
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def probe(
+        self,
+        host: str,
+        port,
+        timeout: Optional[float] = None,
+        addresses: Optional[Sequence[Address]] = None
+    ) -> Optional[float]:
+        """
+        Measure TCP connect latency to an endpoint.
+
+        Args:
+            host: Hostname or IP address
+            port: TCP port (int or numeric string)
+            timeout: Probe timeout in seconds (defaults to the prober's timeout)
+            addresses: Pre-resolved (family, sockaddr) pairs; resolved here if omitted
+
+        Returns:
+            Connect time in milliseconds if successful, None otherwise
+        """
+        try:
+            port_int = int(port)
+        except (TypeError, ValueError):
+            logger.debug(f"Invalid port for {host}: {port}")
+            return None
+
+        async with self.slot():
+            try:
+                if addresses is None:
+                    addresses = await self.resolve(host, port_int)
+                if not addresses:
+                    PROBES.inc(result='unresolved')
+                    return None
+                ping_ms = await asyncio.wait_for(
+                    self._race(interleave_families(addresses)),
+                    timeout or self.timeout
+                )
+            except asyncio.TimeoutError:
+                PROBES.inc(result='timeout')
+                logger.debug(f"Ping timed out for {host}:{port}")
+                return None
+            except OSError as e:
+                PROBES.inc(result='error')
+                logger.debug(f"Ping failed for {host}:{port} - {e}")
+                return None
+
+        if ping_ms is None:
+            PROBES.inc(result='error')
+            logger.debug(f"Ping failed for {host}:{port}")
+            return None
+        PROBES.inc(result='ok')
+        PROBE_SECONDS.observe(ping_ms / 1000)
+        return round(ping_ms, 2)
+
+    async def probe_many(
+        self,
+        endpoints: Iterable[Tuple[str, int]],
+        timeout: Optional[float] = None
+    ) -> List[Optional[float]]:
+        """
+        Probe many endpoints concurrently (bounded by the concurrency limit).
+
+        Args:
+            endpoints: Iterable of (host, port) pairs
+            timeout: Per-probe timeout in seconds
+
+        Returns:
+            Latencies in milliseconds (or None) in the same order as endpoints
+        """
+        return await asyncio.gather(*(self.probe(host, port, timeout) for host, port in endpoints))
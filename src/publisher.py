@@ -0,0 +1,198 @@
+"""
+FloodWait-aware outbound message publisher.
+
+Messages are appended to a persistent outbox table in the proxy store, so
+queued posts survive restarts. Each destination chat has its own sender task
+and token bucket that paces sends. A FloodWaitError (or slow mode wait) from
+Telegram pauses that chat's bucket for exactly the requested time and
+re-queues the messages without counting it as a failed attempt. Other errors
+are retried with exponential backoff up to a maximum number of attempts.
+
+In digest mode up to N queued proxies are combined into one message, so a
+burst of links costs a fraction of the API calls.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from telethon.errors import FloodWaitError, SlowModeWaitError
+
+from metrics import Counter, Histogram
+from ratelimit import TokenBucket
+from store import ProxyStore
+
+logger = logging.getLogger(__name__)
+
+# Coroutine function (chat, payloads) that sends one message for the payloads
+SendFunc = Callable[[str, List[Dict]], Awaitable[None]]
+
+SEND_SECONDS = Histogram('orv_publish_send_seconds', 'Latency of successful message sends')
+SENDS = Counter('orv_publish_sends_total', 'Message send attempts by outcome', ('result',))
+FLOOD_WAIT_SECONDS = Counter('orv_publish_flood_wait_seconds_total', 'Seconds of flood wait imposed by Telegram')
+
+
+class Publisher:
+    """
+    Persistent, rate-governed publish queue.
+
+    Args:
+        store: Proxy store holding the outbox table
+        send: Coroutine function sending one message for a list of payloads
+        rate: Messages per second allowed per chat
+        burst: Messages that may be sent back to back per chat
+        digest_size: Maximum proxies combined into one message (1 disables digests)
+        digest_window: Seconds to wait for a digest to fill up before sending it
+        max_attempts: Failed sends before a message is dropped
+        retry_delay: Base delay in seconds for exponential retry backoff
+    """
+
+    def __init__(
+        self,
+        store: ProxyStore,
+        send: SendFunc,
+        rate: float = 20 / 60.0,
+        burst: float = 3,
+        digest_size: int = 1,
+        digest_window: float = 5.0,
+        max_attempts: int = 5,
+        retry_delay: float = 5.0
+    ) -> None:
+        self.store = store
+        self.send = send
+        self.rate = rate
+        self.burst = burst
+        self.digest_size = max(1, digest_size)
+        self.digest_window = digest_window
+        self.max_attempts = max(1, max_attempts)
+        self.retry_delay = retry_delay
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self.sent = 0
+        self.messages = 0
+        self.flood_waits = 0
+        self.retries = 0
+        self.dropped = 0
+
+    def _ensure_worker(self, chat: str) -> None:
+        if chat not in self._buckets:
+            self._buckets[chat] = TokenBucket(rate=self.rate, capacity=self.burst)
+            self._wakeups[chat] = asyncio.Event()
+        worker = self._workers.get(chat)
+        if worker is None or worker.done():
+            self._workers[chat] = asyncio.create_task(self._run(chat))
+        self._wakeups[chat].set()
+
+    async def start(self) -> None:
+        """Resume sending messages left in the outbox by a previous run."""
+        chats = self.store.outbound_chats()
+        for chat in chats:
+            self._ensure_worker(chat)
+        if chats:
+            logger.info(f"Resuming {self.store.outbound_depth()} queued outbound messages")
+
+    def enqueue(self, chat: str, payload: Dict) -> None:
+        """
+        Queue a proxy for publishing.
+
+        Args:
+            chat: Destination chat
+            payload: JSON-serialisable proxy data passed to the send function
+        """
+        self.store.enqueue_outbound(chat, payload)
+        self._ensure_worker(chat)
+
+    async def _wait(self, chat: str, timeout: Optional[float] = None) -> None:
+        wakeup = self._wakeups[chat]
+        wakeup.clear()
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self, chat: str) -> None:
+        bucket = self._buckets[chat]
+        while True:
+            try:
+                due = self.store.next_outbound_time(chat)
+                if due is None:
+                    await self._wait(chat)
+                    continue
+                now = time.time()
+                if due > now:
+                    await self._wait(chat, due - now)
+                    continue
+
+                await bucket.acquire()
+                entries = self.store.due_outbound(chat, self.digest_size)
+                if 1 <= len(entries) < self.digest_size:
+                    # Give a burst the chance to fill the digest
+                    await asyncio.sleep(self.digest_window)
+                    entries = self.store.due_outbound(chat, self.digest_size)
+                if entries:
+                    await self._send(chat, bucket, entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in publisher for chat {chat}: {e}", exc_info=True)
+                await asyncio.sleep(self.retry_delay)
+
+    async def _send(self, chat: str, bucket: TokenBucket, entries: List) -> None:
+        entry_ids = [entry_id for entry_id, _, _ in entries]
+        start_time = time.perf_counter()
+        try:
+            await self.send(chat, [payload for _, payload, _ in entries])
+        except (FloodWaitError, SlowModeWaitError) as e:
+            self.flood_waits += 1
+            SENDS.inc(result='flood_wait')
+            FLOOD_WAIT_SECONDS.inc(e.seconds)
+            logger.warning(f"Flood wait of {e.seconds}s for chat {chat}, re-queueing {len(entries)} proxies")
+            bucket.penalize(e.seconds)
+            self.store.defer_outbound(entry_ids, time.time() + e.seconds, count_attempt=False)
+            return
+        except Exception as e:
+            SENDS.inc(result='error')
+            logger.error(f"Error sending message to chat {chat}: {e}", exc_info=True)
+            give_up = [entry_id for entry_id, _, attempts in entries if attempts + 1 >= self.max_attempts]
+            retry = [(entry_id, attempts) for entry_id, _, attempts in entries if attempts + 1 < self.max_attempts]
+            if give_up:
+                self.dropped += len(give_up)
+                logger.error(f"Dropping {len(give_up)} proxies after {self.max_attempts} failed sends")
+                self.store.delete_outbound(give_up)
+            if retry:
+                self.retries += len(retry)
+                attempts = max(attempts for _, attempts in retry)
+                self.store.defer_outbound(
+                    [entry_id for entry_id, _ in retry], time.time() + self.retry_delay * (2 ** attempts)
+                )
+            return
+
+        SENDS.inc(result='ok')
+        SEND_SECONDS.observe(time.perf_counter() - start_time)
+        self.store.delete_outbound(entry_ids)
+        self.messages += 1
+        self.sent += len(entries)
+
+    async def stop(self) -> None:
+        """Stop the sender tasks; unsent messages stay in the outbox."""
+        for worker in self._workers.values():
+            worker.cancel()
+        for worker in self._workers.values():
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._workers.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return publisher counters and the current queue depth."""
+        return {
+            'queued': self.store.outbound_depth(),
+            'sent': self.sent,
+            'messages': self.messages,
+            'flood_waits': self.flood_waits,
+            'retries': self.retries,
+            'dropped': self.dropped
+        }
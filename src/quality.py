@@ -0,0 +1,247 @@
+"""
+Rolling per-proxy quality statistics and the ranking score.
+
+Every probe of a proxy (the check at ingestion and each re-validation) is fed
+to a QualityTracker. It keeps the last `window` outcomes of each proxy in one
+flat ring buffer shared by all proxies (a fixed block of byte slots per proxy
+holding the latency bucket of each probe, -1 for a failure), a latency
+histogram over the window (LATENCY_BUCKETS log-spaced buckets per proxy) and
+parallel arrays for the latency EWMA, the success count and the time the
+proxy was last seen alive. Recording a probe writes one ring slot, moves one
+count between histogram buckets and updates the scalars, and p50/p95 are read
+by walking the fixed number of buckets, so a probe costs O(1) whatever the
+window size or the number of proxies tracked. Percentiles are therefore
+approximate, to within one bucket (about 12%).
+
+The summary (EWMA, percentiles, success ratio, samples, last alive) is
+written to the proxy store with the probe result, and score() turns it into
+the 0-100 ranking used by the web interface and the publish threshold.
+"""
+
+import math
+import time
+from array import array
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+
+# Latency at which the speed factor of the score is 0.5
+LATENCY_REFERENCE_MS = 300.0
+# Seconds after which a proxy not seen alive loses half its score
+FRESHNESS_HALF_LIFE = 6 * 3600.0
+
+# Latency histogram: bucket 0 holds latencies up to 1 ms, bucket i those up to
+# LATENCY_BUCKET_GROWTH ** i ms; the last bucket also takes everything slower
+LATENCY_BUCKETS = 48
+LATENCY_BUCKET_GROWTH = 1.25
+
+_NAN = float('nan')
+_FAILED = -1
+_LOG_GROWTH = math.log(LATENCY_BUCKET_GROWTH)
+
+
+@dataclass
+class QualityStats:
+    """Quality summary of one proxy, in the proxy store's column names."""
+    latency_ewma: Optional[float]
+    latency_p50: Optional[float]
+    latency_p95: Optional[float]
+    success_ratio: float
+    samples: int
+    last_alive: Optional[float]
+
+    def to_record(self) -> Dict:
+        """Return the summary as a dictionary of store columns."""
+        return asdict(self)
+
+
+def _bucket(latency: float) -> int:
+    if latency <= 1.0:
+        return 0
+    return min(LATENCY_BUCKETS - 1, math.ceil(math.log(latency) / _LOG_GROWTH))
+
+
+def _bucket_latency(bucket: int) -> float:
+    # Geometric middle of the bucket's range
+    return LATENCY_BUCKET_GROWTH ** max(0.0, bucket - 0.5)
+
+
+def score(record: Dict, now: Optional[float] = None) -> float:
+    """
+    Rank a proxy from its quality summary (O(1)).
+
+    The score is 100 x reliability x speed x freshness:
+    reliability is the success ratio smoothed towards 1/2 for proxies with few
+    samples, speed is LATENCY_REFERENCE_MS / (LATENCY_REFERENCE_MS + EWMA
+    latency), and freshness halves every FRESHNESS_HALF_LIFE seconds since the
+    proxy was last seen alive. Proxies never measured score 0.
+
+    Args:
+        record: Mapping with latency_ewma, success_ratio, samples and
+            last_alive keys (a store record or QualityStats.to_record())
+        now: Unix time to rank at (defaults to the current time)
+
+    Returns:
+        Score between 0 and 100, higher is better
+    """
+    ewma = record.get('latency_ewma')
+    if ewma is None:
+        return 0.0
+    samples = record.get('samples') or 0
+    successes = (record.get('success_ratio') or 0.0) * samples
+    reliability = (successes + 1) / (samples + 2)
+    speed = LATENCY_REFERENCE_MS / (LATENCY_REFERENCE_MS + max(0.0, ewma))
+    last_alive = record.get('last_alive')
+    if last_alive:
+        age = max(0.0, (time.time() if now is None else now) - last_alive)
+        freshness = 0.5 ** (age / FRESHNESS_HALF_LIFE)
+    else:
+        freshness = 0.5
+    return round(100.0 * reliability * speed * freshness, 2)
+
+
+class QualityTracker:
+    """
+    Rolling probe statistics for many proxies in compact arrays.
+
+    Proxies are mapped to slots; the slots of forgotten proxies are reused.
+    Memory is about window + 2 x LATENCY_BUCKETS + 32 bytes per proxy.
+
+    Args:
+        window: Probe outcomes kept per proxy for the success ratio and percentiles
+        alpha: EWMA smoothing factor (weight of the newest latency)
+    """
+
+    def __init__(self, window: int = 32, alpha: float = 0.3) -> None:
+        if not 1 <= window <= 65535 or not 0 < alpha <= 1:
+            raise ValueError("Quality window must be between 1 and 65535 and alpha in (0, 1]")
+        self.window = window
+        self.alpha = alpha
+        self._slots: Dict[int, int] = {}
+        self._free: List[int] = []
+        # window latency buckets per slot, _FAILED for a failed probe
+        self._samples = array('b')
+        # LATENCY_BUCKETS successful-probe counts per slot, over the window
+        self._histogram = array('H')
+        self._head = array('I')
+        self._count = array('I')
+        self._successes = array('I')
+        # NaN until the first successful probe
+        self._ewma = array('d')
+        # 0.0 until the proxy is first seen alive
+        self._last_alive = array('d')
+        self._empty_block = array('b', [_FAILED]) * window
+        self._empty_histogram = array('H', [0]) * LATENCY_BUCKETS
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, proxy_id: int) -> bool:
+        return proxy_id in self._slots
+
+    def _slot(self, proxy_id: int) -> int:
+        slot = self._slots.get(proxy_id)
+        if slot is not None:
+            return slot
+        if self._free:
+            slot = self._free.pop()
+            base = slot * self.window
+            self._samples[base:base + self.window] = self._empty_block
+            base = slot * LATENCY_BUCKETS
+            self._histogram[base:base + LATENCY_BUCKETS] = self._empty_histogram
+            self._head[slot] = self._count[slot] = self._successes[slot] = 0
+            self._ewma[slot], self._last_alive[slot] = _NAN, 0.0
+        else:
+            slot = len(self._head)
+            self._samples.extend(self._empty_block)
+            self._histogram.extend(self._empty_histogram)
+            self._head.append(0)
+            self._count.append(0)
+            self._successes.append(0)
+            self._ewma.append(_NAN)
+            self._last_alive.append(0.0)
+        self._slots[proxy_id] = slot
+        return slot
+
+    def seed(self, proxy_id: int, latency_ewma: Optional[float], last_alive: Optional[float]) -> None:
+        """
+        Start tracking a proxy from a stored summary (e.g. after a restart).
+
+        The window starts empty; the EWMA and last-alive time carry over.
+        """
+        slot = self._slot(proxy_id)
+        if latency_ewma is not None:
+            self._ewma[slot] = latency_ewma
+        if last_alive:
+            self._last_alive[slot] = last_alive
+
+    def record(self, proxy_id: int, latency: Optional[float], now: Optional[float] = None) -> QualityStats:
+        """
+        Add one probe outcome (O(1)).
+
+        Args:
+            proxy_id: Proxy ID
+            latency: Measured latency in milliseconds, or None if the probe failed
+            now: Unix time of the probe (defaults to the current time)
+
+        Returns:
+            The proxy's updated summary
+        """
+        slot = self._slot(proxy_id)
+        position = slot * self.window + self._head[slot]
+        histogram = slot * LATENCY_BUCKETS
+        if self._count[slot] == self.window:
+            # Overwriting the oldest outcome
+            oldest = self._samples[position]
+            if oldest != _FAILED:
+                self._successes[slot] -= 1
+                self._histogram[histogram + oldest] -= 1
+        else:
+            self._count[slot] += 1
+        if latency is None:
+            self._samples[position] = _FAILED
+        else:
+            bucket = _bucket(latency)
+            self._samples[position] = bucket
+            self._histogram[histogram + bucket] += 1
+            self._successes[slot] += 1
+            ewma = self._ewma[slot]
+            self._ewma[slot] = latency if math.isnan(ewma) else ewma + self.alpha * (latency - ewma)
+            self._last_alive[slot] = time.time() if now is None else now
+        self._head[slot] = (self._head[slot] + 1) % self.window
+        return self.stats(proxy_id)
+
+    def stats(self, proxy_id: int) -> Optional[QualityStats]:
+        """Return a proxy's summary (O(LATENCY_BUCKETS)), or None if it is not tracked."""
+        slot = self._slots.get(proxy_id)
+        if slot is None:
+            return None
+        count = self._count[slot]
+        successes = self._successes[slot]
+        p50 = p95 = None
+        if successes:
+            # Nearest rank: the bucket holding the ceil(fraction x n)-th fastest success
+            rank50, rank95 = math.ceil(0.50 * successes), math.ceil(0.95 * successes)
+            seen = 0
+            base = slot * LATENCY_BUCKETS
+            for bucket in range(LATENCY_BUCKETS):
+                seen += self._histogram[base + bucket]
+                if p50 is None and seen >= rank50:
+                    p50 = round(_bucket_latency(bucket), 2)
+                if seen >= rank95:
+                    p95 = round(_bucket_latency(bucket), 2)
+                    break
+        ewma = self._ewma[slot]
+        return QualityStats(
+            latency_ewma=None if math.isnan(ewma) else round(ewma, 2),
+            latency_p50=p50,
+            latency_p95=p95,
+            success_ratio=round(successes / count, 4) if count else 0.0,
+            samples=count,
+            last_alive=self._last_alive[slot] or None
+        )
+
+    def discard(self, proxy_id: int) -> None:
+        """Stop tracking a proxy and free its slot."""
+        slot = self._slots.pop(proxy_id, None)
+        if slot is not None:
+            self._free.append(slot)
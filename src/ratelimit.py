@@ -0,0 +1,138 @@
+"""
+Async token-bucket rate limiter with fair FIFO waiting.
+
+Without server feedback the bucket refills continuously at the nominal rate.
+When the server reports its remaining quota and window reset time (ip-api's
+X-Rl / X-Ttl headers), the bucket mirrors that window instead: it allows
+exactly the remaining requests and refills to full capacity when the server's
+window resets, so we neither overrun the quota nor leave it unused.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Token bucket shared by coroutines on one event loop.
+
+    Waiters are served strictly in arrival order: the head waiter holds an
+    asyncio.Lock (which is FIFO) while it waits for tokens.
+
+    Args:
+        rate: Nominal refill rate in tokens per second
+        capacity: Maximum number of tokens (burst size / server window quota)
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("Token bucket rate and capacity must be positive")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+        # Set while mirroring a server-reported window: monotonic time of its reset
+        self._window_reset: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._changed = asyncio.Event()
+        self.waits = 0
+        self.throttled = 0
+
+    def _refill(self, now: float) -> None:
+        if self._window_reset is not None:
+            if now < self._window_reset:
+                return
+            # Server window is over: full quota again, back to continuous refill
+            self._window_reset = None
+            self._tokens = self.capacity
+            self._last_refill = now
+            return
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _wait_time(self, tokens: float, now: float) -> float:
+        if self._window_reset is not None:
+            return max(0.0, self._window_reset - now)
+        return max(0.0, (tokens - self._tokens) / self.rate)
+
+    @property
+    def tokens(self) -> float:
+        """Tokens currently available."""
+        self._refill(time.monotonic())
+        return self._tokens
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """
+        Wait until tokens are available and consume them.
+
+        Args:
+            tokens: Number of tokens to take
+        """
+        if tokens > self.capacity:
+            raise ValueError("Cannot acquire more tokens than the bucket capacity")
+        async with self._lock:
+            waited = False
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    if waited:
+                        self.waits += 1
+                    return
+                waited = True
+                self._changed.clear()
+                try:
+                    # Wake early if server feedback changes the picture
+                    await asyncio.wait_for(self._changed.wait(), self._wait_time(tokens, now))
+                except asyncio.TimeoutError:
+                    pass
+
+    def observe(self, remaining: int, reset_after: float) -> None:
+        """
+        Align the bucket with quota information reported by the server.
+
+        Args:
+            remaining: Requests left in the server's current window
+            reset_after: Seconds until the server's window resets
+        """
+        now = time.monotonic()
+        self._refill(now)
+        self._tokens = max(0.0, min(float(remaining), self.capacity))
+        self._window_reset = now + max(0.0, reset_after)
+        self._changed.set()
+
+    def observe_headers(self, headers: Mapping[str, str], remaining_key: str = 'X-Rl', reset_key: str = 'X-Ttl') -> bool:
+        """
+        Update the bucket from rate-limit response headers if present.
+
+        Args:
+            headers: Response headers
+            remaining_key: Header holding the remaining request count
+            reset_key: Header holding seconds until the window resets
+
+        Returns:
+            True if the headers were present and applied
+        """
+        try:
+            remaining = int(headers[remaining_key])
+            reset_after = float(headers[reset_key])
+        except (KeyError, TypeError, ValueError):
+            return False
+        self.observe(remaining, reset_after)
+        return True
+
+    def penalize(self, retry_after: float) -> None:
+        """
+        Block the bucket after the server rejected a request (HTTP 429).
+
+        Args:
+            retry_after: Seconds to wait before the next request
+        """
+        self.throttled += 1
+        logger.warning(f"Rate limited by server, pausing requests for {retry_after:.1f}s")
+        self.observe(0, retry_after)
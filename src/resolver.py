@@ -0,0 +1,156 @@
+"""
+Shared async DNS resolution cache.
+
+Resolved hostnames are cached for a fixed TTL, failures are remembered for a
+shorter negative TTL, and concurrent lookups of the same host share a single
+getaddrinfo call. IP literals are returned without touching the resolver.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import socket
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (family, ip) pair; combined with a port this becomes a connectable address
+ResolvedAddress = Tuple[int, str]
+
+
+def to_sockaddrs(addresses: Sequence[ResolvedAddress], port: int) -> List[Tuple[int, tuple]]:
+    """
+    Turn resolved (family, ip) pairs into (family, sockaddr) pairs for a port.
+
+    Args:
+        addresses: Resolved addresses
+        port: TCP port
+
+    Returns:
+        List of (family, sockaddr) pairs as used by the prober
+    """
+    result = []
+    for family, ip in addresses:
+        if family == socket.AF_INET6:
+            result.append((family, (ip, port, 0, 0)))
+        else:
+            result.append((family, (ip, port)))
+    return result
+
+
+def first_ipv4(addresses: Sequence[ResolvedAddress]) -> Optional[str]:
+    """Return the first IPv4 address, falling back to the first address of any family."""
+    for family, ip in addresses:
+        if family == socket.AF_INET:
+            return ip
+    return addresses[0][1] if addresses else None
+
+
+class DnsCache:
+    """
+    TTL cache in front of loop.getaddrinfo with negative caching and in-flight dedup.
+
+    Args:
+        ttl: Seconds to keep successful resolutions
+        negative_ttl: Seconds to remember failed resolutions
+        max_entries: Maximum cached hostnames before LRU eviction
+    """
+
+    def __init__(self, ttl: float = 300.0, negative_ttl: float = 60.0, max_entries: int = 10000) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        # host -> (addresses, expires_at); empty addresses means a cached failure
+        self._entries: "OrderedDict[str, Tuple[List[ResolvedAddress], float]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    async def resolve(self, host: str) -> List[ResolvedAddress]:
+        """
+        Resolve a hostname to its IPv4 and IPv6 addresses.
+
+        Args:
+            host: Hostname or IP literal
+
+        Returns:
+            List of (family, ip) pairs in resolver order, empty if resolution failed
+        """
+        try:
+            address = ipaddress.ip_address(host)
+            return [(socket.AF_INET if address.version == 4 else socket.AF_INET6, str(address))]
+        except ValueError:
+            pass
+
+        key = host.lower()
+        entry = self._entries.get(key)
+        if entry is not None:
+            addresses, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                if addresses:
+                    self.hits += 1
+                else:
+                    self.negative_hits += 1
+                return addresses
+            del self._entries[key]
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            # Wait without inheriting the outcome's cancellation: only our own
+            # cancellation raises here
+            await asyncio.wait((future,))
+            if future.cancelled():
+                # The task doing the lookup was cancelled; look it up ourselves
+                return await self.resolve(host)
+            return future.result()
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            addresses = await self._lookup(host)
+            ttl = self.ttl if addresses else self.negative_ttl
+            self._entries[key] = (addresses, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            future.set_result(addresses)
+            return addresses
+        except asyncio.CancelledError:
+            # Do not hand our cancellation to the waiters; they retry the lookup
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _lookup(self, host: str) -> List[ResolvedAddress]:
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        except (socket.gaierror, OSError, UnicodeError) as e:
+            logger.debug(f"Could not resolve hostname {host}: {e}")
+            return []
+        addresses: List[ResolvedAddress] = []
+        for family, _, _, _, sockaddr in infos:
+            address = (family, sockaddr[0])
+            if address not in addresses:
+                addresses.append(address)
+        return addresses
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and current size."""
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses
+        }
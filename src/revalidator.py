@@ -0,0 +1,200 @@
+"""
+Background re-validation of stored proxies.
+
+Every stored proxy is re-probed on its own schedule, kept in a min-heap keyed
+by the next due time. Intervals adapt to each proxy's history: a proxy that
+keeps answering is checked less and less often (up to a maximum interval),
+while a failure or a change of state brings it back to the minimum interval.
+Probes run under a global token-bucket budget and a small concurrency limit
+of their own, so re-validation never competes with the ingestion pipeline for
+more than a fixed share of probes. A proxy is marked dead after a number of
+consecutive failures and is revived by the next successful probe. Every
+outcome also feeds the proxy's rolling quality statistics, which are written
+with the probe result.
+"""
+
+import asyncio
+import heapq
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from quality import QualityTracker
+from ratelimit import TokenBucket
+from store import ProxyStore
+
+logger = logging.getLogger(__name__)
+
+ProbeFunc = Callable[[str, int, str], Awaitable[Optional[float]]]
+
+
+class _ProxyState:
+    """Scheduling state for one proxy."""
+
+    __slots__ = ('interval', 'alive')
+
+    def __init__(self, interval: float, alive: Optional[bool] = None) -> None:
+        self.interval = interval
+        self.alive = alive
+
+
+class Revalidator:
+    """
+    Adaptive re-probing scheduler.
+
+    Args:
+        store: Proxy store to read targets from and write results to
+        probe: Coroutine function (host, port, link) -> latency in ms or None
+        min_interval: Shortest interval between checks of one proxy, in seconds
+        max_interval: Longest interval for a proxy that stays up, in seconds
+        rate: Global probe budget in probes per second
+        concurrency: Maximum re-validation probes in flight
+        dead_after: Consecutive failures before a proxy is marked dead
+        poll_interval: Seconds between scans for newly stored proxies
+        quality: Tracker fed with every probe outcome (optional)
+    """
+
+    def __init__(
+        self,
+        store: ProxyStore,
+        probe: ProbeFunc,
+        min_interval: float = 300.0,
+        max_interval: float = 21600.0,
+        rate: float = 5.0,
+        concurrency: int = 20,
+        dead_after: int = 3,
+        poll_interval: float = 30.0,
+        quality: Optional[QualityTracker] = None
+    ) -> None:
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("Re-validation intervals must satisfy 0 < min_interval <= max_interval")
+        self.store = store
+        self.probe = probe
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.dead_after = max(1, dead_after)
+        self.poll_interval = poll_interval
+        self.quality = quality
+        self.budget = TokenBucket(rate=rate, capacity=max(1.0, rate))
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._heap: List[Tuple[float, int]] = []
+        self._states: Dict[int, _ProxyState] = {}
+        self._last_known_id = 0
+        self._tasks: set = set()
+        self.in_flight = 0
+        self.checks = 0
+        self.failures = 0
+        self.marked_dead = 0
+
+    def _jitter(self, interval: float) -> float:
+        # +-10% so proxies added together don't stay in lockstep
+        return interval * random.uniform(0.9, 1.1)
+
+    def _schedule(self, proxy_id: int, delay: float) -> None:
+        heapq.heappush(self._heap, (time.time() + delay, proxy_id))
+
+    def _sync_new(self, initial: bool = False) -> None:
+        """Schedule proxies stored since the last scan."""
+        new_ids = self.store.ids_after(self._last_known_id)
+        for proxy_id in new_ids:
+            if proxy_id in self._states:
+                continue
+            self._states[proxy_id] = _ProxyState(self.min_interval)
+            # Spread the existing backlog over the first interval after startup
+            delay = random.uniform(0, self.min_interval) if initial else self._jitter(self.min_interval)
+            self._schedule(proxy_id, delay)
+        if new_ids:
+            self._last_known_id = new_ids[-1]
+
+    def _next_interval(self, state: _ProxyState, alive: bool) -> float:
+        """Back off while a proxy stays up; go back to the minimum on failure or flap."""
+        if alive and state.alive:
+            return min(state.interval * 2, self.max_interval)
+        return self.min_interval
+
+    def _forget(self, proxy_id: int) -> None:
+        self._states.pop(proxy_id, None)
+        if self.quality is not None:
+            self.quality.discard(proxy_id)
+
+    async def _check(self, proxy_id: int) -> None:
+        try:
+            row = self.store.get_proxy(proxy_id)
+            if row is None:
+                self._forget(proxy_id)
+                return
+            ping = await self.probe(row['server'], row['port'], row['link'])
+            self.checks += 1
+            if ping is None:
+                self.failures += 1
+            was_alive = bool(row['alive'])
+            summary = None
+            if self.quality is not None:
+                if proxy_id not in self.quality:
+                    # Not probed since startup: carry over the stored summary
+                    self.quality.seed(proxy_id, row['latency_ewma'], row['last_alive'])
+                summary = self.quality.record(proxy_id, ping).to_record()
+            alive = self.store.record_probe(proxy_id, ping, self.dead_after, quality=summary)
+            if alive is None:
+                # Expired or cleared while the probe was running
+                self._forget(proxy_id)
+                return
+            if was_alive and not alive:
+                self.marked_dead += 1
+                logger.info(f"Proxy {proxy_id} marked dead after {self.dead_after} failed checks")
+            elif alive and not was_alive:
+                logger.info(f"Proxy {proxy_id} is reachable again")
+
+            state = self._states.get(proxy_id)
+            if state is None:
+                return
+            state.interval = self._next_interval(state, ping is not None)
+            state.alive = ping is not None
+            self._schedule(proxy_id, self._jitter(state.interval))
+        except Exception as e:
+            logger.error(f"Error re-validating proxy {proxy_id}: {e}", exc_info=True)
+            if proxy_id in self._states:
+                self._schedule(proxy_id, self._jitter(self.min_interval))
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def run(self) -> None:
+        """Run the scheduler until cancelled."""
+        self._sync_new(initial=True)
+        logger.info(f"Re-validation scheduler started with {len(self._states)} proxies")
+        next_sync = time.time() + self.poll_interval
+        try:
+            while True:
+                now = time.time()
+                if now >= next_sync:
+                    self._sync_new()
+                    next_sync = now + self.poll_interval
+                if not self._heap or self._heap[0][0] > now:
+                    next_due = self._heap[0][0] if self._heap else next_sync
+                    await asyncio.sleep(max(0.0, min(next_due, next_sync) - now))
+                    continue
+
+                _, proxy_id = heapq.heappop(self._heap)
+                if proxy_id not in self._states:
+                    continue
+                await self.budget.acquire()
+                await self._semaphore.acquire()
+                self.in_flight += 1
+                task = asyncio.create_task(self._check(proxy_id))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        """Return scheduler counters."""
+        return {
+            'tracked': len(self._states),
+            'in_flight': self.in_flight,
+            'checks': self.checks,
+            'failures': self.failures,
+            'marked_dead': self.marked_dead
+        }
@@ -0,0 +1,155 @@
+"""
+In-memory snapshot of the proxy store for the web API.
+
+Requests are answered from an immutable snapshot holding the proxies pre-sorted
+by quality score, by latency and by recency. The snapshot is rebuilt only when the store's data
+version (in-process write counter plus database/WAL mtimes) changes, and at
+most once per reload interval, so bursts of polling clients cost no database
+reads. Each snapshot carries an ETag and Last-Modified time for conditional
+requests.
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from quality import score
+from store import ProxyStore
+
+logger = logging.getLogger(__name__)
+
+SORT_QUALITY = 'quality'
+SORT_PING = 'ping'
+SORT_RECENT = 'recent'
+# Sort keys whose natural order is highest first
+_DESCENDING_SORTS = (SORT_QUALITY, SORT_RECENT)
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 500
+
+
+class ProxySnapshot:
+    """
+    Immutable view of the stored proxies at one data version.
+
+    Args:
+        proxies: Proxy records as returned by ProxyStore.load_records()
+        version: Store data version the records were read at
+        loaded_at: Unix time the data version was first observed (each
+            proxy's quality score is computed at this time)
+    """
+
+    def __init__(self, proxies: List[Dict], version: Sequence[int], loaded_at: float) -> None:
+        self.proxies = proxies
+        self.version = tuple(version)
+        self.last_modified = loaded_at
+        # Unquoted entity tag; the web layer adds the quotes
+        self.etag = hashlib.sha1(repr(self.version).encode('ascii')).hexdigest()[:16]
+        for proxy in proxies:
+            proxy['score'] = score(proxy, loaded_at)
+        # Best first; ties go to the lower latency, then the older proxy
+        self.by_quality = sorted(
+            proxies, key=lambda p: (-p['score'], p['ping'] is None, p['ping'] or 0.0, p['id'])
+        )
+        # Proxies without a measured ping sort after every measured one
+        self.by_ping = sorted(proxies, key=lambda p: (p['ping'] is None, p['ping'] or 0.0, p['id']))
+        self.by_recent = sorted(proxies, key=lambda p: (p['last_seen'], p['id']), reverse=True)
+        self.countries = sorted({p['country'] for p in proxies})
+
+    def __len__(self) -> int:
+        return len(self.proxies)
+
+    def query(
+        self,
+        countries: Optional[Sequence[str]] = None,
+        min_ping: Optional[float] = None,
+        max_ping: Optional[float] = None,
+        sort: str = SORT_QUALITY,
+        descending: Optional[bool] = None,
+        page: int = 1,
+        per_page: int = DEFAULT_PER_PAGE
+    ) -> Dict:
+        """
+        Filter, sort and paginate the snapshot.
+
+        Args:
+            countries: Country names to keep (case-insensitive); all if empty
+            min_ping: Lowest ping to keep in milliseconds
+            max_ping: Highest ping to keep in milliseconds
+            sort: 'quality' (best score first), 'ping' (fastest first) or
+                'recent' (most recently seen first)
+            descending: Reverse the default order for the sort key
+            page: 1-based page number
+            per_page: Proxies per page (capped at MAX_PER_PAGE)
+
+        Returns:
+            Dictionary with total, page, per_page, pages and proxies keys
+        """
+        if sort not in (SORT_QUALITY, SORT_PING, SORT_RECENT):
+            raise ValueError(f"sort must be '{SORT_QUALITY}', '{SORT_PING}' or '{SORT_RECENT}'")
+        if page < 1 or per_page < 1:
+            raise ValueError("page and per_page must be positive")
+        per_page = min(per_page, MAX_PER_PAGE)
+
+        ordered = {SORT_QUALITY: self.by_quality, SORT_PING: self.by_ping, SORT_RECENT: self.by_recent}[sort]
+        if descending is not None and descending != (sort in _DESCENDING_SORTS):
+            ordered = ordered[::-1]
+
+        wanted = {c.lower() for c in countries} if countries else None
+        if wanted or min_ping is not None or max_ping is not None:
+            ordered = [
+                p for p in ordered
+                if (wanted is None or p['country'].lower() in wanted)
+                and (min_ping is None or (p['ping'] is not None and p['ping'] >= min_ping))
+                and (max_ping is None or (p['ping'] is not None and p['ping'] <= max_ping))
+            ]
+
+        total = len(ordered)
+        start = (page - 1) * per_page
+        return {
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'pages': math.ceil(total / per_page),
+            'proxies': ordered[start:start + per_page]
+        }
+
+
+class SnapshotCache:
+    """
+    Rebuilds the ProxySnapshot when the store's data version changes.
+
+    Args:
+        store: Proxy store to snapshot
+        min_reload_interval: Minimum seconds between rebuilds, so a stream of
+            small writes doesn't rebuild the snapshot on every request
+    """
+
+    def __init__(self, store: ProxyStore, min_reload_interval: float = 1.0) -> None:
+        self.store = store
+        self.min_reload_interval = min_reload_interval
+        self._snapshot: Optional[ProxySnapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def get(self) -> ProxySnapshot:
+        """Return the current snapshot, rebuilding it if the store changed."""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self.min_reload_interval:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            self._checked_at = time.monotonic()
+            version = self.store.data_version()
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+            snapshot = ProxySnapshot(self.store.load_records(), version, time.time())
+            self._snapshot = snapshot
+            self.reloads += 1
+            logger.debug(f"Reloaded proxy snapshot ({len(snapshot)} proxies)")
+            return snapshot
@@ -0,0 +1,523 @@
+"""
+Shared state for running several bot instances side by side.
+
+Each instance keeps its own SQLite store, dedup index and web interface. What
+must agree across instances lives behind a StateBackend:
+
+- Proxy records: a node that sees a link another node has already checked
+  reuses that node's record instead of probing it and spending ip-api quota
+- Rate-limit tokens: the ip-api quota is per client IP, so instances behind
+  one address draw from one fixed window
+- Leases: a proxy is published by whichever node takes its publish lease,
+  so the channel gets it once however many nodes saw it
+
+STATE_BACKEND=local (the default) keeps all of this in memory, which is the
+single-instance behaviour. STATE_BACKEND=redis talks to any server speaking
+the Redis protocol (RESP) at STATE_URL through the small asyncio client below,
+so no Redis library is needed. Only plain commands are used (SET with NX/PX,
+GET, DEL, INCR, PTTL, PEXPIRE), not Lua scripts, so simple in-process fakes
+work too (see benchmarks/fakes.py).
+
+Shared state is an optimisation over the local store, not the source of
+truth: if the server is unreachable, lookups miss, leases are granted and
+the rate limiter falls back to its local bucket, so instances keep working
+(with a chance of duplicate posts) instead of stopping.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from metrics import Counter
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+STATE_ERRORS = Counter('orv_shared_state_errors_total', 'Failed shared state operations', ('operation',))
+
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server."""
+
+
+class RespClient:
+    """
+    Minimal Redis-protocol (RESP2) client over one asyncio stream.
+
+    Commands are pipelined: each caller writes its request and waits for the
+    reply at its position in the stream, so concurrent callers share one
+    connection without waiting for each other's round trips. The connection
+    is opened lazily and re-opened on the next command after a failure.
+
+    Args:
+        host: Server host
+        port: Server port
+        password: Sent with AUTH after connecting, if set
+        db: Database selected after connecting
+        timeout: Seconds to wait for a connection or a reply
+    """
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 6379,
+        password: Optional[str] = None,
+        db: int = 0,
+        timeout: float = 5.0
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.password = password
+        self.db = db
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._replies: Deque[asyncio.Future] = deque()
+        self._receiver: Optional[asyncio.Task] = None
+        self._connect_lock = asyncio.Lock()
+
+    @staticmethod
+    def encode(*args: Any) -> bytes:
+        """Encode a command as a RESP array of bulk strings."""
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        return b''.join(parts)
+
+    @classmethod
+    async def read_reply(cls, reader: asyncio.StreamReader) -> Any:
+        """
+        Read one RESP reply.
+
+        Returns:
+            str for simple strings, int for integers, bytes or None for bulk
+            strings, list (or None) for arrays; error replies are returned as
+            RespError instances for the caller to raise
+        """
+        line = await reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError("Connection closed by the state server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode('utf-8')
+        if kind == b'-':
+            return RespError(body.decode('utf-8'))
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            return (await reader.readexactly(length + 2))[:-2]
+        if kind == b'*':
+            count = int(body)
+            if count < 0:
+                return None
+            return [await cls.read_reply(reader) for _ in range(count)]
+        raise ConnectionError(f"Malformed reply from the state server: {line[:32]!r}")
+
+    async def _connect(self) -> None:
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.timeout
+                )
+            except (OSError, asyncio.TimeoutError) as e:
+                raise ConnectionError(f"Cannot connect to state server {self.host}:{self.port}: {e}") from e
+            # Handshake before the connection is shared
+            handshake = []
+            if self.password:
+                handshake.append(('AUTH', self.password))
+            if self.db:
+                handshake.append(('SELECT', self.db))
+            try:
+                for command in handshake:
+                    writer.write(self.encode(*command))
+                    reply = await asyncio.wait_for(self.read_reply(reader), self.timeout)
+                    if isinstance(reply, RespError):
+                        raise reply
+            except asyncio.TimeoutError:
+                writer.close()
+                raise ConnectionError("State server handshake timed out")
+            except BaseException:
+                writer.close()
+                raise
+            self._reader, self._writer = reader, writer
+            self._receiver = asyncio.create_task(self._receive(reader, writer))
+
+    async def _receive(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        error: Exception = ConnectionError("Connection to the state server lost")
+        try:
+            while True:
+                reply = await self.read_reply(reader)
+                if not self._replies:
+                    raise ConnectionError("Unexpected reply from the state server")
+                future = self._replies.popleft()
+                if not future.done():
+                    future.set_result(reply)
+        except asyncio.CancelledError:
+            raise
+        except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError) as e:
+            error = e if isinstance(e, ConnectionError) else ConnectionError(str(e))
+        finally:
+            # A timed-out command may already have replaced this connection
+            if self._writer is writer:
+                self._reset(error)
+            else:
+                writer.close()
+
+    def _reset(self, error: Exception) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        while self._replies:
+            future = self._replies.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    async def execute(self, *args: Any) -> Any:
+        """
+        Send one command and return its reply.
+
+        Raises:
+            RespError: The server answered with an error
+            ConnectionError: The server could not be reached or went away
+        """
+        if self._writer is None:
+            await self._connect()
+        future = asyncio.get_running_loop().create_future()
+        # Write and enqueue without awaiting in between, so replies stay in order
+        self._replies.append(future)
+        self._writer.write(self.encode(*args))
+        try:
+            reply = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            # The stream is out of step with its callers now; start over
+            receiver = self._receiver
+            future.cancel()
+            self._reset(ConnectionError("State server timed out"))
+            if receiver is not None:
+                receiver.cancel()
+            raise ConnectionError("State server timed out")
+        if isinstance(reply, RespError):
+            raise reply
+        return reply
+
+    async def close(self) -> None:
+        """Close the connection."""
+        if self._receiver is not None:
+            self._receiver.cancel()
+            await asyncio.gather(self._receiver, return_exceptions=True)
+            self._receiver = None
+        self._reset(ConnectionError("Client closed"))
+
+
+class StateBackend(ABC):
+    """
+    Interface of the shared state store; times are in seconds.
+
+    Backends implement every abstract method, so an incomplete one fails
+    when it is created rather than on its first use.
+
+    Attributes:
+        shared: True if other instances can see this state
+    """
+
+    shared = False
+
+    @abstractmethod
+    async def get_proxy(self, link: str) -> Optional[Dict]:
+        """Return the record another (or this) node stored for a link, or None."""
+
+    @abstractmethod
+    async def put_proxy(self, link: str, record: Dict, ttl: float) -> None:
+        """Store or refresh a checked proxy's record for ttl seconds."""
+
+    @abstractmethod
+    async def take_token(self, key: str, capacity: int, window: float) -> float:
+        """
+        Take one request from a fixed window of capacity requests per window seconds.
+
+        Returns:
+            0 if the request may go ahead, else seconds until the window resets
+        """
+
+    @abstractmethod
+    async def sync_tokens(self, key: str, remaining: int, capacity: int, reset_after: float) -> None:
+        """Align a window with what the remote service reports as left in it."""
+
+    @abstractmethod
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        Take (or renew, if owner already holds it) a named lease for ttl seconds.
+
+        Returns:
+            True if owner holds the lease now
+        """
+
+    @abstractmethod
+    async def release_lease(self, name: str, owner: str) -> None:
+        """Give up a lease if owner holds it."""
+
+    async def close(self) -> None:
+        """Release connections."""
+
+
+class LocalStateBackend(StateBackend):
+    """
+    In-memory backend for a single instance.
+
+    Expired keys are dropped lazily on access and by a sweep every
+    sweep_every writes, so memory stays bounded by the live keys.
+    """
+
+    def __init__(self, sweep_every: int = 1024) -> None:
+        # key -> (value, monotonic expiry)
+        self._values: Dict[str, Tuple[Any, float]] = {}
+        self._sweep_every = sweep_every
+        self._writes = 0
+
+    def _get(self, key: str) -> Any:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._values[key]
+            return None
+        return entry[0]
+
+    def _set(self, key: str, value: Any, ttl: float) -> None:
+        now = time.monotonic()
+        self._values[key] = (value, now + ttl)
+        self._writes += 1
+        if self._writes % self._sweep_every == 0:
+            expired = [k for k, (_, expiry) in self._values.items() if expiry <= now]
+            for k in expired:
+                del self._values[k]
+
+    async def get_proxy(self, link: str) -> Optional[Dict]:
+        return self._get(f'proxy:{link}')
+
+    async def put_proxy(self, link: str, record: Dict, ttl: float) -> None:
+        self._set(f'proxy:{link}', dict(record), ttl)
+
+    async def take_token(self, key: str, capacity: int, window: float) -> float:
+        key = f'tokens:{key}'
+        entry = self._values.get(key)
+        now = time.monotonic()
+        if entry is None or entry[1] <= now:
+            self._set(key, 1, window)
+            return 0.0
+        if entry[0] >= capacity:
+            return entry[1] - now
+        self._values[key] = (entry[0] + 1, entry[1])
+        return 0.0
+
+    async def sync_tokens(self, key: str, remaining: int, capacity: int, reset_after: float) -> None:
+        if reset_after > 0:
+            self._set(f'tokens:{key}', max(0, capacity - remaining), reset_after)
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        key = f'lease:{name}'
+        holder = self._get(key)
+        if holder is not None and holder != owner:
+            return False
+        self._set(key, owner, ttl)
+        return True
+
+    async def release_lease(self, name: str, owner: str) -> None:
+        key = f'lease:{name}'
+        if self._get(key) == owner:
+            del self._values[key]
+
+
+class RedisStateBackend(StateBackend):
+    """
+    Backend on a Redis-protocol server shared by all instances.
+
+    Keys are namespaced with prefix. Windows use SET NX PX to open and INCR to
+    count, so the first request of a window sets its expiry atomically.
+    Lease renewal is GET followed by PEXPIRE: a lease that expires between the
+    two can be renewed after another node took it, which at worst lets two
+    nodes publish the same proxy once, the same as a server outage.
+
+    Args:
+        client: RESP client connected to the server
+        prefix: Prefix for every key
+    """
+
+    shared = True
+
+    def __init__(self, client: RespClient, prefix: str = 'orv:') -> None:
+        self.client = client
+        self.prefix = prefix
+
+    async def get_proxy(self, link: str) -> Optional[Dict]:
+        try:
+            value = await self.client.execute('GET', f'{self.prefix}proxy:{link}')
+            return json.loads(value) if value is not None else None
+        except (ConnectionError, RespError, ValueError) as e:
+            STATE_ERRORS.inc(operation='get_proxy')
+            logger.warning(f"Shared state lookup failed: {e}")
+            return None
+
+    async def put_proxy(self, link: str, record: Dict, ttl: float) -> None:
+        try:
+            await self.client.execute(
+                'SET', f'{self.prefix}proxy:{link}', json.dumps(record), 'PX', max(1, int(ttl * 1000))
+            )
+        except (ConnectionError, RespError) as e:
+            STATE_ERRORS.inc(operation='put_proxy')
+            logger.warning(f"Shared state write failed: {e}")
+
+    async def take_token(self, key: str, capacity: int, window: float) -> float:
+        # Errors propagate: the shared rate limiter falls back to its local bucket
+        key = f'{self.prefix}tokens:{key}'
+        await self.client.execute('SET', key, 0, 'NX', 'PX', max(1, int(window * 1000)))
+        used = await self.client.execute('INCR', key)
+        if used <= capacity:
+            return 0.0
+        ttl_ms = await self.client.execute('PTTL', key)
+        if ttl_ms < 0:
+            # The window lost its expiry (INCR on a key that just expired); close it
+            await self.client.execute('PEXPIRE', key, max(1, int(window * 1000)))
+            ttl_ms = int(window * 1000)
+        return ttl_ms / 1000.0
+
+    async def sync_tokens(self, key: str, remaining: int, capacity: int, reset_after: float) -> None:
+        if reset_after > 0:
+            await self.client.execute(
+                'SET', f'{self.prefix}tokens:{key}', max(0, capacity - remaining), 'PX', max(1, int(reset_after * 1000))
+            )
+
+    async def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        key = f'{self.prefix}lease:{name}'
+        ttl_ms = max(1, int(ttl * 1000))
+        try:
+            if await self.client.execute('SET', key, owner, 'NX', 'PX', ttl_ms) is not None:
+                return True
+            holder = await self.client.execute('GET', key)
+            if holder is not None and holder.decode('utf-8') == owner:
+                await self.client.execute('PEXPIRE', key, ttl_ms)
+                return True
+            return False
+        except (ConnectionError, RespError) as e:
+            # Better a possible duplicate post than a lost one
+            STATE_ERRORS.inc(operation='acquire_lease')
+            logger.warning(f"Shared lease {name} could not be checked, assuming it is ours: {e}")
+            return True
+
+    async def release_lease(self, name: str, owner: str) -> None:
+        key = f'{self.prefix}lease:{name}'
+        try:
+            holder = await self.client.execute('GET', key)
+            if holder is not None and holder.decode('utf-8') == owner:
+                await self.client.execute('DEL', key)
+        except (ConnectionError, RespError) as e:
+            STATE_ERRORS.inc(operation='release_lease')
+            logger.warning(f"Shared lease {name} could not be released: {e}")
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket whose quota window is shared through a StateBackend.
+
+    Requests are counted in the backend's fixed window, which matches how
+    ip-api counts them. The inherited local bucket still mirrors the
+    service's X-Rl/X-Ttl headers; that feedback is also pushed to the shared
+    window before the next request, and the local bucket takes over whenever
+    the backend cannot be reached.
+
+    Args:
+        backend: Shared state backend
+        key: Name of the shared window
+        rate: Nominal refill rate in tokens per second
+        capacity: Requests per window (the window is capacity / rate seconds)
+    """
+
+    def __init__(self, backend: StateBackend, key: str, rate: float, capacity: float) -> None:
+        super().__init__(rate=rate, capacity=capacity)
+        self.backend = backend
+        self.key = key
+        self.window = capacity / rate
+        self._feedback: Optional[Tuple[int, float, float]] = None
+        self.fallbacks = 0
+
+    def observe(self, remaining: int, reset_after: float) -> None:
+        super().observe(remaining, reset_after)
+        self._feedback = (remaining, reset_after, time.monotonic())
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        if tokens != 1.0:
+            raise ValueError("Shared token buckets hand out one token at a time")
+        async with self._lock:
+            try:
+                if self._feedback is not None:
+                    remaining, reset_after, observed = self._feedback
+                    self._feedback = None
+                    await self.backend.sync_tokens(
+                        self.key, remaining, int(self.capacity), reset_after - (time.monotonic() - observed)
+                    )
+                waited = False
+                while True:
+                    wait = await self.backend.take_token(self.key, int(self.capacity), self.window)
+                    if wait <= 0:
+                        if waited:
+                            self.waits += 1
+                        return
+                    waited = True
+                    await asyncio.sleep(wait)
+            except (ConnectionError, RespError) as e:
+                STATE_ERRORS.inc(operation='take_token')
+                self.fallbacks += 1
+                logger.warning(f"Shared rate limit unavailable, using the local bucket: {e}")
+        await super().acquire(tokens)
+
+
+def parse_url(url: str) -> Dict[str, Any]:
+    """
+    Split a redis://[:password@]host[:port][/db] URL into RespClient arguments.
+
+    Raises:
+        ValueError: The URL is not a redis:// URL
+    """
+    parsed = urlparse(url)
+    if parsed.scheme != 'redis' or not parsed.hostname:
+        raise ValueError(f"State URL must look like redis://host:port/db, got '{url}'")
+    path = parsed.path.strip('/')
+    return {
+        'host': parsed.hostname,
+        'port': parsed.port or 6379,
+        'password': unquote(parsed.password) if parsed.password else None,
+        'db': int(path) if path else 0
+    }
+
+
+def open_backend(backend: str, url: Optional[str] = None, prefix: str = 'orv:') -> StateBackend:
+    """
+    Create the configured state backend (connections are opened lazily).
+
+    Args:
+        backend: 'local' or 'redis'
+        url: Server URL for the 'redis' backend
+        prefix: Key prefix for the 'redis' backend
+
+    Returns:
+        StateBackend instance
+    """
+    if backend == 'local':
+        return LocalStateBackend()
+    if backend != 'redis':
+        raise ValueError(f"Unknown state backend '{backend}'")
+    return RedisStateBackend(RespClient(**parse_url(url or '')), prefix=prefix)
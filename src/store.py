@@ -0,0 +1,739 @@
+"""
+SQLite-backed proxy store.
+
+Proxies are kept in a single SQLite database running in WAL mode, so inserts
+are O(log n) index updates instead of whole-file rewrites and readers (the web
+server) never block the writer (the bot).
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from dedup import DedupIndex
+
+logger = logging.getLogger(__name__)
+
+# Database lives next to the legacy JSON file in the project root
+_script_dir = os.path.dirname(os.path.abspath(__file__))
+DB_FILE = os.path.join(os.path.dirname(_script_dir), 'proxies.db')
+LEGACY_PROXY_FILE = os.path.join(os.path.dirname(_script_dir), 'proxies.json')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS proxies (
+    id INTEGER PRIMARY KEY,
+    link TEXT NOT NULL UNIQUE,
+    server TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    country TEXT NOT NULL DEFAULT 'Unknown',
+    ping REAL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    alive INTEGER NOT NULL DEFAULT 1,
+    last_checked REAL
+);
+CREATE INDEX IF NOT EXISTS idx_proxies_server_port ON proxies(server, port);
+CREATE INDEX IF NOT EXISTS idx_proxies_country ON proxies(country);
+CREATE INDEX IF NOT EXISTS idx_proxies_ping ON proxies(ping);
+CREATE INDEX IF NOT EXISTS idx_proxies_first_seen ON proxies(first_seen);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_chat ON outbox(chat, next_attempt);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    channel INTEGER PRIMARY KEY,
+    last_message_id INTEGER NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+# Columns added after the initial schema: (name, definition, backfill statement)
+_ADDED_COLUMNS = [
+    ('last_seen', 'REAL NOT NULL DEFAULT 0', "UPDATE proxies SET last_seen = first_seen"),
+    ('failures', 'INTEGER NOT NULL DEFAULT 0', None),
+    ('alive', 'INTEGER NOT NULL DEFAULT 1', None),
+    ('last_checked', 'REAL', None),
+    # Rolling quality summary (see quality.py); stored pings seed the EWMA
+    ('latency_ewma', 'REAL', "UPDATE proxies SET latency_ewma = ping"),
+    ('latency_p50', 'REAL', None),
+    ('latency_p95', 'REAL', None),
+    ('success_ratio', 'REAL', None),
+    ('samples', 'INTEGER NOT NULL DEFAULT 0', None),
+    ('last_alive', 'REAL', "UPDATE proxies SET last_alive = last_seen WHERE ping IS NOT NULL AND alive = 1"),
+]
+# Quality summary columns, in the order record_quality() writes them
+QUALITY_COLUMNS = ('latency_ewma', 'latency_p50', 'latency_p95', 'success_ratio', 'samples', 'last_alive')
+# Indexes on added columns (created once the columns exist)
+_ADDED_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_proxies_last_seen ON proxies(last_seen);
+"""
+
+_INSERT_SQL = (
+    "INSERT OR IGNORE INTO proxies (id, link, server, port, country, ping, first_seen, last_seen) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def _parse_ping(value) -> Optional[float]:
+    """
+    Convert a legacy ping value ("123.45ms" or a number) to milliseconds.
+
+    Args:
+        value: Ping value as stored in proxies.json
+
+    Returns:
+        Ping in milliseconds or None if missing/invalid
+    """
+    if value is None:
+        return None
+    try:
+        return float(str(value).strip().rstrip('ms'))
+    except ValueError:
+        return None
+
+
+def row_to_legacy(row: sqlite3.Row) -> Dict:
+    """
+    Convert a database row to the dictionary shape used by proxies.json.
+
+    Args:
+        row: Row from the proxies table
+
+    Returns:
+        Dictionary with link, Country, IP, Port and optional Ping keys
+    """
+    proxy_data = {
+        'link': row['link'],
+        'Country': row['country'],
+        'IP': row['server'],
+        'Port': str(row['port'])
+    }
+    if row['ping'] is not None:
+        proxy_data['Ping'] = f"{row['ping']}ms"
+    return proxy_data
+
+
+def row_to_record(row: sqlite3.Row) -> Dict:
+    """
+    Convert a database row to the dictionary shape used by the web API.
+
+    Args:
+        row: Row from the proxies table
+
+    Returns:
+        Dictionary with id, link, server, port, country, ping, first_seen,
+        last_seen, alive and the quality summary keys
+    """
+    record = {
+        'id': row['id'],
+        'link': row['link'],
+        'server': row['server'],
+        'port': row['port'],
+        'country': row['country'],
+        'ping': row['ping'],
+        'first_seen': row['first_seen'],
+        'last_seen': row['last_seen'],
+        'alive': bool(row['alive'])
+    }
+    for column in QUALITY_COLUMNS:
+        record[column] = row[column]
+    return record
+
+
+class ProxyStore:
+    """
+    Repository for collected proxies backed by SQLite in WAL mode.
+
+    Each thread gets its own connection; writes are serialized by a lock so
+    concurrent writers in the same process never hit SQLITE_BUSY. Membership
+    checks and ID allocation go through an in-memory DedupIndex that is
+    rebuilt from the table on open and updated on every insert and delete.
+    """
+
+    def __init__(self, path: str = DB_FILE, bloom_capacity: int = 0) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._pending_touches = set()
+        # Bumped on every change to the proxies table made through this object
+        self.version = 0
+        with self._write_lock:
+            conn = self._connect()
+            conn.executescript(_SCHEMA)
+            self._migrate_schema(conn)
+        self.index = DedupIndex(bloom_capacity, f"{path}.bloom" if bloom_capacity > 0 else None)
+        self._rebuild_index()
+
+    @staticmethod
+    def _migrate_schema(conn: sqlite3.Connection) -> None:
+        """Add columns introduced after the initial schema to older databases."""
+        existing = {row['name'] for row in conn.execute("PRAGMA table_info(proxies)")}
+        for name, definition, backfill in _ADDED_COLUMNS:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE proxies ADD COLUMN {name} {definition}")
+                if backfill:
+                    conn.execute(backfill)
+                logger.info(f"Added column {name} to proxy store")
+        conn.executescript(_ADDED_INDEXES)
+
+    def _rebuild_index(self) -> None:
+        """Load every (id, link) pair into the dedup index."""
+        last_id = int(self.get_meta('last_id') or 0)
+        cursor = self._connect().execute("SELECT id, link FROM proxies")
+        self.index.rebuild(((row['id'], row['link']) for row in cursor), last_id)
+        logger.debug(f"Dedup index rebuilt with {len(self.index)} links")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            # NORMAL is durable across application crashes in WAL mode
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def add_if_absent(
+        self,
+        link: str,
+        country: str,
+        server: str,
+        port: str,
+        ping: Optional[float] = None,
+        proxy_id: Optional[int] = None
+    ) -> bool:
+        """
+        Atomically insert a proxy unless its link is already stored.
+
+        Known links are rejected by the in-memory index without touching the
+        database; new proxies get their ID from the index's monotonic counter.
+
+        Args:
+            link: The full proxy link
+            country: Country name
+            server: Server IP address or hostname
+            port: Port number
+            ping: Optional ping time in milliseconds
+            proxy_id: Optional explicit ID (taken from the index when omitted)
+
+        Returns:
+            True if the proxy was inserted, False if it already existed
+        """
+        if link in self.index:
+            return False
+
+        with self._write_lock:
+            try:
+                conn = self._connect()
+                now = time.time()
+                cursor = conn.execute(
+                    _INSERT_SQL,
+                    (proxy_id or self.index.next_id(), link, server, int(port), country, ping, now, now)
+                )
+                if cursor.rowcount == 0:
+                    # Another process may have written to the database: either the
+                    # link exists already or our ID collided, so resync and retry once.
+                    self._rebuild_index()
+                    if link in self.index:
+                        return False
+                    cursor = conn.execute(
+                        _INSERT_SQL,
+                        (self.index.next_id(), link, server, int(port), country, ping, now, now)
+                    )
+                    if cursor.rowcount == 0:
+                        return False
+                self.index.add(link)
+                self.version += 1
+                return True
+            except (sqlite3.Error, ValueError) as e:
+                logger.error(f"Error storing proxy {link}: {e}")
+                return False
+
+    def contains(self, link: str) -> bool:
+        """
+        Check whether a proxy link is stored (or remembered as evicted).
+
+        Args:
+            link: The proxy link to check
+
+        Returns:
+            True if the link has been seen, False otherwise
+        """
+        return link in self.index
+
+    def load_all(self, include_dead: bool = False) -> Dict[str, Dict]:
+        """
+        Load stored proxies in the legacy proxies.json shape.
+
+        Args:
+            include_dead: Also return proxies marked dead by re-validation
+
+        Returns:
+            Dictionary mapping string IDs to proxy dictionaries, ordered by ID
+        """
+        query = "SELECT * FROM proxies ORDER BY id" if include_dead else \
+            "SELECT * FROM proxies WHERE alive = 1 ORDER BY id"
+        try:
+            rows = self._connect().execute(query).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Error loading proxies from {self.path}: {e}")
+            return {}
+        return {str(row['id']): row_to_legacy(row) for row in rows}
+
+    def load_records(
+        self,
+        include_dead: bool = False,
+        after_id: int = 0,
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Load stored proxies as plain dictionaries with every public column.
+
+        Args:
+            include_dead: Also return proxies marked dead by re-validation
+            after_id: Only return proxies with a larger ID
+            limit: Maximum number of proxies to return
+
+        Returns:
+            List of proxy dictionaries ordered by ID
+        """
+        query = "SELECT * FROM proxies WHERE id > ?"
+        if not include_dead:
+            query += " AND alive = 1"
+        query += " ORDER BY id"
+        params = [after_id]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        try:
+            rows = self._connect().execute(query, params).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Error loading proxies from {self.path}: {e}")
+            return []
+        return [row_to_record(row) for row in rows]
+
+    def get_record(self, link: str) -> Optional[Dict]:
+        """Return the stored proxy for a link as a dictionary, or None."""
+        row = self._connect().execute("SELECT * FROM proxies WHERE link = ?", (link,)).fetchone()
+        return row_to_record(row) if row is not None else None
+
+    def data_version(self) -> Tuple[int, int, int]:
+        """
+        Return a token that changes whenever the stored proxies change.
+
+        Combines the in-process write counter with the modification times of
+        the database and its WAL file, which also catch writes from other
+        processes.
+
+        Returns:
+            Tuple of (write counter, database mtime_ns, WAL mtime_ns)
+        """
+        mtimes = []
+        for path in (self.path, f"{self.path}-wal"):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(0)
+        return self.version, mtimes[0], mtimes[1]
+
+    def count(self) -> int:
+        """Return the number of stored proxies."""
+        return self._connect().execute("SELECT COUNT(*) FROM proxies").fetchone()[0]
+
+    def clear(self) -> None:
+        """Delete every stored proxy."""
+        with self._write_lock:
+            conn = self._connect()
+            links = [row['link'] for row in conn.execute("SELECT link FROM proxies")]
+            conn.execute("DELETE FROM proxies")
+            # Remember the ID high-water mark so restarts never reuse IDs
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_id', ?)", (str(self.index.last_id),)
+            )
+            self.index.evict(links)
+            self.version += 1
+
+    def touch(self, link: str) -> None:
+        """
+        Record that a stored proxy was seen again.
+
+        The last_seen update is buffered in memory and written by
+        flush_touches(), so reposts cost a set insertion rather than a write.
+
+        Args:
+            link: The proxy link
+        """
+        if link in self.index:
+            self._pending_touches.add(link)
+
+    def flush_touches(self) -> int:
+        """
+        Write buffered last_seen updates in one transaction.
+
+        Returns:
+            Number of proxies updated
+        """
+        if not self._pending_touches:
+            return 0
+        links, self._pending_touches = self._pending_touches, set()
+        now = time.time()
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "UPDATE proxies SET last_seen = ? WHERE link = ?", ((now, link) for link in links)
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                conn.execute("ROLLBACK")
+                logger.error(f"Error updating last_seen for {len(links)} proxies: {e}")
+                return 0
+            self.version += 1
+        return len(links)
+
+    def expire_older_than(self, cutoff: float, batch_size: int = 500) -> List[int]:
+        """
+        Delete proxies not seen since cutoff.
+
+        Walks the last_seen index from the oldest entry, so the cost is
+        proportional to the number of expired rows, not the store size.
+
+        Args:
+            cutoff: Unix timestamp; proxies with last_seen before it are removed
+            batch_size: Rows deleted per transaction
+
+        Returns:
+            IDs of the proxies removed
+        """
+        removed: List[int] = []
+        while True:
+            with self._write_lock:
+                conn = self._connect()
+                rows = conn.execute(
+                    "SELECT id, link FROM proxies WHERE last_seen < ? ORDER BY last_seen LIMIT ?",
+                    (cutoff, batch_size)
+                ).fetchall()
+                if not rows:
+                    break
+                conn.execute("BEGIN")
+                conn.executemany("DELETE FROM proxies WHERE id = ?", ((row['id'],) for row in rows))
+                # Remember the ID high-water mark so restarts never reuse IDs
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_id', ?)", (str(self.index.last_id),)
+                )
+                conn.execute("COMMIT")
+                links = [row['link'] for row in rows]
+                self._pending_touches.difference_update(links)
+                self.index.evict(links)
+                self.version += 1
+            removed.extend(row['id'] for row in rows)
+            if len(rows) < batch_size:
+                break
+        return removed
+
+    def ids_after(self, proxy_id: int) -> List[int]:
+        """
+        Return IDs of proxies inserted after the given ID.
+
+        Args:
+            proxy_id: Last ID already known to the caller
+
+        Returns:
+            Ascending list of newer proxy IDs
+        """
+        rows = self._connect().execute("SELECT id FROM proxies WHERE id > ? ORDER BY id", (proxy_id,))
+        return [row['id'] for row in rows]
+
+    def get_proxy(self, proxy_id: int) -> Optional[sqlite3.Row]:
+        """Return the full row for a proxy ID, or None if it no longer exists."""
+        return self._connect().execute("SELECT * FROM proxies WHERE id = ?", (proxy_id,)).fetchone()
+
+    def record_probe(
+        self,
+        proxy_id: int,
+        ping: Optional[float],
+        dead_after: int,
+        quality: Optional[Dict] = None
+    ) -> Optional[bool]:
+        """
+        Store the outcome of a re-validation probe.
+
+        A success refreshes the latency and last_alive and resets the failure
+        count; a failure increments it and marks the proxy dead once it
+        reaches dead_after consecutive failures. last_seen is left alone: it
+        records when the proxy was last posted, which is what expiry goes by.
+
+        Args:
+            proxy_id: Proxy ID
+            ping: Measured latency in milliseconds, or None if the probe failed
+            dead_after: Consecutive failures before the proxy is marked dead
+            quality: Updated quality summary to write in the same statement
+
+        Returns:
+            Whether the proxy is alive, or None if it no longer exists
+        """
+        now = time.time()
+        if quality is not None:
+            columns, quality_params = QUALITY_COLUMNS, tuple(quality[column] for column in QUALITY_COLUMNS)
+        else:
+            # Without a quality summary only last_alive is kept up to date
+            columns, quality_params = (('last_alive',), (now,)) if ping is not None else ((), ())
+        quality_sql = ''.join(f", {column} = ?" for column in columns)
+        with self._write_lock:
+            conn = self._connect()
+            if ping is not None:
+                cursor = conn.execute(
+                    f"UPDATE proxies SET ping = ?, failures = 0, alive = 1, last_checked = ?{quality_sql} WHERE id = ?",
+                    (ping, now) + quality_params + (proxy_id,)
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE proxies SET failures = failures + 1, alive = (failures + 1 < ?), last_checked = ?"
+                    f"{quality_sql} WHERE id = ?",
+                    (dead_after, now) + quality_params + (proxy_id,)
+                )
+            if cursor.rowcount == 0:
+                return None
+            self.version += 1
+            row = conn.execute("SELECT alive FROM proxies WHERE id = ?", (proxy_id,)).fetchone()
+        return bool(row['alive'])
+
+    def record_quality(self, proxy_id: int, quality: Dict) -> bool:
+        """
+        Store a proxy's quality summary (see quality.QualityStats).
+
+        Args:
+            proxy_id: Proxy ID
+            quality: Mapping with every QUALITY_COLUMNS key
+
+        Returns:
+            True if the proxy exists
+        """
+        assignments = ', '.join(f"{column} = ?" for column in QUALITY_COLUMNS)
+        with self._write_lock:
+            cursor = self._connect().execute(
+                f"UPDATE proxies SET {assignments} WHERE id = ?",
+                tuple(quality[column] for column in QUALITY_COLUMNS) + (proxy_id,)
+            )
+            if cursor.rowcount == 0:
+                return False
+            self.version += 1
+        return True
+
+    def enqueue_outbound(self, chat: str, payload: Dict) -> int:
+        """
+        Append a message to the persistent outbound queue.
+
+        Args:
+            chat: Destination chat
+            payload: JSON-serialisable message data
+
+        Returns:
+            Outbox entry ID
+        """
+        with self._write_lock:
+            cursor = self._connect().execute(
+                "INSERT INTO outbox (chat, payload, created) VALUES (?, ?, ?)",
+                (chat, json.dumps(payload, ensure_ascii=False), time.time())
+            )
+        return cursor.lastrowid
+
+    def outbound_chats(self) -> List[str]:
+        """Return the chats that have queued outbound messages."""
+        return [row['chat'] for row in self._connect().execute("SELECT DISTINCT chat FROM outbox")]
+
+    def due_outbound(self, chat: str, limit: int, now: Optional[float] = None) -> List[Tuple[int, Dict, int]]:
+        """
+        Return the oldest queued messages for a chat that are due for sending.
+
+        Args:
+            chat: Destination chat
+            limit: Maximum number of entries
+            now: Current time (defaults to time.time())
+
+        Returns:
+            List of (entry ID, payload, attempts) in queue order
+        """
+        rows = self._connect().execute(
+            "SELECT id, payload, attempts FROM outbox WHERE chat = ? AND next_attempt <= ? ORDER BY id LIMIT ?",
+            (chat, time.time() if now is None else now, limit)
+        ).fetchall()
+        return [(row['id'], json.loads(row['payload']), row['attempts']) for row in rows]
+
+    def next_outbound_time(self, chat: str) -> Optional[float]:
+        """Return when the next queued message for a chat becomes due, or None if the queue is empty."""
+        row = self._connect().execute(
+            "SELECT MIN(next_attempt) AS due FROM outbox WHERE chat = ?", (chat,)
+        ).fetchone()
+        return row['due']
+
+    def outbound_depth(self) -> int:
+        """Return the number of queued outbound messages."""
+        return self._connect().execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def delete_outbound(self, entry_ids: Sequence[int]) -> None:
+        """Remove sent or abandoned messages from the outbound queue."""
+        with self._write_lock:
+            self._connect().executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in entry_ids])
+
+    def defer_outbound(self, entry_ids: Sequence[int], next_attempt: float, count_attempt: bool = True) -> None:
+        """
+        Postpone queued messages after a failed send.
+
+        Args:
+            entry_ids: Outbox entry IDs
+            next_attempt: Time before which the entries are not retried
+            count_attempt: Whether the failure counts towards the retry limit
+        """
+        with self._write_lock:
+            self._connect().executemany(
+                "UPDATE outbox SET attempts = attempts + ?, next_attempt = ? WHERE id = ?",
+                [(int(count_attempt), next_attempt, i) for i in entry_ids]
+            )
+
+    def get_checkpoint(self, channel: int) -> Optional[int]:
+        """Return the last processed message ID for a channel, or None if never recorded."""
+        row = self._connect().execute(
+            "SELECT last_message_id FROM checkpoints WHERE channel = ?", (channel,)
+        ).fetchone()
+        return row['last_message_id'] if row else None
+
+    def set_checkpoint(self, channel: int, message_id: int) -> None:
+        """
+        Record that a channel has been processed up to a message ID.
+
+        Checkpoints never move backwards, so concurrent writers (live handler
+        and backfill) can't undo each other's progress.
+        """
+        with self._write_lock:
+            self._connect().execute(
+                "INSERT INTO checkpoints (channel, last_message_id, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(channel) DO UPDATE SET "
+                "last_message_id = MAX(last_message_id, excluded.last_message_id), updated = excluded.updated",
+                (channel, message_id, time.time())
+            )
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """Return a value from the meta table or None if unset."""
+        row = self._connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        """Store a value in the meta table."""
+        with self._write_lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def migrate_from_json(self, json_path: str = LEGACY_PROXY_FILE) -> int:
+        """
+        One-shot import of a legacy proxies.json file.
+
+        The migration is recorded in the meta table so it never runs twice,
+        even if the JSON file is left in place. Entries keyed by something
+        other than a numeric ID get a new ID after all the numbered ones.
+
+        Args:
+            json_path: Path to the legacy JSON file
+
+        Returns:
+            Number of proxies imported
+        """
+        if self.get_meta('json_migrated') or not os.path.exists(json_path):
+            return 0
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as file:
+                proxies = json.load(file)
+        except (json.JSONDecodeError, IOError) as e:
+            logger.error(f"Error reading legacy proxies file {json_path}: {e}")
+            return 0
+
+        imported = 0
+        now = time.time()
+        with self._write_lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                renumbered = []
+                for proxy_id, entry in proxies.items():
+                    try:
+                        port = int(entry['Port'])
+                    except (KeyError, TypeError, ValueError):
+                        port = None
+                    if port is None or not entry.get('link') or not entry.get('IP'):
+                        logger.warning(f"Skipping invalid legacy proxy entry {proxy_id}")
+                        continue
+                    values = (entry['link'], entry['IP'], port, entry.get('Country', 'Unknown'),
+                              _parse_ping(entry.get('Ping')), now, now)
+                    try:
+                        row_id = int(proxy_id)
+                    except ValueError:
+                        renumbered.append((proxy_id, values))
+                        continue
+                    imported += conn.execute(_INSERT_SQL, (row_id,) + values).rowcount
+                if renumbered:
+                    # Hand out IDs after the numbered entries just inserted
+                    self._rebuild_index()
+                    for proxy_id, values in renumbered:
+                        row_id = self.index.next_id()
+                        cursor = conn.execute(_INSERT_SQL, (row_id,) + values)
+                        if cursor.rowcount:
+                            logger.info(f"Legacy proxy entry {proxy_id} imported with new ID {row_id}")
+                        imported += cursor.rowcount
+                # The single ping the JSON file kept seeds the quality summary
+                conn.execute("UPDATE proxies SET latency_ewma = ping WHERE latency_ewma IS NULL")
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)", (str(now),)
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error as e:
+                conn.execute("ROLLBACK")
+                self._rebuild_index()
+                logger.error(f"Error migrating legacy proxies file {json_path}: {e}")
+                return 0
+
+        self._rebuild_index()
+        self.version += 1
+        logger.info(f"Migrated {imported} proxies from {json_path} to {self.path}")
+        return imported
+
+
+_default_store: Optional[ProxyStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_store(bloom_capacity: int = 0) -> ProxyStore:
+    """
+    Return the process-wide proxy store, creating and migrating it on first use.
+
+    Args:
+        bloom_capacity: Bloom filter size for evicted links (0 disables it);
+            only honoured by the call that creates the store
+
+    Returns:
+        Shared ProxyStore instance
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = ProxyStore(DB_FILE, bloom_capacity)
+            _default_store.migrate_from_json(LEGACY_PROXY_FILE)
+        return _default_store
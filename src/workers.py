@@ -0,0 +1,315 @@
+"""
+Multi-process enrichment workers.
+
+With ENRICH_PROCESSES > 0 the pipeline's enrich stage hands DNS resolution,
+proxy checks (TCP or MTProto) and offline GeoIP lookups to a pool of worker
+processes, so they scale across CPU cores instead of sharing the bot's event
+loop and GIL with Telethon and the web server.
+
+Each worker is a separate interpreter running this file; jobs and results
+travel as JSON lines over the worker's stdin/stdout pipes. Plain subprocesses
+are used rather than multiprocessing: spawned children would re-import the
+main script (and with it the Telegram clients), and forking from inside a
+running event loop is unsafe. Everything that must be shared stays in the
+parent: the dedup gate, the store, the geo cache and the ip-api client, so
+the ip-api quota is still enforced by one rate limiter.
+
+A worker can also be run by hand for debugging:
+
+    echo '{"id": 1, "link": "...", "server": "1.2.3.4", "port": "443"}' | python src/workers.py '{}'
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from geoip import open_database as open_geoip_database
+from metrics import Counter
+from mtproto import extract_secret, validate_proxy
+from prober import TcpProber
+from resolver import DnsCache, ResolvedAddress, first_ipv4, to_sockaddrs
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.abspath(__file__)
+
+# Longest JSON line accepted on either pipe
+_LINE_LIMIT = 1 << 20
+
+ENRICH_JOBS = Counter('orv_enrich_worker_jobs_total', 'Jobs handled by enrichment worker processes', ('result',))
+
+
+@dataclass
+class EnrichResult:
+    """Outcome of one job; country is None when the parent must look it up."""
+    addresses: List[ResolvedAddress]
+    ping: Optional[float] = None
+    handshake_ms: Optional[float] = None
+    valid: bool = True
+    country: Optional[str] = None
+
+
+class _JobRunner:
+    """Worker-side enrichment with its own DNS cache, prober and GeoIP database."""
+
+    def __init__(self, settings: Dict) -> None:
+        self.probe_mode = settings.get('probe_mode', 'tcp')
+        self.probe_timeout = settings.get('probe_timeout', 3.0)
+        self.dns_cache = DnsCache(
+            ttl=settings.get('dns_cache_ttl', 300), negative_ttl=settings.get('dns_negative_ttl', 60)
+        )
+        self.prober = TcpProber(concurrency=settings.get('probe_concurrency', 1000), resolver=self.dns_cache)
+        backend = settings.get('geoip_backend', 'ipapi')
+        self.geoip_db = open_geoip_database(backend, settings['geoip_database']) if backend != 'ipapi' else None
+
+    async def _check(self, link: str, server: str, port: str, addresses: List[ResolvedAddress]) -> Dict:
+        # Same semantics as bot.check_proxy
+        if self.probe_mode != 'mtproto':
+            sockaddrs = to_sockaddrs(addresses, int(port)) if addresses else None
+            return {'ping': await self.prober.probe(server, port, self.probe_timeout, sockaddrs)}
+
+        secret = extract_secret(link)
+        if not secret:
+            logger.warning(f"Proxy {server}:{port} has no secret, cannot validate handshake")
+            return {'valid': False}
+        async with self.prober.slot():
+            result = await validate_proxy(server, port, secret, addresses=[ip for _, ip in addresses] or None)
+        if not result.ok:
+            logger.warning(f"MTProto handshake failed for {server}:{port}: {result.error}")
+        return {'ping': result.connect_ms, 'handshake_ms': result.handshake_ms, 'valid': result.ok}
+
+    async def run(self, job: Dict) -> Dict:
+        """Resolve, check and (offline) geolocate one proxy."""
+        addresses = await self.dns_cache.resolve(job['server'])
+        reply = {'id': job['id'], 'addresses': addresses}
+        reply.update(await self._check(job['link'], job['server'], job['port'], addresses))
+        if self.geoip_db is not None and reply.get('valid', True):
+            reply['country'] = self.geoip_db.lookup(first_ipv4(addresses) or job['server'])
+        return reply
+
+
+async def _serve(settings: Dict) -> None:
+    """Worker main loop: read jobs from stdin, write results to stdout."""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=_LINE_LIMIT)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+    writer = asyncio.StreamWriter(transport, protocol, None, loop)
+    runner = _JobRunner(settings)
+    tasks = set()
+
+    async def handle(job: Dict) -> None:
+        try:
+            reply = await runner.run(job)
+        except Exception as e:
+            logger.error(f"Error enriching {job.get('server')}:{job.get('port')}: {e}", exc_info=True)
+            reply = {'id': job['id'], 'error': str(e)}
+        try:
+            writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+            await writer.drain()
+        except ConnectionError:
+            # The bot went away; nobody is waiting for this result
+            pass
+
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        task = asyncio.create_task(handle(json.loads(line)))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    # stdin closed: finish the jobs in hand, then exit
+    if tasks:
+        await asyncio.gather(*tasks)
+    writer.close()
+
+
+class _WorkerProcess:
+    """Parent-side handle for one worker: the process, its in-flight jobs and their futures."""
+
+    def __init__(self, process: asyncio.subprocess.Process) -> None:
+        self.process = process
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.reader: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None and self.reader is not None and not self.reader.done()
+
+
+class EnrichmentPool:
+    """
+    Pool of enrichment worker processes.
+
+    Jobs go to the worker with the fewest jobs in flight. A worker that exits
+    fails its in-flight jobs (they are treated like an unreachable proxy) and
+    is replaced before the next job is handed out.
+
+    Args:
+        processes: Number of worker processes
+        settings: Worker settings (probe mode and timeout, per-process probe
+            concurrency, DNS cache TTLs, GeoIP backend and database)
+        job_timeout: Seconds to wait for one job before giving up on it
+    """
+
+    def __init__(self, processes: int, settings: Dict, job_timeout: float = 30.0) -> None:
+        if processes < 1:
+            raise ValueError("Enrichment pool needs at least one process")
+        self.processes = processes
+        self.settings = settings
+        self.job_timeout = job_timeout
+        self._workers: List[Optional[_WorkerProcess]] = [None] * processes
+        # Serializes restarts so concurrent jobs don't each replace the same worker
+        self._spawn_lock = asyncio.Lock()
+        self._next_id = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Jobs currently handed to workers."""
+        return sum(len(worker.pending) for worker in self._workers if worker is not None)
+
+    async def _spawn(self, slot: int) -> _WorkerProcess:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, WORKER_SCRIPT, json.dumps(self.settings),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=_LINE_LIMIT
+        )
+        worker = _WorkerProcess(process)
+        worker.reader = asyncio.create_task(self._read(worker), name=f"enrich-worker-{slot}")
+        self._workers[slot] = worker
+        logger.info(f"Started enrichment worker {slot} (pid {process.pid})")
+        return worker
+
+    async def start(self) -> None:
+        """Start all worker processes."""
+        for slot in range(self.processes):
+            if self._workers[slot] is None or not self._workers[slot].alive:
+                await self._spawn(slot)
+
+    async def _read(self, worker: _WorkerProcess) -> None:
+        try:
+            while True:
+                line = await worker.process.stdout.readline()
+                if not line:
+                    break
+                reply = json.loads(line)
+                future = worker.pending.pop(reply['id'], None)
+                if future is not None and not future.done():
+                    future.set_result(reply)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error reading from enrichment worker {worker.process.pid}: {e}", exc_info=True)
+        finally:
+            for future in worker.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Enrichment worker exited"))
+            worker.pending.clear()
+
+    async def _pick(self) -> _WorkerProcess:
+        if not all(worker is not None and worker.alive for worker in self._workers):
+            async with self._spawn_lock:
+                for slot, worker in enumerate(self._workers):
+                    if worker is None or not worker.alive:
+                        if worker is not None:
+                            self.restarts += 1
+                            logger.warning(f"Enrichment worker {slot} exited, restarting it")
+                        await self._spawn(slot)
+        return min(self._workers, key=lambda worker: len(worker.pending))
+
+    def _fallback(self) -> EnrichResult:
+        # Treated like a proxy that could not be reached
+        return EnrichResult([], valid=self.settings.get('probe_mode', 'tcp') != 'mtproto')
+
+    async def enrich(self, link: str, server: str, port: str) -> EnrichResult:
+        """
+        Resolve, check and (with a local GeoIP database) geolocate a proxy in a worker.
+
+        Args:
+            link: Proxy link (for its secret in MTProto mode)
+            server: Proxy hostname or IP address
+            port: Proxy port
+
+        Returns:
+            EnrichResult; country is None if the worker could not answer it offline
+        """
+        worker = await self._pick()
+        self._next_id += 1
+        job_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        worker.pending[job_id] = future
+        try:
+            worker.process.stdin.write(
+                json.dumps({'id': job_id, 'link': link, 'server': server, 'port': port}).encode('utf-8') + b'\n'
+            )
+            await worker.process.stdin.drain()
+            reply = await asyncio.wait_for(future, self.job_timeout)
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            worker.pending.pop(job_id, None)
+            self.failed += 1
+            ENRICH_JOBS.inc(result='failed')
+            logger.warning(f"Enrichment worker job for {server}:{port} failed: {e or 'timed out'}")
+            return self._fallback()
+
+        if 'error' in reply:
+            self.failed += 1
+            ENRICH_JOBS.inc(result='failed')
+            return self._fallback()
+        self.completed += 1
+        ENRICH_JOBS.inc(result='ok')
+        return EnrichResult(
+            addresses=[(family, address) for family, address in reply['addresses']],
+            ping=reply.get('ping'),
+            handshake_ms=reply.get('handshake_ms'),
+            valid=reply.get('valid', True),
+            country=reply.get('country')
+        )
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Let workers finish their jobs and exit; kill those that don't within the timeout."""
+        for worker in self._workers:
+            if worker is not None and worker.process.returncode is None:
+                worker.process.stdin.close()
+        for slot, worker in enumerate(self._workers):
+            if worker is None:
+                continue
+            try:
+                await asyncio.wait_for(worker.process.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Enrichment worker {slot} did not exit, killing it")
+                worker.process.kill()
+                await worker.process.wait()
+            if worker.reader is not None:
+                await asyncio.gather(worker.reader, return_exceptions=True)
+            self._workers[slot] = None
+
+    def stats(self) -> Dict[str, int]:
+        """Return pool counters."""
+        return {
+            'processes': sum(1 for worker in self._workers if worker is not None and worker.alive),
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'failed': self.failed,
+            'restarts': self.restarts
+        }
+
+
+if __name__ == '__main__':
+    # Worker process: stdout carries results, so logs go to stderr
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - worker[%(process)d] - %(name)s - %(levelname)s - %(message)s',
+        stream=sys.stderr
+    )
+    try:
+        asyncio.run(_serve(json.loads(sys.argv[1]) if len(sys.argv) > 1 else {}))
+    except KeyboardInterrupt:
+        pass
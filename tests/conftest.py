@@ -0,0 +1,12 @@
+"""
+Shared test setup: make the bot's modules (src/) and the benchmark fakes
+(benchmarks/) importable the way the bot and the benchmarks import them.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in (os.path.join(ROOT, 'src'), os.path.join(ROOT, 'benchmarks')):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
@@ -0,0 +1,141 @@
+"""
+MTProto handshake validation (obfuscated2 and fake-TLS) against the
+benchmarks' FakeMtprotoProxy, which implements the server side independently.
+"""
+
+import asyncio
+import base64
+import os
+import time
+
+import pytest
+
+from fakes import FakeMtprotoProxy
+from mtproto import SECRET_FAKE_TLS, SECRET_PADDED, SECRET_PLAIN, parse_secret, validate_proxy
+from prober import TcpProber
+
+DOMAIN = b'www.google.com'.hex()
+
+
+def secrets(kind: str):
+    """Return (proxy secret, another secret of the same kind)."""
+    key, other = os.urandom(16).hex(), os.urandom(16).hex()
+    if kind == 'plain':
+        return key, other
+    if kind == 'dd':
+        return 'dd' + key, 'dd' + other
+    return 'ee' + key + DOMAIN, 'ee' + other + DOMAIN
+
+
+def run_with_proxy(secret: str, scenario, silent: bool = False) -> None:
+    """Run scenario(proxy, port) against a fresh fake proxy."""
+    async def main() -> None:
+        proxy = FakeMtprotoProxy(secret, silent=silent)
+        port = await proxy.start()
+        try:
+            await scenario(proxy, port)
+        finally:
+            await proxy.stop()
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize('kind', ['plain', 'dd', 'ee'])
+def test_handshake_with_matching_secret(kind):
+    good, _ = secrets(kind)
+
+    async def scenario(proxy, port):
+        result = await validate_proxy('127.0.0.1', port, good, timeout=5.0)
+        assert result.ok, result.error
+        assert result.connect_ms is not None and result.handshake_ms is not None
+        assert proxy.accepted == 1
+
+    run_with_proxy(good, scenario)
+
+
+@pytest.mark.parametrize('kind', ['plain', 'dd', 'ee'])
+def test_handshake_with_other_secret_fails(kind):
+    good, wrong = secrets(kind)
+
+    async def scenario(proxy, port):
+        result = await validate_proxy('127.0.0.1', port, wrong, timeout=5.0)
+        assert not result.ok
+        assert result.error
+        assert result.handshake_ms is None
+        assert proxy.accepted == 0
+
+    run_with_proxy(good, scenario)
+
+
+def test_base64_fake_tls_secret():
+    good, _ = secrets('ee')
+    encoded = base64.urlsafe_b64encode(bytes.fromhex(good)).decode('ascii').rstrip('=')
+
+    async def scenario(proxy, port):
+        result = await validate_proxy('127.0.0.1', port, encoded, timeout=5.0)
+        assert result.ok, result.error
+
+    run_with_proxy(good, scenario)
+
+
+def test_silent_proxy_times_out():
+    good, _ = secrets('plain')
+
+    async def scenario(proxy, port):
+        result = await validate_proxy('127.0.0.1', port, good, timeout=0.3)
+        assert not result.ok
+        assert result.error == 'timeout'
+        assert result.connect_ms is not None
+
+    run_with_proxy(good, scenario, silent=True)
+
+
+def test_falls_back_to_next_resolved_address():
+    good, _ = secrets('dd')
+
+    async def scenario(proxy, port):
+        # The fake listens on 127.0.0.1 only, so 127.0.0.2 refuses the connection
+        result = await validate_proxy('proxy.example', port, good, timeout=5.0, addresses=['127.0.0.2', '127.0.0.1'])
+        assert result.ok, result.error
+        result = await validate_proxy('proxy.example', port, good, timeout=5.0, addresses=['127.0.0.2'])
+        assert not result.ok
+
+    run_with_proxy(good, scenario)
+
+
+def test_handshakes_share_the_prober_limit():
+    good, _ = secrets('plain')
+
+    async def scenario(proxy, port):
+        prober = TcpProber(concurrency=1)
+
+        async def limited():
+            async with prober.slot():
+                assert prober.in_flight == 1
+                return await validate_proxy('127.0.0.1', port, good, timeout=0.2)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(limited(), limited())
+        # One slot: the second handshake only starts when the first timed out
+        assert time.perf_counter() - start >= 0.4
+        assert [result.error for result in results] == ['timeout', 'timeout']
+        assert prober.in_flight == 0
+
+    run_with_proxy(good, scenario, silent=True)
+
+
+def test_invalid_secret_is_reported_without_connecting():
+    async def main():
+        result = await validate_proxy('127.0.0.1', 1, 'not-a-secret', timeout=1.0)
+        assert not result.ok and result.error == 'invalid secret'
+    asyncio.run(main())
+
+
+def test_parse_secret_kinds():
+    key = os.urandom(16)
+    assert parse_secret(key.hex()).kind == SECRET_PLAIN
+    assert parse_secret('dd' + key.hex()).kind == SECRET_PADDED
+    fake_tls = parse_secret('ee' + key.hex() + DOMAIN)
+    assert fake_tls.kind == SECRET_FAKE_TLS and fake_tls.domain == 'www.google.com'
+    assert fake_tls.key == key
+    assert parse_secret('ab' * 8) is None
+    assert parse_secret('') is None
@@ -0,0 +1,154 @@
+"""
+Pipeline stage flow and overflow policies.
+
+Each overflow test parks the stage's only worker on a gate, so the queue
+(size 1) fills deterministically before the third item is submitted.
+"""
+
+import asyncio
+
+import pytest
+
+from pipeline import OVERFLOW_BLOCK, OVERFLOW_DROP_NEW, OVERFLOW_DROP_OLDEST, Pipeline, Stage
+
+
+class GatedStage:
+    """A single-worker stage whose handler waits for a gate before passing items on."""
+
+    def __init__(self, overflow: str) -> None:
+        self.gate = asyncio.Event()
+        self.handled = []
+        self.finished = []
+        self.stage = Stage('gated', self.handle, workers=1, queue_size=1, overflow=overflow)
+        self.pipeline = Pipeline([self.stage], on_finish=self.finished.append)
+
+    async def handle(self, item):
+        await self.gate.wait()
+        self.handled.append(item)
+        return item
+
+    async def fill(self) -> None:
+        """Start the pipeline with item 1 held by the worker and item 2 queued."""
+        await self.pipeline.start()
+        assert await self.pipeline.submit(1)
+        # Let the worker take item 1 off the queue
+        await asyncio.sleep(0.01)
+        assert await self.pipeline.submit(2)
+        assert self.stage.queue.full()
+
+
+def test_block_applies_backpressure():
+    async def main():
+        gated = GatedStage(OVERFLOW_BLOCK)
+        await gated.fill()
+        third = asyncio.create_task(gated.pipeline.submit(3))
+        await asyncio.sleep(0.05)
+        assert not third.done()
+        gated.gate.set()
+        assert await third
+        await gated.pipeline.stop()
+        assert gated.handled == [1, 2, 3]
+        assert gated.stage.dropped == 0
+
+    asyncio.run(main())
+
+
+def test_drop_new_rejects_incoming_item():
+    async def main():
+        gated = GatedStage(OVERFLOW_DROP_NEW)
+        await gated.fill()
+        assert not await gated.pipeline.submit(3)
+        # The dropped item leaves the pipeline at once
+        assert gated.finished == [3]
+        gated.gate.set()
+        await gated.pipeline.stop()
+        assert gated.handled == [1, 2]
+        assert sorted(gated.finished) == [1, 2, 3]
+        assert gated.stage.stats()['dropped'] == 1
+
+    asyncio.run(main())
+
+
+def test_drop_oldest_evicts_queued_item():
+    async def main():
+        gated = GatedStage(OVERFLOW_DROP_OLDEST)
+        await gated.fill()
+        assert await gated.pipeline.submit(3)
+        assert gated.finished == [2]
+        gated.gate.set()
+        await gated.pipeline.stop()
+        assert gated.handled == [1, 3]
+        assert sorted(gated.finished) == [1, 2, 3]
+        assert gated.stage.stats()['dropped'] == 1
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize('overflow', [OVERFLOW_DROP_NEW, OVERFLOW_DROP_OLDEST])
+def test_wait_overrides_dropping_policy(overflow):
+    async def main():
+        gated = GatedStage(overflow)
+        await gated.fill()
+        third = asyncio.create_task(gated.pipeline.submit(3, wait=True))
+        await asyncio.sleep(0.05)
+        assert not third.done()
+        gated.gate.set()
+        assert await third
+        await gated.pipeline.stop()
+        assert gated.handled == [1, 2, 3]
+        assert gated.stage.dropped == 0
+
+    asyncio.run(main())
+
+
+def test_items_flow_through_stages_and_finish_once():
+    async def double(item):
+        return item * 2
+
+    async def keep_even_tens(item):
+        if item % 20:
+            return None
+        return item
+
+    async def fail_on_40(item):
+        if item == 40:
+            raise RuntimeError('boom')
+        return item
+
+    async def main():
+        finished = []
+        stages = [
+            Stage('double', double, workers=2),
+            Stage('filter', keep_even_tens, workers=2),
+            Stage('fail', fail_on_40)
+        ]
+        pipeline = Pipeline(stages, on_finish=finished.append)
+        await pipeline.start()
+        for item in range(1, 31):
+            await pipeline.submit(item)
+        await pipeline.join()
+        stats = pipeline.stats()
+        await pipeline.stop()
+        # Every item leaves exactly once: completed, filtered or failed
+        assert len(finished) == 30
+        assert sorted(item for item in finished if item % 20 == 0) == [20, 40, 60]
+        assert stats['double']['processed'] == 30
+        assert stats['filter']['processed'] == 30
+        assert stats['fail']['processed'] == 2
+        assert stats['fail']['failed'] == 1
+
+    asyncio.run(main())
+
+
+def test_invalid_stage_settings_are_rejected():
+    async def handler(item):
+        return item
+
+    with pytest.raises(ValueError):
+        Stage('bad', handler, workers=0)
+    with pytest.raises(ValueError):
+        Stage('bad', handler, queue_size=0)
+    with pytest.raises(ValueError):
+        Stage('bad', handler, overflow='spill')
+    with pytest.raises(ValueError):
+        Pipeline([])
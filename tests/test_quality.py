@@ -0,0 +1,114 @@
+"""
+QualityTracker ring and histogram bookkeeping, and the ranking score.
+"""
+
+import math
+import random
+
+import pytest
+
+from quality import LATENCY_BUCKET_GROWTH, QualityTracker, score
+
+
+def within_bucket(estimate: float, exact: float) -> bool:
+    """Histogram percentiles are exact to one log bucket."""
+    return exact / LATENCY_BUCKET_GROWTH <= estimate <= exact * LATENCY_BUCKET_GROWTH
+
+
+def nearest_rank(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def test_ring_wraps_and_forgets_oldest_outcomes():
+    tracker = QualityTracker(window=4)
+    for _ in range(4):
+        stats = tracker.record(1, None)
+    assert stats.samples == 4
+    assert stats.success_ratio == 0.0
+    assert stats.latency_p50 is None and stats.latency_ewma is None
+
+    # Each success overwrites one of the failures
+    for index in range(1, 5):
+        stats = tracker.record(1, 100.0)
+        assert stats.samples == 4
+        assert stats.success_ratio == index / 4
+
+    # Wrapping again: the old 100 ms samples leave the histogram
+    for _ in range(4):
+        stats = tracker.record(1, 10.0)
+    assert within_bucket(stats.latency_p50, 10.0)
+    assert within_bucket(stats.latency_p95, 10.0)
+
+
+def test_window_percentiles_follow_the_latest_samples():
+    rng = random.Random(7)
+    tracker = QualityTracker(window=200)
+    latencies = []
+    for _ in range(1000):
+        latency = rng.uniform(20.0, 800.0)
+        latencies.append(latency)
+        stats = tracker.record(1, latency)
+    window = latencies[-200:]
+    assert within_bucket(stats.latency_p50, nearest_rank(window, 0.50))
+    assert within_bucket(stats.latency_p95, nearest_rank(window, 0.95))
+    assert stats.latency_p50 <= stats.latency_p95
+    assert stats.samples == 200 and stats.success_ratio == 1.0
+
+
+def test_failures_do_not_count_towards_percentiles():
+    tracker = QualityTracker(window=10)
+    for latency in [50.0, None, 50.0, None, 400.0]:
+        stats = tracker.record(1, latency)
+    assert stats.success_ratio == 0.6
+    assert within_bucket(stats.latency_p50, 50.0)
+    assert within_bucket(stats.latency_p95, 400.0)
+
+
+def test_ewma_weights_newest_latency():
+    tracker = QualityTracker(window=8, alpha=0.5)
+    tracker.record(1, 100.0)
+    stats = tracker.record(1, 200.0)
+    assert stats.latency_ewma == 150.0
+    # Failures leave the EWMA alone
+    assert tracker.record(1, None).latency_ewma == 150.0
+
+
+def test_reused_slot_starts_empty():
+    tracker = QualityTracker(window=4)
+    for _ in range(6):
+        tracker.record(1, 300.0)
+    tracker.discard(1)
+    assert 1 not in tracker and tracker.stats(1) is None
+    stats = tracker.record(2, 5.0)
+    assert len(tracker) == 1
+    assert stats.samples == 1
+    assert within_bucket(stats.latency_p95, 5.0)
+    assert stats.latency_ewma == 5.0
+
+
+def test_seed_carries_summary_over():
+    tracker = QualityTracker(window=4)
+    tracker.seed(1, 80.0, 1000.0)
+    stats = tracker.stats(1)
+    assert stats.latency_ewma == 80.0 and stats.last_alive == 1000.0
+    assert stats.samples == 0 and stats.latency_p50 is None
+    assert tracker.record(1, None, now=2000.0).last_alive == 1000.0
+    assert tracker.record(1, 80.0, now=3000.0).last_alive == 3000.0
+
+
+@pytest.mark.parametrize('window, alpha', [(0, 0.3), (70000, 0.3), (32, 0.0), (32, 1.5)])
+def test_invalid_settings_are_rejected(window, alpha):
+    with pytest.raises(ValueError):
+        QualityTracker(window=window, alpha=alpha)
+
+
+def test_score_prefers_reliable_fast_fresh_proxies():
+    now = 10_000.0
+    good = {'latency_ewma': 50.0, 'success_ratio': 1.0, 'samples': 20, 'last_alive': now}
+    slow = dict(good, latency_ewma=800.0)
+    flaky = dict(good, success_ratio=0.5)
+    stale = dict(good, last_alive=now - 86400)
+    assert score(good, now) > max(score(slow, now), score(flaky, now), score(stale, now))
+    assert score({'latency_ewma': None}, now) == 0.0
+    assert 0.0 < score(good, now) <= 100.0
@@ -0,0 +1,120 @@
+"""
+StateBackend contract: the local and Redis backends must behave the same.
+
+The Redis backend runs against the in-process FakeRedis server used by the
+replay benchmark.
+"""
+
+import asyncio
+
+import pytest
+
+from fakes import FakeRedis
+from state import LocalStateBackend, StateBackend, open_backend
+
+
+def run_with_backend(kind: str, scenario) -> None:
+    """Run scenario(backend) on a fresh backend of the given kind."""
+    async def main() -> None:
+        server = None
+        if kind == 'local':
+            backend = open_backend('local')
+        else:
+            server = FakeRedis()
+            backend = open_backend('redis', await server.start(), prefix='test:')
+        try:
+            await scenario(backend)
+        finally:
+            await backend.close()
+            if server is not None:
+                await server.stop()
+    asyncio.run(main())
+
+
+BACKENDS = ['local', 'redis']
+
+
+def test_incomplete_backend_cannot_be_created():
+    class Partial(StateBackend):
+        async def get_proxy(self, link):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+    assert isinstance(LocalStateBackend(), StateBackend)
+
+
+@pytest.mark.parametrize('kind', BACKENDS)
+def test_proxy_records_round_trip_and_expire(kind):
+    async def scenario(backend):
+        assert await backend.get_proxy('link-a') is None
+        record = {'server': '1.2.3.4', 'port': 443, 'ping': 12.5, 'country': 'Türkiye'}
+        await backend.put_proxy('link-a', record, ttl=60)
+        assert await backend.get_proxy('link-a') == record
+        await backend.put_proxy('link-b', record, ttl=0.05)
+        await asyncio.sleep(0.1)
+        assert await backend.get_proxy('link-b') is None
+        assert await backend.get_proxy('link-a') == record
+
+    run_with_backend(kind, scenario)
+
+
+@pytest.mark.parametrize('kind', BACKENDS)
+def test_token_window_allows_capacity_then_waits(kind):
+    async def scenario(backend):
+        for _ in range(3):
+            assert await backend.take_token('api', capacity=3, window=1.0) == 0.0
+        wait = await backend.take_token('api', capacity=3, window=1.0)
+        assert 0.0 < wait <= 1.0
+        # Other keys have their own window
+        assert await backend.take_token('other', capacity=3, window=1.0) == 0.0
+
+    run_with_backend(kind, scenario)
+
+
+@pytest.mark.parametrize('kind', BACKENDS)
+def test_token_window_reopens_after_reset(kind):
+    async def scenario(backend):
+        assert await backend.take_token('api', capacity=1, window=0.05) == 0.0
+        assert await backend.take_token('api', capacity=1, window=0.05) > 0.0
+        await asyncio.sleep(0.1)
+        assert await backend.take_token('api', capacity=1, window=0.05) == 0.0
+
+    run_with_backend(kind, scenario)
+
+
+@pytest.mark.parametrize('kind', BACKENDS)
+def test_sync_tokens_adopts_remote_remaining(kind):
+    async def scenario(backend):
+        await backend.sync_tokens('api', remaining=1, capacity=45, reset_after=30)
+        assert await backend.take_token('api', capacity=45, window=60) == 0.0
+        wait = await backend.take_token('api', capacity=45, window=60)
+        assert 0.0 < wait <= 30.0
+
+    run_with_backend(kind, scenario)
+
+
+@pytest.mark.parametrize('kind', BACKENDS)
+def test_lease_has_one_holder(kind):
+    async def scenario(backend):
+        assert await backend.acquire_lease('publish:1', 'node-a', ttl=60)
+        assert not await backend.acquire_lease('publish:1', 'node-b', ttl=60)
+        # The holder renews its own lease
+        assert await backend.acquire_lease('publish:1', 'node-a', ttl=60)
+        # Only the holder can release it
+        await backend.release_lease('publish:1', 'node-b')
+        assert not await backend.acquire_lease('publish:1', 'node-b', ttl=60)
+        await backend.release_lease('publish:1', 'node-a')
+        assert await backend.acquire_lease('publish:1', 'node-b', ttl=60)
+
+    run_with_backend(kind, scenario)
+
+
+@pytest.mark.parametrize('kind', BACKENDS)
+def test_lease_expires(kind):
+    async def scenario(backend):
+        assert await backend.acquire_lease('publish:2', 'node-a', ttl=0.05)
+        await asyncio.sleep(0.1)
+        assert await backend.acquire_lease('publish:2', 'node-b', ttl=60)
+
+    run_with_backend(kind, scenario)